@@ -1,27 +1,291 @@
-from flask import Flask, request, jsonify
-import google.generativeai as genai
+from flask import Flask, request, jsonify, abort, Response, stream_with_context
 import os
+import re
+import uuid
+import hmac
+import json
+import logging
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import traceback
+from contextlib import contextmanager
 from flask_cors import CORS
+import metrics
+import tracing
+import gemini
+from session_store import SessionStore, USER, MODEL
+from session_db import SqliteSessionStore
+from scripture_index import ScriptureIndex
+from response_cache import ResponseCache, normalize_question
+from similar_cache import SimilarCache
+from context_cache import ContextCache
+from static_assets import AssetBundle, html_page
+from model_pool import AsyncModelPool, ModelPool, PoolBusy, QueueTimeout
+from rate_limit import RateLimiter, retry_after_seconds
+from single_flight import SingleFlight
+from resilience import CircuitBreaker, CircuitOpen, ModelCaller
+from quota import QuotaExceeded, QuotaGovernor
+from router import FULL, LITE, TEMPLATE, Router, about_doctrine
+from generation_profiles import GenerationProfile
+from tracing import Tracer
+from traffic_capture import TrafficCapture
+from log_pipeline import LogPipeline
+from history_window import (EMPTY_WINDOW, Summarizer, WindowStats, estimate_tokens,
+                            has_context, select_window)
 
 # .env 파일 로드
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)  # CORS 활성화
+# 로그: 모든 모듈은 'seondami.*' 로거에 기록하고, 요청 스레드는 기록을 큐에 넣기만 한다.
+# 프로세스마다 백그라운드 스레드 하나가 JSON 한 줄로 stdout에 쓴다. 장애 중에 같은 오류가 반복되면
+# LOG_DEDUP_WINDOW초 동안 한 번만 쓰고, traceback은 예외 종류마다 LOG_TRACEBACK_INTERVAL초에 한 번만 남긴다.
+# 최근 경고·오류 LOG_ERROR_RING_SIZE개는 /admin/errors에서 볼 수 있다.
+log_pipeline = LogPipeline(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    queue_size=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+    dedup_window=float(os.getenv('LOG_DEDUP_WINDOW', 60)),
+    traceback_interval=float(os.getenv('LOG_TRACEBACK_INTERVAL', 10)),
+    ring_size=int(os.getenv('LOG_ERROR_RING_SIZE', 100)),
+    observe=metrics.record_log,
+)
+log_pipeline.install()
+log = logging.getLogger('seondami.app')
+
+# 정적 파일은 아래 static_file()에서 해시된 이름으로 제공한다
+app = Flask(__name__, static_folder=None)
+# 다른 출처의 웹 클라이언트도 요청 ID와 단계별 처리 시간을 읽을 수 있도록 노출한다
+CORS(app, expose_headers=['X-Request-Id', 'Server-Timing'])  # CORS 활성화
+metrics.instrument(app)  # 라우트별 요청 수, 처리 시간 기록 (/metrics)
+
+# 요청 추적: 답변 경로의 응답에 단계별 처리 시간(Server-Timing)과 요청 ID(X-Request-Id)를 붙이고,
+# TRACE_SLOW_MS보다 오래 걸린 요청은 TRACE_SLOW_SAMPLE_RATE 비율로 골라 느린 요청 로그(JSON 한 줄)로 남긴다.
+# TRACE_EXPORT_FILE을 지정하면 로그에 남긴 요청을 OTLP JSON 형식으로 그 파일에도 한 줄씩 덧붙인다.
+TRACED_ROUTES = ('/chat', '/chat/stream', '/kakao')
+
+def log_slow_request(record, sampled):
+    metrics.record_slow_request(record['route'])
+    if sampled:
+        log.info("Slow request", extra=record)
+
+# 트래픽 기록: CAPTURE_FILE을 지정하면 위 라우트의 요청을 익명화해 gzip 로그로 남긴다 (tools/replay.py로 재생).
+# 세션 가명과 메시지 해시의 키인 CAPTURE_SALT(16자 이상)가 없으면 시작하지 않는다.
+# 업스트림 시간은 요청 추적의 gemini(스트리밍은 model) 단계에서 가져오므로 TRACE_ENABLED=1이어야 한다.
+traffic_capture = TrafficCapture(
+    path=os.getenv('CAPTURE_FILE') or None,
+    sample_rate=float(os.getenv('CAPTURE_SAMPLE_RATE', 1)),
+    salt=os.getenv('CAPTURE_SALT', ''),
+    messages=os.getenv('CAPTURE_MESSAGES', 'redact'),
+)
+
+def capture_traffic(trace, seconds):
+    attributes = trace.attributes
+    if 'message' not in attributes:
+        return
+    stages = trace.stages()
+    traffic_capture.record(
+        trace.route, trace.started_ns / 1e9, attributes['session_id'], attributes['message'],
+        stages.get('gemini', stages.get('model')), seconds, trace.status, attributes.get('callback', False))
+
+tracer = Tracer(
+    enabled=os.getenv('TRACE_ENABLED', '1') == '1',
+    slow_seconds=float(os.getenv('TRACE_SLOW_MS', 3000)) / 1000,
+    sample_rate=float(os.getenv('TRACE_SLOW_SAMPLE_RATE', 1)),
+    export_path=os.getenv('TRACE_EXPORT_FILE') or None,
+    observe=log_slow_request,
+    on_finish=capture_traffic if traffic_capture.enabled else None,
+)
+tracing.instrument(app, tracer, TRACED_ROUTES)
 
 # Gemini API 설정
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 if not GOOGLE_API_KEY:
-    print("Error: GOOGLE_API_KEY is not set in .env file")
-genai.configure(api_key=GOOGLE_API_KEY)
+    log.error("GOOGLE_API_KEY is not set in .env file")
+# SDK는 처음 쓸 때(또는 워커 준비 단계에서) 불러온다 (gemini.py)
+gemini.configure(api_key=GOOGLE_API_KEY)
 
 # 모델 설정 - Gemini 2.5 Flash로 업그레이드
-model = genai.GenerativeModel('gemini-2.5-flash')
+MODEL_NAME = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+
+# 세션별 대화 기록 저장소 (세션마다 최근 턴만 링 버퍼로 보관)
+# 프롬프트에 실제로 넣는 범위는 HISTORY_TOKEN_BUDGET으로 정해지고, 링 버퍼는 메모리 상한 역할을 한다
+# SESSION_DB를 지정하면 SQLite 파일에 저장해 gunicorn 워커끼리 대화를 공유하고 재시작해도 유지한다
+SESSION_DB = os.getenv('SESSION_DB')
+if SESSION_DB:
+    session_store = SqliteSessionStore(
+        SESSION_DB,
+        max_turns=int(os.getenv('SESSION_MAX_TURNS', 20)),
+        ttl=int(os.getenv('SESSION_TTL', 1800)),
+        hot_sessions=int(os.getenv('SESSION_HOT_CACHE', 2048)),
+    )
+else:
+    session_store = SessionStore(
+        max_turns=int(os.getenv('SESSION_MAX_TURNS', 20)),
+        ttl=int(os.getenv('SESSION_TTL', 1800)),
+        max_bytes=int(os.getenv('SESSION_MAX_BYTES', 32 * 1024 * 1024)),
+    )
+
+# 자주 묻는 질문 답변 캐시 (이전 대화 맥락이 없는 질문에만 사용)
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', '1') == '1'
+response_cache = ResponseCache(
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', 86400)),
+    max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+)
+
+# 표현만 다른 비슷한 질문용 캐시 (정확히 일치하는 답변이 없을 때 사용)
+SIMILAR_CACHE_ENABLED = os.getenv('SIMILAR_CACHE_ENABLED', '1') == '1'
+similar_cache = SimilarCache(
+    threshold=float(os.getenv('SIMILAR_CACHE_THRESHOLD', 0.7)),
+    ngram=int(os.getenv('SIMILAR_CACHE_NGRAM', 2)),
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', 86400)),
+    max_entries=int(os.getenv('SIMILAR_CACHE_MAX_ENTRIES', 5000)),
+)
+
+# 맥락 없는 같은 질문이 동시에 들어오면 모델은 한 번만 부르고 결과를 함께 쓴다
+# SINGLE_FLIGHT_DIR를 지정하면 같은 서버의 gunicorn 워커끼리도 파일 잠금으로 조율한다
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', '1') == '1'
+single_flight = SingleFlight(
+    lock_dir=os.getenv('SINGLE_FLIGHT_DIR') or None,
+    result_ttl=int(os.getenv('SINGLE_FLIGHT_RESULT_TTL', 10)),
+    observe=metrics.record_single_flight,
+)
+
+# 모델 호출 전용 실행기 (동시 호출 수와 대기열 길이 제한)
+# 대기열이 가득 차거나 마감 시각을 넘기면 바로 "혼잡" 응답을 돌려준다
+# 대기 중인 요청은 사용자(웹 세션, 카카오 사용자)를 돌아가며 실행한다
+model_pool = ModelPool(
+    workers=int(os.getenv('MODEL_WORKERS', 8)),
+    max_queue=int(os.getenv('MODEL_QUEUE_SIZE', 16)),
+    max_user_queue=int(os.getenv('MODEL_USER_QUEUE_SIZE', 4)),
+    observe=metrics.record_queue_wait,
+)
+# ASGI 서버(asgi.py)용: 모델 호출이 이벤트 루프의 코루틴이라 스레드를 잡지 않으므로 동시에 훨씬 많이 실행한다
+async_model_pool = AsyncModelPool(
+    concurrency=int(os.getenv('MODEL_ASYNC_CONCURRENCY', 64)),
+    max_queue=int(os.getenv('MODEL_ASYNC_QUEUE_SIZE', 128)),
+    max_user_queue=int(os.getenv('MODEL_USER_QUEUE_SIZE', 4)),
+    observe=metrics.record_queue_wait,
+)
+
+# 채널별 사용자 요청 한도 (토큰 버킷, 분당 개수가 0이면 제한 없음)
+RATE_LIMIT_MAX_USERS = int(os.getenv('RATE_LIMIT_MAX_USERS', 10000))
+rate_limiters = {
+    'chat': RateLimiter(
+        per_minute=float(os.getenv('RATE_LIMIT_CHAT_PER_MINUTE', 20)),
+        burst=int(os.getenv('RATE_LIMIT_CHAT_BURST', 5)),
+        max_users=RATE_LIMIT_MAX_USERS,
+    ),
+    'kakao': RateLimiter(
+        per_minute=float(os.getenv('RATE_LIMIT_KAKAO_PER_MINUTE', 10)),
+        burst=int(os.getenv('RATE_LIMIT_KAKAO_BURST', 3)),
+        max_users=RATE_LIMIT_MAX_USERS,
+    ),
+}
+
+# 채널별 응답 마감 시간(초)
+CHAT_DEADLINE = float(os.getenv('CHAT_DEADLINE', 60))
+KAKAO_DEADLINE = float(os.getenv('KAKAO_DEADLINE', 4.5))
+
+# 채널별 생성 프로필 (GENERATION_<WEB|KAKAO>_* 환경 변수로 덮어쓸 수 있다)
+# 웹은 모델 기본값 그대로 쓰고, 카카오 simpleText 답변은 짧고 빨라야 하므로 출력 길이를 줄이고
+# thinking을 끈다. 카카오 모델 호출의 최근 p95 지연이 SLO(초)를 넘으면 출력 토큰 상한을 더 줄인다.
+# (2.5 Flash는 thinking 토큰도 max_output_tokens에 들어가므로 thinking을 끌 수 없는 SDK에서는 상한을 줄이지 않는다)
+WEB_PROFILE = GenerationProfile.from_env('web')
+KAKAO_PROFILE = GenerationProfile.from_env(
+    'kakao', max_output_tokens=1024, thinking_budget=0, slo=3.0, min_output_tokens=384,
+    hint="[답변 형식] 카카오톡 메시지로 보내는 답변입니다. 핵심만 3~5문장, 400자 이내로 답해주세요.")
+generation_profiles = {profile.name: profile for profile in (WEB_PROFILE, KAKAO_PROFILE)}
+
+# 메시지 경로 고르기: 인사·감사만 있는 메시지는 모델을 부르지 않고 정해진 인사말로, 짧은 잡담은
+# 가벼운 모델(ROUTER_LITE_MODEL)로 답하고, 상담·교리 질문은 기본 모델로 보낸다 (router.py 참고)
+# 가벼운 모델 경로는 채널 프로필의 답변 형식 안내를 그대로 쓰는 <채널>_lite 프로필로 부른다
+ROUTER_LITE_MODEL = os.getenv('ROUTER_LITE_MODEL', 'gemini-2.5-flash-lite')
+lite_profiles = {
+    name: GenerationProfile.from_env(f'{name}_lite', model=ROUTER_LITE_MODEL, max_output_tokens=512, hint=profile.hint)
+    for name, profile in generation_profiles.items()
+}
+
+def log_route(channel, decision, seconds, saved):
+    metrics.record_route(channel, decision.route, decision.reason, saved)
+    if decision.route != FULL:
+        log.info("Routed message", extra={
+            'channel': channel, 'route': decision.route, 'reason': decision.reason,
+            'duration_ms': round(seconds * 1000, 1), 'saved_ms': round(saved * 1000, 1) if saved is not None else None,
+        })
 
-# 대화 기록을 저장할 변수
-conversation_history = []
+router = Router(
+    enabled=os.getenv('ROUTER_ENABLED', '1') == '1',
+    lite=bool(ROUTER_LITE_MODEL),
+    template_max_chars=int(os.getenv('ROUTER_TEMPLATE_MAX_CHARS', 20)),
+    lite_max_chars=int(os.getenv('ROUTER_LITE_MAX_CHARS', 10)),
+    observe=log_route,
+)
+
+# 프로젝트 전체 Gemini 할당량 (분당 요청 수, 분당 토큰 수. 0이면 제한 없음)
+# QUOTA_FILE을 지정하면 같은 서버의 모든 워커가 그 파일의 토큰 버킷을 함께 쓴다
+quota = QuotaGovernor(
+    rpm=int(os.getenv('QUOTA_RPM', 0)),
+    tpm=int(os.getenv('QUOTA_TPM', 0)),
+    path=os.getenv('QUOTA_FILE') or None,
+    burst=float(os.getenv('QUOTA_BURST', 0.1)),
+    headroom=float(os.getenv('QUOTA_HEADROOM', 0.05)),
+    max_wait=float(os.getenv('QUOTA_MAX_WAIT', 2)),
+    observe=metrics.record_quota,
+)
+# 답변 길이를 미리 알 수 없으므로 호출 전에는 이만큼 출력 토큰을 쓴다고 보고, 끝나면 실제 사용량으로 정산한다
+QUOTA_OUTPUT_TOKENS = int(os.getenv('QUOTA_OUTPUT_TOKENS', 512))
+
+# Gemini 호출 보호: 마감 시각 안에서만 지터 백오프로 재시도하고, 연속으로 실패하면 회로를 열어
+# 한동안 호출하지 않고 캐시된 답변이나 안내 문구로 응답한다. 헤지 요청은 기본으로 꺼져 있다.
+model_caller = ModelCaller(
+    CircuitBreaker(
+        failure_threshold=int(os.getenv('MODEL_BREAKER_FAILURES', 5)),
+        reset_timeout=float(os.getenv('MODEL_BREAKER_RESET', 30)),
+        on_change=metrics.record_breaker_state,
+    ),
+    max_attempts=int(os.getenv('MODEL_MAX_ATTEMPTS', 3)),
+    hedge=os.getenv('MODEL_HEDGE_ENABLED', '0') == '1',
+    hedge_min_delay=float(os.getenv('MODEL_HEDGE_MIN_DELAY', 0.5)),
+    hedge_max_ratio=float(os.getenv('MODEL_HEDGE_MAX_RATIO', 0.1)),
+    hedge_workers=int(os.getenv('MODEL_WORKERS', 8)) * 2,
+    local_errors=(QuotaExceeded,),
+    observe=metrics.record_model_event,
+)
+
+BUSY_MESSAGE = "지금 문의가 많아 답변이 늦어지고 있어요. 잠시 후 다시 말씀해주세요."
+UNAVAILABLE_MESSAGE = "지금은 선다미가 답변을 드리기 어려워요. 잠시 후 다시 말씀해주세요."
+RATE_LIMIT_MESSAGE = "질문이 너무 빠르게 이어지고 있어요. 잠시 쉬었다가 다시 말씀해주세요."
+# 모델이 답변 텍스트 없이 끝났을 때 (캐시에는 넣지 않는다)
+INCOMPLETE_MESSAGE = "답변을 미처 마무리하지 못했어요. 조금 더 짧게 다시 물어봐 주시겠어요?"
+BUSY_RETRY_AFTER = 5
+
+# 웹 클라이언트 세션 식별용 쿠키
+SESSION_COOKIE = 'seondami_sid'
+# 카카오 세션은 'kakao:<사용자 ID>'로 저장하므로, 웹 클라이언트가 카카오 세션을 가리킬 수 없도록 ':'는 받지 않는다
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,128}$')
+
+# 관리용 엔드포인트 토큰 (설정하지 않으면 관리용 엔드포인트 비활성화)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# /metrics 접근 토큰 (설정하면 Authorization: Bearer 헤더가 필요)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+ROLE_LABELS = {USER: '사용자', MODEL: '선다미'}
+
+# 카카오 i 오픈빌더 콜백 설정
+# 스킬 응답은 약 5초 안에 돌아가야 하므로, 콜백이 허용된 요청은 즉시 "처리 중"으로 응답하고
+# 답변은 백그라운드에서 생성해 callbackUrl로 보낸다 (callbackUrl은 1분간 한 번만 유효)
+KAKAO_CALLBACK_ENABLED = os.getenv('KAKAO_CALLBACK_ENABLED', '1') == '1'
+KAKAO_CALLBACK_DEADLINE = float(os.getenv('KAKAO_CALLBACK_DEADLINE', 55))
+KAKAO_CALLBACK_RETRIES = int(os.getenv('KAKAO_CALLBACK_RETRIES', 3))
+KAKAO_CALLBACK_SEND_MARGIN = 5
+KAKAO_CALLBACK_WAIT_MESSAGE = "선다미가 답변을 준비하고 있어요. 잠시만 기다려주세요."
+
+callback_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('KAKAO_CALLBACK_WORKERS', 8)),
+    thread_name_prefix='kakao-callback',
+)
 
 # 시스템 프롬프트 설정
 SYSTEM_PROMPT = """당신은 '선다미'라는 불교 신행, 교리 상담 챗봇입니다. 
@@ -45,775 +309,829 @@ SYSTEM_PROMPT = """당신은 '선다미'라는 불교 신행, 교리 상담 챗
 9. 사용자가 추가 질문을 할 때는 이전 대화의 맥락을 유지하면서 답변해주세요.
 10. 모든 답변은 현대적인 언어로, 친근하고 이해하기 쉽게 작성해주세요.
 
-이전 대화 내용:
-{context}
-
-이 내용을 참고하여 답변해주세요."""
-
-def get_chat_response(user_message):
+이전 대화 내용을 참고하여 답변해주세요."""
+
+# 모델 백엔드 (gemini: 실제 Gemini API, fake: 부하 시험용 가짜 모델 - fake_model.py 참고)
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'gemini')
+if MODEL_BACKEND not in ('gemini', 'fake'):
+    raise ValueError(f"Unknown MODEL_BACKEND: {MODEL_BACKEND}")
+
+fake_model = None
+if MODEL_BACKEND == 'fake':
+    from fake_model import FakeModel
+    fake_model = FakeModel.from_env()
+
+# 시스템 프롬프트는 모델의 system_instruction으로 한 번만 설정하고,
+# 가능하면 Gemini 캐시 콘텐츠로 올려 매 요청마다 다시 보내지 않도록 한다
+# 생성 프로필이 다른 모델을 쓰면 그 모델용 캐시 콘텐츠를 처음 쓸 때 따로 만든다
+# 지금 시스템 프롬프트(약 400토큰)는 Gemini의 캐시 최소 크기(2.5 Flash 1,024토큰)보다 짧으므로 기본으로 끈다
+# (켜도 프롬프트가 CONTEXT_CACHE_MIN_TOKENS보다 짧으면 API를 부르지 않는다)
+CONTEXT_CACHE_ENABLED = os.getenv('CONTEXT_CACHE_ENABLED', '0') == '1' and fake_model is None
+CONTEXT_CACHE_OPTIONS = dict(
+    ttl=int(os.getenv('CONTEXT_CACHE_TTL', 3600)),
+    timeout=float(os.getenv('CONTEXT_CACHE_TIMEOUT', 5)),
+    min_tokens=int(os.getenv('CONTEXT_CACHE_MIN_TOKENS', 1024)),
+    enabled=CONTEXT_CACHE_ENABLED,
+)
+context_cache = ContextCache(MODEL_NAME, SYSTEM_PROMPT, **CONTEXT_CACHE_OPTIONS)
+context_caches = {MODEL_NAME: context_cache}
+context_caches_lock = threading.Lock()
+# 캐시 콘텐츠로 올린 시스템 프롬프트도 입력 토큰 할당량에 들어간다
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+def get_model(model_name=None):
+    if fake_model is not None:
+        return fake_model
+    model_name = model_name or MODEL_NAME
+    cache = context_caches.get(model_name)
+    if cache is None:
+        with context_caches_lock:
+            cache = context_caches.get(model_name)
+            if cache is None:
+                cache = ContextCache(model_name, SYSTEM_PROMPT, **CONTEXT_CACHE_OPTIONS)
+                context_caches[model_name] = cache
+    return cache.model()
+
+def thinking_supported():
+    return fake_model is None and gemini.supports_thinking_budget()
+
+# 요청별 토큰 사용량 (usage_metadata 기준)
+token_usage = {
+    'requests': 0,
+    'prompt_tokens': 0,
+    'cached_tokens': 0,
+    'output_tokens': 0,
+    'last_prompt_tokens': 0,
+    'last_cached_tokens': 0,
+}
+token_usage_lock = threading.Lock()
+
+def record_usage(response):
+    # 할당량 정산에 쓸 실제 토큰 수(입력 + 출력)를 돌려준다
+    usage = getattr(response, 'usage_metadata', None)
+    if not usage:
+        return None
+    metrics.record_tokens(usage)
+    with token_usage_lock:
+        token_usage['requests'] += 1
+        token_usage['prompt_tokens'] += usage.prompt_token_count
+        token_usage['cached_tokens'] += usage.cached_content_token_count
+        token_usage['output_tokens'] += usage.candidates_token_count
+        token_usage['last_prompt_tokens'] = usage.prompt_token_count
+        token_usage['last_cached_tokens'] = usage.cached_content_token_count
+    return usage.prompt_token_count + usage.candidates_token_count
+
+def token_usage_stats():
+    with token_usage_lock:
+        stats = dict(token_usage)
+    requests_count = stats['requests'] or 1
+    stats['avg_prompt_tokens'] = round(stats['prompt_tokens'] / requests_count, 1)
+    stats['avg_cached_tokens'] = round(stats['cached_tokens'] / requests_count, 1)
+    stats['avg_output_tokens'] = round(stats['output_tokens'] / requests_count, 1)
+    return stats
+
+# 대화 기록은 최근 턴부터 토큰 예산만큼만 원문으로 보내고, 예산에서 밀려난 턴은 세션별 요약에 합친다
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 2000))
+
+SUMMARY_PROMPT = """다음은 불교 신행, 교리 상담 챗봇 '선다미'와 사용자의 대화입니다.
+이후 상담에서 맥락을 이어갈 수 있도록 사용자의 상황과 고민, 감정, 이미 나눈 가르침과 중요한 사실을
+5문장 이내의 한국어로 요약해주세요. 요약 내용만 작성해주세요."""
+
+summary_model = fake_model or gemini.LazyModel(MODEL_NAME, system_instruction=SUMMARY_PROMPT)
+
+def summarize_turns(previous_summary, turns):
+    lines = []
+    if previous_summary:
+        lines.append(f"[이전 요약]\n{previous_summary}\n")
+    lines.append("[대화]")
+    lines.extend(f"{ROLE_LABELS[role]}: {text}" for role, text in turns)
+    prompt = "\n".join(lines)
+    estimate = estimate_tokens(SUMMARY_PROMPT) + estimate_tokens(prompt) + QUOTA_OUTPUT_TOKENS
+    with quota.reserve(estimate, time.monotonic() + 30) as ticket:
+        with metrics.model_call('summary', 'summary'):
+            response = summary_model.generate_content(prompt, request_options=request_options(30 - ticket.waited))
+        ticket.used = record_usage(response)
+    return clean_markdown(response.text).strip()
+
+summarizer = Summarizer(session_store, summarize_turns,
+                        workers=int(os.getenv('SUMMARY_WORKERS', 2)))
+window_stats = WindowStats()
+
+def load_history(session_id):
+    # 토큰 예산에 맞춘 대화 기록 창을 고르고, 창에서 밀려난 턴이 있으면 백그라운드 요약을 예약
+    context = session_store.context(session_id)
+    window, pending, upto = select_window(context, HISTORY_TOKEN_BUDGET)
+    summarizer.schedule(session_id, pending, upto)
+    return window
+
+ERROR_MESSAGE = "죄송합니다. 오류가 발생했습니다."
+
+# 경전 구절 검색 색인 (tools/build_scripture_index.py로 생성)
+# 지정하면 질문과 관련된 구절을 찾아 프롬프트에 함께 넣어 출처를 근거로 답하게 한다
+# 교리·경전에 관한 메시지(router의 DOCTRINE_TERMS)에만 찾는다. 안부나 잡담에까지 구절을 붙이면 프롬프트만 길어진다
+SCRIPTURE_INDEX = os.getenv('SCRIPTURE_INDEX')
+SCRIPTURE_TOP_K = int(os.getenv('SCRIPTURE_TOP_K', 3))
+SCRIPTURE_MIN_SCORE = float(os.getenv('SCRIPTURE_MIN_SCORE', 0))
+scripture_index = None
+if SCRIPTURE_INDEX:
+    scripture_index = ScriptureIndex(SCRIPTURE_INDEX, budget_ms=float(os.getenv('SCRIPTURE_BUDGET_MS', 5)))
+
+def find_passages(user_message):
+    # 관련 구절을 출처와 함께 프롬프트에 넣을 문자열로 만든다 (찾지 못하면 None)
+    if scripture_index is None or not about_doctrine(user_message):
+        return None
+    results = [r for r in scripture_index.search(user_message, SCRIPTURE_TOP_K) if r[0] >= SCRIPTURE_MIN_SCORE]
+    if not results:
+        return None
+    lines = ["[참고 경전 구절] 질문과 관련 있는 구절만 참고하고, 인용할 때는 [ ] 안의 출처를 밝혀주세요."]
+    lines.extend(f"[{source}] {text}" for _, source, text in results)
+    return "\n".join(lines)
+
+def build_contents(user_message, window, profile=WEB_PROFILE):
+    # 대화 기록 창과 이번 사용자 메시지를 Gemini 대화 형식(contents)으로 구성
+    # 시스템 프롬프트는 모델의 system_instruction에 있으므로 여기에는 포함하지 않는다
+    # 생성 프로필의 답변 형식 안내(hint)는 이번 사용자 메시지 뒤에 별도 part로 붙인다
+    turns = window.turns + [(USER, user_message)]
+    # 첫 턴이 사용자 메시지가 되도록 앞부분의 선다미 답변은 버린다
+    while turns[0][0] != USER:
+        turns = turns[1:]
+    contents = [{'role': role, 'parts': [text]} for role, text in turns]
+    passages = find_passages(user_message)
+    if passages:
+        # 검색한 경전 구절은 이번 사용자 메시지 앞에 별도 part로 붙인다
+        contents[-1]['parts'].insert(0, passages)
+    if profile.hint:
+        contents[-1]['parts'].append(profile.hint)
+    if window.summary:
+        # 오래된 대화의 요약은 첫 사용자 메시지 앞에 별도 part로 붙인다
+        contents[0]['parts'].insert(0, f"[이전 대화 요약]\n{window.summary}")
+    return contents
+
+def clean_markdown(text):
+    # 마크다운 강조 문법(*, **) 제거
+    # 문자 단위로만 지우므로 스트리밍 청크에 각각 적용해도 경계에서 결과가 달라지지 않는다
+    return text.replace('*', '')
+
+def commit_turn(session_id, user_message, answer):
+    # 답변이 끝까지 만들어진 경우에만 사용자 메시지와 답변을 함께 대화 기록에 추가
+    session_store.append(session_id, USER, user_message)
+    session_store.append(session_id, MODEL, answer)
+
+def cached_answer(user_message, window, profile=WEB_PROFILE):
+    # 이전 대화 맥락이 있으면 같은 질문이라도 답이 달라질 수 있으므로 캐시를 쓰지 않는다
+    # 답변 길이가 프로필마다 다르므로 캐시는 프로필별로 따로 찾는다
+    if has_context(window):
+        return None
+    answer = None
+    if RESPONSE_CACHE_ENABLED:
+        answer = response_cache.get(user_message, profile.name)
+    if answer is None and SIMILAR_CACHE_ENABLED:
+        answer = similar_cache.get(user_message, profile.name)
+    return answer
+
+def remember_answer(user_message, window, answer, profile=WEB_PROFILE):
+    if has_context(window) or not answer:
+        return
+    if RESPONSE_CACHE_ENABLED:
+        response_cache.put(user_message, answer, profile.name)
+    if SIMILAR_CACHE_ENABLED:
+        similar_cache.put(user_message, answer, profile.name)
+
+def request_options(timeout):
+    # SDK 기본값(타임아웃 600초, 자체 재시도)을 끄고 남은 시간만큼만 기다린다 (재시도는 model_caller가 담당)
+    return {'timeout': max(timeout, 0.1), 'retry': None}
+
+def estimate_request_tokens(contents, profile):
+    # 할당량 예약용 추정치: 시스템 프롬프트 + 대화 내용 + 예상 출력
+    prompt = sum(estimate_tokens(part) for content in contents for part in content['parts'])
+    output = min(QUOTA_OUTPUT_TOKENS, profile.output_tokens or QUOTA_OUTPUT_TOKENS)
+    return SYSTEM_PROMPT_TOKENS + prompt + output
+
+@contextmanager
+def profiled_call(mode, profile):
+    # 모델 호출 시간을 지표에 남기고, 프로필의 지연 기록(출력 토큰 상한 조정)에도 넣는다
+    # 마감 시간 초과로 끝난 호출도 지연에 넣어야 SLO를 넘는 상황을 알아챌 수 있다
+    with metrics.model_call(mode, profile.name) as started:
+        try:
+            yield started
+        finally:
+            profile.observe(time.perf_counter() - started, thinking_supported())
+            metrics.record_output_tokens(profile.name, profile.output_tokens)
+
+def call_model(contents, deadline, profile):
+    estimate = estimate_request_tokens(contents, profile)
+    config = profile.generation_config(thinking_supported())
+
+    def attempt(timeout):
+        # 재시도와 헤지 요청도 각각 할당량을 쓴다
+        with quota.reserve(estimate, deadline) as ticket:
+            with profiled_call('call', profile), tracing.span('gemini'):
+                response = get_model(profile.model).generate_content(
+                    contents, generation_config=config, request_options=request_options(timeout - ticket.waited))
+            ticket.used = record_usage(response)
+        return response
+
+    # 헤지 요청은 다른 스레드에서 실행되므로 요청 추적을 넘겨준다
+    return answer_text(model_caller.call(tracing.bind(attempt), deadline), profile)
+
+def answer_text(response, profile, text=None):
+    # 응답의 답변 텍스트. 텍스트 없이 끝났으면 끝난 이유를 지표와 로그에 남기고 ''를 돌려준다
+    # (스트리밍은 조각을 모은 text와 마지막 조각을 넘긴다)
+    if text is None:
+        text = gemini.response_text(response)
+    if not text:
+        reason = gemini.finish_reason(response)
+        metrics.record_empty_answer(profile.name, reason)
+        log.warning("Model finished without text", extra={
+            'profile': profile.name, 'finish_reason': reason, 'max_output_tokens': profile.output_tokens})
+    return text
+
+def stream_model(contents, deadline, profile):
+    estimate = estimate_request_tokens(contents, profile)
+    config = profile.generation_config(thinking_supported())
+
+    def attempt(timeout):
+        with quota.reserve(estimate, deadline) as ticket:
+            with profiled_call('stream', profile) as started:
+                response = get_model(profile.model).generate_content(
+                    contents, stream=True, generation_config=config,
+                    request_options=request_options(timeout - ticket.waited))
+                first = True
+                streamed = False
+                chunk = None
+                for chunk in response:
+                    if first:
+                        metrics.record_first_chunk(started)
+                        first = False
+                    text = gemini.response_text(chunk)
+                    if text:
+                        streamed = True
+                        yield text
+                if not streamed:
+                    # 텍스트 없이 끝난 스트림 (끝난 이유는 마지막 조각에 있다)
+                    answer_text(chunk, profile, '')
+            ticket.used = record_usage(response)
+
+    yield from model_caller.stream(attempt, deadline)
+
+def generate_answer(user_message, window, deadline=None, user=None, profile=WEB_PROFILE):
+    with tracing.span('prompt'):
+        contents = build_contents(user_message, window, profile)
+    window_stats.record(window, estimate_tokens(user_message))
+    if deadline is None:
+        deadline = time.monotonic() + CHAT_DEADLINE
+    
+    # model: 실행기 대기 + Gemini 호출(재시도 포함), gemini: 그중 Gemini 호출 시간
+    with tracing.span('model'):
+        text = model_pool.call(tracing.bind(call_model), contents, deadline, profile, deadline=deadline, user=user)
+    
+    # 마크다운 문법 제거
+    with tracing.span('clean'):
+        return clean_markdown(text)
+
+def coalesce_key(user_message, window, profile=WEB_PROFILE):
+    # 묶어 처리할 수 있는 질문이면 키를, 아니면 None을 돌려준다 (캐시와 같은 조건, 프로필이 같을 때만)
+    if not SINGLE_FLIGHT_ENABLED or has_context(window):
+        return None
+    key = normalize_question(user_message)
+    return f"{profile.name}|{key}" if key else None
+
+def answer_once(user_message, window, deadline=None, user=None, profile=WEB_PROFILE):
+    # 같은 질문이 이미 생성 중이면 새로 부르지 않고 그 결과를 기다린다
+    def generate():
+        answer = generate_answer(user_message, window, deadline, user, profile)
+        remember_answer(user_message, window, answer, profile)
+        return answer
+
+    key = coalesce_key(user_message, window, profile)
+    if key is None:
+        return generate()
+    return single_flight.do(key, generate, deadline)
+
+def fallback_answer(user_message, profile=WEB_PROFILE):
+    # Gemini 회로가 열려 있을 때: 맥락과 관계없이 캐시된 답변이 있으면 그것을, 없으면 안내 문구를 돌려준다
+    return cached_answer(user_message, EMPTY_WINDOW, profile) or UNAVAILABLE_MESSAGE
+
+def route_message(user_message, window, profile):
+    # (경로 결정, 그 경로로 부를 생성 프로필)
+    decision = router.route(user_message, has_context(window))
+    return decision, lite_profiles[profile.name] if decision.route == LITE else profile
+
+def get_chat_response(user_message, session_id, deadline=None, profile=WEB_PROFILE):
+    # 모델 호출 실행기가 혼잡하면 PoolBusy를 그대로 올려 호출 측에서 채널에 맞게 응답하도록 한다
+    route_profile = profile
     try:
-        # 대화 기록에 사용자 메시지 추가
-        conversation_history.append(f"사용자: {user_message}")
-        
-        # 최근 5개의 대화만 사용
-        recent_conversation = "\n".join(conversation_history[-5:])
+        with tracing.span('session'):
+            window = load_history(session_id)
+        with tracing.span('route'):
+            decision, route_profile = route_message(user_message, window, profile)
+        started = time.perf_counter()
         
-        # 전체 프롬프트 구성
-        full_prompt = f"{SYSTEM_PROMPT}\n\n{recent_conversation}\n선다미:"
+        if decision.route == TEMPLATE:
+            clean_response = decision.answer
+            router.record(profile.name, decision, time.perf_counter() - started)
+        else:
+            with tracing.span('cache'):
+                clean_response = cached_answer(user_message, window, route_profile)
+            if clean_response is None:
+                clean_response = answer_once(user_message, window, deadline, session_id, route_profile)
+                router.record(profile.name, decision, time.perf_counter() - started)
+            clean_response = clean_response or INCOMPLETE_MESSAGE
         
-        response = model.generate_content(full_prompt)
-        
-        # 마크다운 문법 제거
-        clean_response = response.text.replace('*', '').replace('**', '')
-        
-        # 챗봇 응답을 대화 기록에 추가
-        conversation_history.append(f"선다미: {clean_response}")
+        with tracing.span('save'):
+            commit_turn(session_id, user_message, clean_response)
         
         return clean_response
+    except PoolBusy as e:
+        metrics.record_error('chat', e)
+        raise
+    except CircuitOpen as e:
+        metrics.record_error('chat', e)
+        return fallback_answer(user_message, route_profile)
+    except Exception as e:
+        metrics.record_error('chat', e)
+        log.exception("Chat request failed", extra={'where': 'chat'})
+        return ERROR_MESSAGE
+
+def stream_chat_response(user_message, session_id, deadline=None, profile=WEB_PROFILE):
+    # 답변을 생성되는 대로 조금씩 돌려주는 제너레이터 (정리된 텍스트 조각을 yield)
+    with tracing.span('session'):
+        window = load_history(session_id)
+    with tracing.span('route'):
+        decision, route_profile = route_message(user_message, window, profile)
+    started = time.perf_counter()
+    with tracing.span('cache'):
+        cached = decision.answer or cached_answer(user_message, window, route_profile)
+    if cached is not None:
+        yield cached
+        if decision.route == TEMPLATE:
+            router.record(profile.name, decision, time.perf_counter() - started)
+        with tracing.span('save'):
+            commit_turn(session_id, user_message, cached)
+        return
+
+    key = coalesce_key(user_message, window, route_profile)
+    if key is None:
+        answer = yield from stream_answer(user_message, window, deadline, session_id, route_profile)
+    else:
+        answer = yield from stream_once(key, user_message, window, deadline, session_id, route_profile)
+    if not answer:
+        answer = INCOMPLETE_MESSAGE
+        yield answer
+    router.record(profile.name, decision, time.perf_counter() - started)
+    with tracing.span('save'):
+        commit_turn(session_id, user_message, answer)
+
+def stream_once(key, user_message, window, deadline=None, user=None, profile=WEB_PROFILE):
+    # answer_once의 스트리밍 버전: 먼저 받은 요청만 모델을 스트리밍하고,
+    # 같은 질문의 다른 요청은 그 답변이 끝나면 한 번에 받는다
+    flight, leader = single_flight.join(key)
+    if not leader:
+        answer = flight.wait(deadline)
+        yield answer
+        return answer
+    try:
+        with single_flight.hold(key, deadline) as slot:
+            answer = slot.answer
+            if answer is not None:
+                yield answer
+            else:
+                answer = yield from stream_answer(user_message, window, deadline, user, profile)
+                slot.publish(answer)
+    except GeneratorExit:
+        # 클라이언트가 연결을 끊어 스트림이 중단되면 기다리던 요청은 혼잡 응답을 받는다
+        single_flight.finish(key, flight, error=QueueTimeout('leading stream was cancelled'))
+        raise
     except Exception as e:
-        print(f"Error: {str(e)}")
-        print("Traceback:")
-        print(traceback.format_exc())
-        return "죄송합니다. 오류가 발생했습니다."
+        single_flight.finish(key, flight, error=e)
+        raise
+    single_flight.finish(key, flight, answer)
+    return answer
+
+def stream_answer(user_message, window, deadline=None, user=None, profile=WEB_PROFILE):
+    # 모델 스트림을 정리된 텍스트 조각으로 yield하고, 완성된 답변을 반환값으로 돌려준다
+    with tracing.span('prompt'):
+        contents = build_contents(user_message, window, profile)
+    window_stats.record(window, estimate_tokens(user_message))
+    parts = []
+    if deadline is None:
+        deadline = time.monotonic() + CHAT_DEADLINE
+    # 스트리밍 응답의 model 단계는 클라이언트에 조각을 보내는 시간까지 포함한다
+    with tracing.span('model'):
+        for text in model_pool.stream(stream_model, contents, deadline, profile, deadline=deadline, user=user):
+            text = clean_markdown(text)
+            if text:
+                parts.append(text)
+                yield text
+    # 스트림이 끝까지 완료된 경우에만 캐시에 반영
+    answer = ''.join(parts)
+    remember_answer(user_message, window, answer, profile)
+    return answer
+
+def sse_event(data, event=None):
+    # Server-Sent Events 형식 (data는 줄바꿈이 섞이지 않도록 JSON으로 인코딩)
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+def get_web_session_id():
+    # 헤더 토큰(X-Session-Id)을 우선 사용하고, 없으면 쿠키를 사용
+    # 두 번째 값은 응답에 쿠키를 (재)발급해야 하는지 여부
+    session_id = request.headers.get('X-Session-Id')
+    if session_id and SESSION_ID_PATTERN.match(session_id):
+        return session_id, False
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if session_id and SESSION_ID_PATTERN.match(session_id):
+        return session_id, True
+    return uuid.uuid4().hex, True
+
+def get_kakao_session_id(req):
+    user_id = req.get('userRequest', {}).get('user', {}).get('id')
+    if user_id:
+        return f"kakao:{user_id}"
+    # 사용자 식별자가 없으면 이전 맥락 없이 응답
+    return f"kakao-anon:{uuid.uuid4().hex}"
+
+def set_session_cookie(resp, session_id):
+    resp.set_cookie(SESSION_COOKIE, session_id, max_age=session_store.ttl,
+                    httponly=True, samesite='Lax', secure=request.is_secure)
+    return resp
+
+def busy_response():
+    resp = jsonify({'response': BUSY_MESSAGE})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = str(BUSY_RETRY_AFTER)
+    return resp
+
+def rate_limit(channel, user):
+    # 사용자 요청 한도를 넘었으면 다시 시도할 수 있을 때까지의 시간(초)을, 아니면 0을 돌려준다
+    wait = rate_limiters[channel].acquire(user)
+    if wait:
+        metrics.record_rate_limited(channel)
+    return wait
+
+def rate_limited_response(wait):
+    resp = jsonify({'response': RATE_LIMIT_MESSAGE})
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(retry_after_seconds(wait))
+    return resp
+
+def require_admin():
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        abort(404)
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    data = request.json
-    user_message = data.get('message', '')
-    response = get_chat_response(user_message)
-    return jsonify({'response': response})
+    with tracing.span('parse'):
+        data = request.json
+        user_message = data.get('message', '')
+    session_id, needs_cookie = get_web_session_id()
+    tracing.annotate(session_id=session_id, message=user_message)
+    wait = rate_limit('chat', session_id)
+    if wait:
+        return rate_limited_response(wait)
+    try:
+        response = get_chat_response(user_message, session_id, time.monotonic() + CHAT_DEADLINE)
+    except PoolBusy:
+        return busy_response()
+    with tracing.span('serialize'):
+        resp = jsonify({'response': response})
+    if needs_cookie:
+        set_session_cookie(resp, session_id)
+    return resp
+
+# 답변을 Server-Sent Events로 스트리밍하는 엔드포인트
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    with tracing.span('parse'):
+        data = request.json
+        user_message = data.get('message', '')
+    session_id, needs_cookie = get_web_session_id()
+    tracing.annotate(session_id=session_id, message=user_message)
+    wait = rate_limit('chat', session_id)
+    if wait:
+        return rate_limited_response(wait)
+    # 스트림이 시작되면 상태 코드를 바꿀 수 없으므로, 이미 혼잡하면 미리 거절
+    if model_pool.saturated():
+        return busy_response()
+    deadline = time.monotonic() + CHAT_DEADLINE
+
+    def generate():
+        try:
+            for text in stream_chat_response(user_message, session_id, deadline):
+                yield sse_event({'delta': text})
+            yield sse_event({}, event='done')
+        except PoolBusy as e:
+            metrics.record_error('chat_stream', e)
+            yield sse_event({'error': BUSY_MESSAGE}, event='error')
+        except CircuitOpen as e:
+            # 회로가 열려 있으면 첫 조각을 보내기 전에 실패하므로 대체 답변을 그대로 보낸다
+            metrics.record_error('chat_stream', e)
+            yield sse_event({'delta': fallback_answer(user_message)})
+            yield sse_event({}, event='done')
+        except Exception as e:
+            metrics.record_error('chat_stream', e)
+            log.exception("Chat stream failed", extra={'where': 'chat_stream'})
+            yield sse_event({'error': ERROR_MESSAGE}, event='error')
+
+    resp = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    # 프록시(nginx 등)가 응답을 모아서 보내지 않도록
+    resp.headers['X-Accel-Buffering'] = 'no'
+    if needs_cookie:
+        set_session_cookie(resp, session_id)
+    return resp
+
+# 워커 준비(warm-up): 요청을 받기 전에 SDK를 불러오고, 캐시 콘텐츠를 찾고, Gemini 연결을 미리 맺어 둔다.
+# gunicorn에서는 post_worker_init에서 연결을 받기 전에 실행하고(gunicorn.conf.py),
+# 그 외에는 /ready를 처음 부를 때 백그라운드로 실행한다. 끝나면 /ready가 200으로 바뀐다.
+# 연결이 끊기지 않도록 GEMINI_KEEPALIVE_INTERVAL초마다 가벼운 count_tokens 요청을 보낸다.
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', 10))
+GEMINI_KEEPALIVE_INTERVAL = float(os.getenv('GEMINI_KEEPALIVE_INTERVAL', 240))
+WARMUP_PING_TEXT = "안녕하세요"
+warm_up_state = {'ready': False, 'started': False, 'phases_ms': {}, 'errors': {}}
+warm_up_lock = threading.Lock()
+
+def preload():
+    # gunicorn preload_app: 마스터에서 fork 전에 무거운 import만 끝내 둔다 (연결은 fork 뒤 워커에서 맺는다)
+    if fake_model is None:
+        gemini.sdk()
+
+def ping_model(timeout):
+    return summary_model.count_tokens(WARMUP_PING_TEXT, request_options=request_options(timeout))
+
+def warm_up():
+    with warm_up_lock:
+        if warm_up_state['started']:
+            return warm_up_state
+        warm_up_state['started'] = True
+
+    deadline = time.monotonic() + WARMUP_TIMEOUT
+    phases = [
+        ('sdk', preload),
+        ('context_cache', lambda: context_cache.refresh(deadline - time.monotonic())),
+        ('connection', lambda: ping_model(deadline - time.monotonic())),
+    ]
+    if scripture_index:
+        phases.append(('scripture_index', scripture_index.load))
+    for name, step in phases:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            # 준비 단계가 실패해도 요청은 받는다 (업스트림 장애는 회로 차단기가 처리)
+            metrics.record_error('warm_up', e)
+            log.warning("Warm-up step failed", exc_info=e, extra={'where': 'warm_up', 'step': name})
+            warm_up_state['errors'][name] = str(e)
+        warm_up_state['phases_ms'][name] = round((time.perf_counter() - started) * 1000, 1)
+
+    if GEMINI_KEEPALIVE_INTERVAL > 0:
+        threading.Thread(target=keep_alive, name='gemini-keepalive', daemon=True).start()
+    warm_up_state['ready'] = True
+    return warm_up_state
+
+def keep_alive():
+    while True:
+        time.sleep(GEMINI_KEEPALIVE_INTERVAL)
+        try:
+            ping_model(WARMUP_TIMEOUT)
+        except Exception as e:
+            log.warning("Gemini keep-alive failed", exc_info=e, extra={'where': 'keep_alive'})
+
+# 로드 밸런서·오토스케일러용 준비 상태 확인 (워커 준비가 끝나기 전에는 503)
+@app.route('/ready')
+def ready():
+    if not warm_up_state['started']:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    body = {'ready': warm_up_state['ready'], 'phases_ms': warm_up_state['phases_ms']}
+    return jsonify(body), 200 if warm_up_state['ready'] else 503
+
+# 운영 상태 확인용 엔드포인트
+@app.route('/admin/stats')
+def admin_stats():
+    require_admin()
+    return jsonify({
+        'sessions': session_store.stats(),
+        'model_pool': model_pool.stats(),
+        'async_model_pool': async_model_pool.stats(),
+        'rate_limits': {channel: limiter.stats() for channel, limiter in rate_limiters.items()},
+        'response_cache': response_cache.stats(),
+        'similar_cache': similar_cache.stats(),
+        'context_cache': context_cache.status(),
+        'single_flight': single_flight.stats(),
+        'model_calls': model_caller.stats(),
+        'quota': quota.stats(),
+        'generation': {
+            'thinking_supported': thinking_supported() if gemini.loaded() else None,
+            'profiles': {name: profile.stats() for name, profile in {**generation_profiles, **lite_profiles}.items()},
+        },
+        'router': router.stats(),
+        'tracing': tracer.stats(),
+        'logging': log_pipeline.stats(),
+        'capture': traffic_capture.stats(),
+        'warm_up': warm_up_state,
+        'scripture': scripture_index.stats() if scripture_index else None,
+        'tokens': token_usage_stats(),
+        'history': {
+            'token_budget': HISTORY_TOKEN_BUDGET,
+            'window': window_stats.stats(),
+            'summaries': summarizer.stats(),
+        },
+    })
+
+# 최근 경고·오류 (같은 오류는 한 항목에 count로 묶임, traceback은 예외 종류별로 가끔만 남는다)
+@app.route('/admin/errors')
+def admin_errors():
+    require_admin()
+    limit = request.args.get('limit', default=50, type=int)
+    return jsonify({
+        'logging': log_pipeline.stats(),
+        'errors': log_pipeline.recent_errors(limit),
+    })
+
+# Prometheus 수집용 엔드포인트 (gunicorn 워커 전체 합계는 README의 PROMETHEUS_MULTIPROC_DIR 참고)
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN:
+        token = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(token, f"Bearer {METRICS_TOKEN}"):
+            abort(404)
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+# 답변 캐시 조회/삭제
+@app.route('/admin/cache', methods=['GET', 'DELETE'])
+def admin_cache():
+    require_admin()
+    if request.method == 'DELETE':
+        # ?question=... 이 있으면 해당 질문만, 없으면 전체 삭제
+        question = request.args.get('question')
+        return jsonify({
+            'purged': response_cache.purge(question),
+            'similar_purged': similar_cache.purge(question),
+        })
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        'stats': response_cache.stats(),
+        'similar_stats': similar_cache.stats(),
+        'entries': response_cache.entries(limit),
+    })
+
+# 답변 캐시 미리 채우기
+# {"questions": ["..."]} 는 답변을 새로 생성하고, {"entries": [{"question": "...", "answer": "..."}]} 는 그대로 저장
+# (entries에 "profile"을 주면 그 프로필의 캐시에만 저장한다. tools/batch.py --warm-url이 이 형식으로 보낸다)
+@app.route('/admin/cache/warm', methods=['POST'])
+def admin_cache_warm():
+    require_admin()
+    data = request.get_json(silent=True) or {}
+    result = {'stored': 0, 'generated': 0, 'skipped': 0, 'failed': 0}
+
+    # 생성하는 답변은 프로필마다 따로 만든다 ("profiles": [...]로 고를 수 있고, 기본은 모든 프로필)
+    profiles = [generation_profiles[name] for name in data.get('profiles', generation_profiles)
+                if name in generation_profiles]
+
+    # 가벼운 모델 경로로 만든 답변은 <채널>_lite 프로필의 캐시에 들어간다
+    cache_profiles = {**generation_profiles, **{p.name: p for p in lite_profiles.values()}}
+    for entry in data.get('entries', []):
+        if entry.get('question') and entry.get('answer'):
+            if 'profile' in entry and entry['profile'] not in cache_profiles:
+                result['failed'] += 1
+                continue
+            targets = [cache_profiles[entry['profile']]] if 'profile' in entry else generation_profiles.values()
+            for profile in targets:
+                remember_answer(entry['question'], EMPTY_WINDOW, entry['answer'], profile)
+            result['stored'] += 1
+
+    for question, profile in ((q, p) for q in data.get('questions', []) for p in profiles):
+        if not data.get('refresh') and response_cache.contains(question, profile.name):
+            result['skipped'] += 1
+            continue
+        try:
+            answer = generate_answer(question, EMPTY_WINDOW, profile=profile)
+            remember_answer(question, EMPTY_WINDOW, answer, profile)
+            result['generated'] += 1
+        except Exception as e:
+            metrics.record_error('cache_warm', e)
+            log.exception("Cache warm failed", extra={'where': 'cache_warm', 'question': question})
+            result['failed'] += 1
+
+    return jsonify(result)
+
+def kakao_text_response(text):
+    # 카카오톡 응답 형식
+    return {
+        "version": "2.0",
+        "template": {
+            "outputs": [
+                {
+                    "simpleText": {
+                        "text": text
+                    }
+                }
+            ]
+        }
+    }
+
+def post_kakao_callback(callback_url, payload, deadline):
+    # 네트워크 오류나 5xx 응답은 마감 시각 안에서 지수 백오프로 재시도
+    # 4xx는 콜백 URL이 만료되었거나 이미 사용된 경우이므로 재시도하지 않는다
+    for attempt in range(KAKAO_CALLBACK_RETRIES + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            resp = requests.post(callback_url, json=payload, timeout=min(remaining, 10))
+            if resp.status_code < 400:
+                return True
+            if resp.status_code < 500:
+                log.warning("Kakao callback rejected", extra={
+                    'where': 'kakao_callback', 'status': resp.status_code, 'body': resp.text[:200]})
+                return False
+            log.warning("Kakao callback failed", extra={
+                'where': 'kakao_callback', 'attempt': attempt + 1, 'status': resp.status_code})
+        except requests.RequestException as e:
+            log.warning("Kakao callback failed", exc_info=e, extra={'where': 'kakao_callback', 'attempt': attempt + 1})
+        time.sleep(max(0, min(0.5 * 2 ** attempt, deadline - time.monotonic())))
+    log.error("Kakao callback gave up", extra={'where': 'kakao_callback', 'callback_url': callback_url})
+    return False
+
+def answer_kakao_callback(callback_url, user_message, session_id, deadline):
+    try:
+        # 콜백 전송에 쓸 시간을 남겨두고 답변 생성 마감 시각을 정한다
+        try:
+            response = get_chat_response(user_message, session_id, deadline - KAKAO_CALLBACK_SEND_MARGIN,
+                                         KAKAO_PROFILE)
+        except PoolBusy:
+            response = BUSY_MESSAGE
+        post_kakao_callback(callback_url, kakao_text_response(response), deadline)
+    except Exception as e:
+        metrics.record_error('kakao_callback', e)
+        log.exception("Kakao callback answer failed", extra={'where': 'kakao_callback'})
 
 # 카카오톡 챗봇 연동을 위한 엔드포인트
 @app.route('/kakao', methods=['POST'])
 def kakao_chat():
     try:
-        req = request.get_json()
-        user_message = req['userRequest']['utterance']
+        received_at = time.monotonic()
+        with tracing.span('parse'):
+            req = request.get_json()
+            user_message = req['userRequest']['utterance']
+            session_id = get_kakao_session_id(req)
+            callback_url = req['userRequest'].get('callbackUrl')
+        tracing.annotate(session_id=session_id, message=user_message,
+                         callback=bool(callback_url and KAKAO_CALLBACK_ENABLED))
+        if rate_limit('kakao', session_id):
+            # 카카오 스킬은 항상 200과 스킬 응답 형식으로 돌려줘야 한다
+            return jsonify(kakao_text_response(RATE_LIMIT_MESSAGE))
         
-        response = get_chat_response(user_message)
+        if callback_url and KAKAO_CALLBACK_ENABLED:
+            # 콜백 모드: 답변은 백그라운드에서 생성해 callbackUrl로 전송
+            callback_executor.submit(answer_kakao_callback, callback_url, user_message,
+                                     session_id, received_at + KAKAO_CALLBACK_DEADLINE)
+            return jsonify({
+                "version": "2.0",
+                "useCallback": True,
+                "data": {
+                    "text": KAKAO_CALLBACK_WAIT_MESSAGE
+                }
+            })
         
-        # 카카오톡 응답 형식
-        res = {
-            "version": "2.0",
-            "template": {
-                "outputs": [
-                    {
-                        "simpleText": {
-                            "text": response
-                        }
-                    }
-                ]
-            }
-        }
-        return jsonify(res)
+        response = get_chat_response(user_message, session_id, received_at + KAKAO_DEADLINE, KAKAO_PROFILE)
+        with tracing.span('serialize'):
+            return jsonify(kakao_text_response(response))
+    except PoolBusy:
+        # 카카오 스킬은 항상 200과 스킬 응답 형식으로 돌려줘야 한다
+        return jsonify(kakao_text_response(BUSY_MESSAGE))
     except Exception as e:
-        print(f"Error in kakao_chat: {str(e)}")
-        return jsonify({
-            "version": "2.0",
-            "template": {
-                "outputs": [
-                    {
-                        "simpleText": {
-                            "text": "죄송합니다. 오류가 발생했습니다."
-                        }
-                    }
-                ]
-            }
-        })
+        metrics.record_error('kakao', e)
+        log.exception("Kakao request failed", extra={'where': 'kakao'})
+        return jsonify(kakao_text_response(ERROR_MESSAGE))
+
+# 웹 페이지와 정적 파일은 시작할 때 한 번 읽고 압축해 두었다가 그대로 내보낸다
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+assets = AssetBundle(STATIC_DIR)
+# CSS가 참조하는 글꼴을 먼저 등록해야 CSS 안의 주소도 해시된 주소로 바뀐다
+assets.add('fonts/noto-sans-kr-400.woff2')
+assets.add('css/style.css')
+assets.add('js/app.js')
+index_page = html_page(app.jinja_env.get_template('index.html').render(asset_url=assets.url))
 
 @app.route('/')
 def index():
-    return '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>선다미 · 불교 신행 · 교리 상담 챗봇</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
-        <meta name="apple-mobile-web-app-capable" content="yes">
-        <meta name="mobile-web-app-capable" content="yes">
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+KR:wght@300;400;500;700&family=Roboto:wght@300;400;500;700&display=swap');
-
-            :root {
-                --primary-color: #6B4E71;
-                --secondary-color: #A8D5BA;
-                --background-color: #F5F5F5;
-                --text-color: #333333;
-                --chat-bubble-user: #E3F2FD;
-                --chat-bubble-bot: #F1F1F1;
-                --font-main: 'Noto Sans KR', 'Roboto', sans-serif;
-                --border-radius: 1rem;
-                --shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-                --nav-height: env(safe-area-inset-bottom);
-            }
-
-            /* 안드로이드 네비게이션 바 대응 */
-            @supports (padding: max(0px)) {
-                .input-container {
-                    padding-bottom: max(0.75rem, env(safe-area-inset-bottom));
-                }
-            }
-
-            * {
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-                -webkit-tap-highlight-color: transparent;
-            }
-
-            html {
-                font-size: 16px;
-            }
-
-            @media (max-width: 768px) {
-                html {
-                    font-size: 18px;
-                }
-            }
-
-            body {
-                font-family: var(--font-main);
-                background-color: var(--background-color);
-                color: var(--text-color);
-                line-height: 1.6;
-                padding: 0;
-                margin: 0;
-                height: 100vh;
-                overflow: hidden;
-                -webkit-text-size-adjust: 100%;
-            }
-
-            .container {
-                max-width: 1000px;
-                margin: 0 auto;
-                background-color: white;
-                padding: 0;
-                display: flex;
-                flex-direction: column;
-                height: 100vh;
-                height: -webkit-fill-available;
-                height: stretch;
-                position: relative;
-                overflow: hidden;
-            }
-
-            .header {
-                text-align: center;
-                padding: 1rem;
-                background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
-                color: white;
-                box-shadow: var(--shadow);
-                position: sticky;
-                top: 0;
-                z-index: 10;
-                flex-shrink: 0;
-            }
-
-            .header h1 {
-                font-size: 1.5rem;
-                font-weight: 700;
-                margin-bottom: 0.25rem;
-                letter-spacing: -0.5px;
-            }
-
-            .header p {
-                font-size: 0.875rem;
-                opacity: 0.9;
-            }
-
-            .chat-container {
-                flex: 1;
-                overflow-y: auto;
-                padding: 1rem;
-                background-color: #fff;
-                display: flex;
-                flex-direction: column;
-                gap: 0.75rem;
-                -webkit-overflow-scrolling: touch;
-                overscroll-behavior-y: contain;
-                position: relative;
-                padding-bottom: 80px;
-                margin-bottom: 0;
-                max-height: calc(100vh - 80px);
-                height: calc(100vh - 80px);
-                -webkit-transform: translateZ(0);
-                transform: translateZ(0);
-            }
-
-            .message {
-                padding: 0.75rem 1rem;
-                border-radius: var(--border-radius);
-                max-width: 85%;
-                word-wrap: break-word;
-                animation: fadeIn 0.3s ease-out;
-                font-size: 0.95rem;
-                line-height: 1.5;
-                position: relative;
-                cursor: pointer;
-                transition: transform 0.2s, background-color 0.2s;
-            }
-
-            .message:active {
-                transform: scale(0.98);
-            }
-
-            .message.playing {
-                background-color: rgba(107, 78, 113, 0.1);
-            }
-
-            .user-message {
-                background-color: var(--chat-bubble-user);
-                margin-left: auto;
-                border-bottom-right-radius: 0.25rem;
-            }
-
-            .bot-message {
-                background-color: var(--chat-bubble-bot);
-                margin-right: auto;
-                border-bottom-left-radius: 0.25rem;
-            }
-
-            .bot-message strong {
-                font-weight: 700;
-            }
-
-            .bot-message ol {
-                padding-left: 1rem;
-                margin: 0.5rem 0;
-            }
-
-            .bot-message li {
-                margin-bottom: 0.5rem;
-            }
-
-            .bot-message li::marker {
-                font-weight: 700;
-            }
-
-            .loading {
-                display: none;
-                position: relative;
-                left: 0;
-                bottom: auto;
-                gap: 0.4rem;
-                padding: 0.75rem 1rem;
-                background-color: var(--chat-bubble-bot);
-                border-radius: var(--border-radius);
-                max-width: 85%;
-                margin-right: auto;
-                border-bottom-left-radius: 0.25rem;
-            }
-
-            .loading-dot {
-                width: 0.4rem;
-                height: 0.4rem;
-                background-color: var(--primary-color);
-                border-radius: 50%;
-                animation: loading 1.4s infinite ease-in-out;
-            }
-
-            .loading-dot:nth-child(1) { animation-delay: 0s; }
-            .loading-dot:nth-child(2) { animation-delay: 0.2s; }
-            .loading-dot:nth-child(3) { animation-delay: 0.4s; }
-
-            @keyframes loading {
-                0%, 100% { transform: translateY(0); }
-                50% { transform: translateY(-0.5rem); }
-            }
-
-            .input-container {
-                padding: 0.75rem 1rem;
-                background-color: white;
-                border-top: 1px solid #eee;
-                display: flex;
-                gap: 0.75rem;
-                align-items: center;
-                box-shadow: 0 -2px 8px rgba(0, 0, 0, 0.05);
-                position: fixed;
-                bottom: 0;
-                left: 0;
-                right: 0;
-                z-index: 100;
-                width: 100%;
-                max-width: 1000px;
-                margin: 0 auto;
-                box-sizing: border-box;
-                transform: translateZ(0);
-                -webkit-transform: translateZ(0);
-                -webkit-backface-visibility: hidden;
-                backface-visibility: hidden;
-            }
-
-            @supports (-webkit-touch-callout: none) {
-                .input-container {
-                    bottom: env(safe-area-inset-bottom);
-                    padding-bottom: calc(1rem + env(safe-area-inset-bottom));
-                }
-            }
-
-            @media screen and (max-width: 768px) {
-                .input-container {
-                    position: fixed;
-                    bottom: 20px;
-                }
-
-                .disclaimer {
-                    bottom: 0;
-                }
-
-                .chat-container {
-                    height: calc(100vh - 100px);
-                    max-height: calc(100vh - 100px);
-                    padding-bottom: 100px;
-                }
-            }
-
-            /* 삼성 인터넷 브라우저 하위 버전 대응 */
-            @supports not (padding: env(safe-area-inset-bottom)) {
-                .input-container {
-                    position: fixed;
-                    bottom: 20px;
-                }
-
-                .disclaimer {
-                    bottom: 0;
-                }
-
-                .chat-container {
-                    height: calc(100vh - 100px);
-                    max-height: calc(100vh - 100px);
-                    padding-bottom: 100px;
-                }
-            }
-
-            .input-wrapper {
-                display: flex;
-                gap: 0.75rem;
-                width: 100%;
-                align-items: center;
-            }
-
-            .disclaimer {
-                position: fixed;
-                bottom: 0;
-                left: 0;
-                right: 0;
-                text-align: center;
-                font-size: 0.7rem;
-                color: #666;
-                padding: 0.25rem 0;
-                background-color: white;
-                z-index: 99;
-                max-width: 1000px;
-                margin: 0 auto;
-                box-sizing: border-box;
-                border-top: 1px solid #eee;
-                line-height: 1.2;
-            }
-
-            @media (max-width: 768px) {
-                .chat-container {
-                    touch-action: pan-y pinch-zoom;
-                    padding-bottom: calc(180px + env(safe-area-inset-bottom));
-                    max-height: calc(100vh - (180px + env(safe-area-inset-bottom)));
-                }
-
-                .message {
-                    font-size: calc(0.9rem * var(--zoom-level, 1));
-                    max-width: 85%;
-                }
-
-                .disclaimer {
-                    font-size: 0.65rem;
-                    padding: 0.4rem 0.75rem;
-                }
-            }
-
-            #user-input {
-                flex: 1;
-                padding: 0.75rem 1rem;
-                border: 2px solid #eee;
-                border-radius: var(--border-radius);
-                font-size: 0.95rem;
-                font-family: var(--font-main);
-                transition: all 0.3s;
-                background-color: #f8f8f8;
-                -webkit-appearance: none;
-                appearance: none;
-            }
-
-            #user-input:focus {
-                outline: none;
-                border-color: var(--primary-color);
-                background-color: white;
-            }
-
-            .send-btn, .voice-btn {
-                width: 2.75rem;
-                height: 2.75rem;
-                padding: 0.75rem;
-                border-radius: 50%;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                cursor: pointer;
-                transition: all 0.3s;
-                background-color: var(--primary-color);
-                color: white;
-                border: none;
-                box-shadow: var(--shadow);
-            }
-
-            .send-btn:hover, .voice-btn:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
-            }
-
-            .send-btn:active, .voice-btn:active {
-                transform: translateY(0);
-            }
-
-            .send-btn svg, .voice-btn svg {
-                width: 1.25rem;
-                height: 1.25rem;
-            }
-
-            @keyframes fadeIn {
-                from { opacity: 0; transform: translateY(10px); }
-                to { opacity: 1; transform: translateY(0); }
-            }
-
-            .voice-btn.recording {
-                background-color: #ff4444;
-                animation: pulse 1.5s infinite;
-            }
-
-            @keyframes pulse {
-                0% { transform: scale(1); }
-                50% { transform: scale(1.1); }
-                100% { transform: scale(1); }
-            }
-
-            .chat-container::-webkit-scrollbar {
-                width: 6px;
-            }
-
-            .chat-container::-webkit-scrollbar-track {
-                background: #f1f1f1;
-            }
-
-            .chat-container::-webkit-scrollbar-thumb {
-                background: #888;
-                border-radius: 3px;
-            }
-
-            .chat-container::-webkit-scrollbar-thumb:hover {
-                background: #555;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>선다미</h1>
-                <p>불교 신행 · 교리 상담 챗봇</p>
-            </div>
-            <div class="chat-container" id="chat-container">
-                <div class="loading" id="loading">
-                    <div class="loading-dot"></div>
-                    <div class="loading-dot"></div>
-                    <div class="loading-dot"></div>
-                </div>
-            </div>
-            <div class="input-container">
-                <div class="input-wrapper">
-                    <input type="text" id="user-input" placeholder="메시지를 입력하세요...">
-                    <button class="send-btn" onclick="sendMessage()">
-                        <svg width="24" height="24" viewBox="0 0 24 24" fill="white">
-                            <path d="M2.01 21L23 12 2.01 3 2 10l15 2-15 2z"/>
-                        </svg>
-                    </button>
-                    <div class="voice-btn" id="voice-btn" onclick="toggleVoiceRecognition()">
-                        <svg width="24" height="24" viewBox="0 0 24 24" fill="white">
-                            <path d="M12 14c1.66 0 3-1.34 3-3V5c0-1.66-1.34-3-3-3S9 3.34 9 5v6c0 1.66 1.34 3 3 3zm5.91-3c-.49 0-.9.36-.98.85C16.52 14.2 14.47 16 12 16s-4.52-1.8-4.93-4.15c-.08-.49-.49-.85-.98-.85-.61 0-1.09.54-1 1.14.49 3 2.89 5.35 5.91 5.78V20c0 .55.45 1 1 1s1-.45 1-1v-2.08c3.02-.43 5.42-2.78 5.91-5.78.1-.6-.39-1.14-1-1.14z"/>
-                        </svg>
-                    </div>
-                </div>
-            </div>
-            <div class="disclaimer">
-                선다미의 대답이 틀릴 수 있습니다. 중요한 내용은 꼭 확인하세요.
-            </div>
-        </div>
-
-        <script>
-            let recognition = null;
-            let isRecording = false;
-            let isPlaying = false; // 음성 재생 상태 추적
-
-            // 음성 합성 설정
-            const synth = window.speechSynthesis;
-            let currentUtterance = null;
-
-            // 모바일 확대/축소 기능
-            let lastScale = 1;
-            let currentScale = 1;
-            const chatContainer = document.getElementById('chat-container');
-            let initialDistance = 0;
-
-            chatContainer.addEventListener('touchstart', function(e) {
-                if (e.touches.length === 2) {
-                    e.preventDefault();
-                    lastScale = currentScale;
-                    const touch1 = e.touches[0];
-                    const touch2 = e.touches[1];
-                    initialDistance = Math.hypot(
-                        touch2.clientX - touch1.clientX,
-                        touch2.clientY - touch1.clientY
-                    );
-                }
-            });
-
-            chatContainer.addEventListener('touchmove', function(e) {
-                if (e.touches.length === 2) {
-                    e.preventDefault();
-                    const touch1 = e.touches[0];
-                    const touch2 = e.touches[1];
-                    const currentDistance = Math.hypot(
-                        touch2.clientX - touch1.clientX,
-                        touch2.clientY - touch1.clientY
-                    );
-                    
-                    const scale = lastScale * (currentDistance / initialDistance);
-                    currentScale = Math.min(Math.max(scale, 0.8), 2);
-                    
-                    document.documentElement.style.setProperty('--zoom-level', currentScale);
-                }
-            });
-
-            // 페이지 로드 시 인사말 표시
-            window.onload = function() {
-                // 세션 스토리지 초기화
-                sessionStorage.removeItem('conversation_history');
-                addMessage("안녕하세요. 당신의 불교 신행 · 교리 도우미 '선다미'입니다. 만나서 반가워요! 무엇을 도와드릴까요?", 'bot');
-                
-                // 페이지 가시성 변경 이벤트 리스너 추가
-                document.addEventListener('visibilitychange', handleVisibilityChange);
-                
-                // 페이지 언로드 이벤트 리스너 추가
-                window.addEventListener('beforeunload', handleBeforeUnload);
-            };
-            
-            // 페이지 가시성 변경 처리
-            function handleVisibilityChange() {
-                if (document.hidden) {
-                    // 페이지가 숨겨질 때 음성 인식 중지
-                    stopVoiceRecognition();
-                    // 음성 재생 중지
-                    stopVoicePlayback();
-                }
-            }
-            
-            // 페이지 언로드 처리
-            function handleBeforeUnload() {
-                stopVoiceRecognition();
-                stopVoicePlayback();
-            }
-            
-            // 음성 인식 중지 함수
-            function stopVoiceRecognition() {
-                if (recognition && isRecording) {
-                    recognition.stop();
-                    isRecording = false;
-                    const voiceBtn = document.getElementById('voice-btn');
-                    voiceBtn.classList.remove('recording');
-                }
-            }
-            
-            // 음성 재생 중지 함수
-            function stopVoicePlayback() {
-                if (synth && isPlaying) {
-                    synth.cancel();
-                    isPlaying = false;
-                    // 재생 중인 메시지의 배경색 제거
-                    const playingMessages = document.querySelectorAll('.message.playing');
-                    playingMessages.forEach(msg => msg.classList.remove('playing'));
-                }
-            }
-
-            function toggleVoiceRecognition() {
-                const voiceBtn = document.getElementById('voice-btn');
-                
-                if (!recognition) {
-                    recognition = new (window.SpeechRecognition || window.webkitSpeechRecognition)();
-                    recognition.lang = 'ko-KR';
-                    recognition.continuous = false;
-                    recognition.interimResults = false;
-
-                    recognition.onresult = function(event) {
-                        const transcript = event.results[0][0].transcript;
-                        document.getElementById('user-input').value = transcript;
-                        isRecording = false;
-                        voiceBtn.classList.remove('recording');
-                    };
-
-                    recognition.onerror = function(event) {
-                        console.error('Speech recognition error', event.error);
-                        isRecording = false;
-                        voiceBtn.classList.remove('recording');
-                    };
-
-                    recognition.onend = function() {
-                        isRecording = false;
-                        voiceBtn.classList.remove('recording');
-                    };
-                }
-
-                if (!isRecording) {
-                    recognition.start();
-                    isRecording = true;
-                    voiceBtn.classList.add('recording');
-                } else {
-                    recognition.stop();
-                    isRecording = false;
-                    voiceBtn.classList.remove('recording');
-                }
-            }
-
-            function sendMessage() {
-                const userInput = document.getElementById('user-input');
-                const message = userInput.value.trim();
-                const loading = document.getElementById('loading');
-                
-                if (message) {
-                    addMessage(message, 'user');
-                    userInput.value = '';
-                    
-                    // 로딩 애니메이션을 마지막 메시지 다음에 표시
-                    loading.style.display = 'flex';
-                    const chatContainer = document.getElementById('chat-container');
-                    chatContainer.appendChild(loading);
-                    chatContainer.scrollTop = chatContainer.scrollHeight;
-                    
-                    fetch('/chat', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({message: message})
-                    })
-                    .then(response => response.json())
-                    .then(data => {
-                        loading.style.display = 'none';
-                        addMessage(data.response, 'bot');
-                    })
-                    .catch(error => {
-                        console.error('Error:', error);
-                        loading.style.display = 'none';
-                        addMessage('죄송합니다. 오류가 발생했습니다.', 'bot');
-                    });
-                }
-            }
-
-            // 메시지 클릭 시 음성 재생
-            function playMessage(message, messageElement) {
-                // 이미 재생 중인 메시지인 경우 중지
-                if (messageElement.classList.contains('playing')) {
-                    stopVoicePlayback();
-                    return;
-                }
-                
-                // 다른 메시지가 재생 중이면 중지
-                if (isPlaying) {
-                    stopVoicePlayback();
-                }
-                
-                const utterance = new SpeechSynthesisUtterance(message);
-                utterance.lang = 'ko-KR';
-                utterance.rate = 1;
-                utterance.pitch = 1;
-                
-                // 재생 시작 시 이벤트
-                utterance.onstart = function() {
-                    isPlaying = true;
-                    messageElement.classList.add('playing');
-                };
-                
-                // 재생 종료 시 이벤트
-                utterance.onend = function() {
-                    isPlaying = false;
-                    messageElement.classList.remove('playing');
-                };
-                
-                // 재생 오류 시 이벤트
-                utterance.onerror = function() {
-                    isPlaying = false;
-                    messageElement.classList.remove('playing');
-                };
-                
-                currentUtterance = utterance;
-                synth.speak(utterance);
-            }
-
-            function addMessage(text, sender) {
-                const chatContainer = document.getElementById('chat-container');
-                const messageDiv = document.createElement('div');
-                messageDiv.className = `message ${sender}-message`;
-                messageDiv.textContent = text;
-                
-                if (sender === 'bot') {
-                    messageDiv.addEventListener('click', () => playMessage(text, messageDiv));
-                }
-                
-                chatContainer.appendChild(messageDiv);
-                
-                // 메시지 추가 후 스크롤 위치 조정
-                setTimeout(() => {
-                    const scrollHeight = chatContainer.scrollHeight;
-                    const clientHeight = chatContainer.clientHeight;
-                    const maxScroll = scrollHeight - clientHeight;
-                    
-                    if (maxScroll > 0) {
-                        // 안드로이드 대응: 추가 여유 공간 확보
-                        const extraSpace = 40; // 추가 여유 공간
-                        chatContainer.scrollTop = maxScroll + extraSpace;
-                        
-                        // 스크롤 후 위치 확인 및 추가 조정
-                        requestAnimationFrame(() => {
-                            const lastMessage = chatContainer.lastElementChild;
-                            const lastMessageRect = lastMessage.getBoundingClientRect();
-                            const inputContainer = document.querySelector('.input-container');
-                            const inputRect = inputContainer.getBoundingClientRect();
-                            
-                            if (lastMessageRect.bottom > inputRect.top) {
-                                const additionalSpace = lastMessageRect.bottom - inputRect.top + 20;
-                                chatContainer.scrollTop = maxScroll + additionalSpace;
-                            }
-                        });
-                    }
-                }, 100);
-            }
-
-            document.getElementById('user-input').addEventListener('keypress', function(e) {
-                if (e.key === 'Enter') {
-                    sendMessage();
-                }
-            });
-
-            // 안드로이드 네비게이션 바 대응
-            function adjustForAndroidNav() {
-                const vh = window.innerHeight * 0.01;
-                document.documentElement.style.setProperty('--vh', `${vh}px`);
-            }
+    return index_page.response(request)
 
-            window.addEventListener('resize', adjustForAndroidNav);
-            adjustForAndroidNav();
-        </script>
-    </body>
-    </html>
-    '''
+@app.route('/static/<path:filename>')
+def static_file(filename):
+    asset = assets.get(filename)
+    if asset is None:
+        abort(404)
+    return asset.response(request)
 
 if __name__ == '__main__':
     # 환경 변수에서 포트 가져오기 (Heroku 등에서 사용)
     port = int(os.environ.get('PORT', 5000))
+    warm_up()
     app.run(host='0.0.0.0', port=port, debug=True)
 
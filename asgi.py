@@ -0,0 +1,405 @@
+# ASGI(asyncio) 서버용 앱: /chat, /chat/stream, /kakao를 코루틴으로 처리한다.
+# Gemini 호출은 generate_content_async로 보내므로 답변을 기다리는 동안 스레드를 잡지 않는다.
+# 라우트와 JSON 형식은 app.py와 같고, 설정·캐시·세션 저장소·지표도 app.py의 것을 그대로 쓴다.
+# 그 밖의 경로(웹 페이지, 정적 파일, /ready, /metrics, /admin/*)는 Flask 앱을 그대로 붙여 처리한다.
+#
+#   gunicorn -k uvicorn.workers.UvicornWorker asgi:app     # gunicorn.conf.py의 preload·워커 준비를 함께 씀
+#   uvicorn asgi:app --port 8000
+#
+# 세션 저장소 읽기·쓰기(SQLite일 수 있음)와 카카오 콜백 전송은 짧게 끝나므로 기본 스레드 풀에서 실행한다.
+
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as sync_app
+import gemini
+import metrics
+import tracing
+from model_pool import PoolBusy, QueueTimeout
+from resilience import CircuitOpen
+from router import TEMPLATE
+
+WEB_PROFILE = sync_app.WEB_PROFILE
+KAKAO_PROFILE = sync_app.KAKAO_PROFILE
+model_pool = sync_app.async_model_pool
+single_flight = sync_app.single_flight
+router = sync_app.router
+
+# 응답을 보낸 뒤에도 콜백 답변을 만드는 태스크가 가비지 컬렉션되지 않도록 잡아 둔다
+callback_tasks = set()
+
+log = logging.getLogger('seondami.asgi')
+
+
+async def get_model(profile):
+    # 캐시 콘텐츠를 새로 만들거나 갱신할 때는 Gemini API를 부르므로 스레드에서 가져온다
+    return await asyncio.to_thread(sync_app.get_model, profile.model)
+
+
+async def call_model(contents, deadline, profile):
+    estimate = sync_app.estimate_request_tokens(contents, profile)
+    config = profile.generation_config(sync_app.thinking_supported())
+    model = await get_model(profile)
+
+    async def attempt(timeout):
+        async with sync_app.quota.reserve_async(estimate, deadline) as ticket:
+            with sync_app.profiled_call('call', profile), tracing.span('gemini'):
+                response = await model.generate_content_async(
+                    contents, generation_config=config,
+                    request_options=sync_app.request_options(timeout - ticket.waited))
+            ticket.used = sync_app.record_usage(response)
+        return response
+
+    return sync_app.answer_text(await sync_app.model_caller.call_async(attempt, deadline), profile)
+
+
+async def stream_model(contents, deadline, profile):
+    estimate = sync_app.estimate_request_tokens(contents, profile)
+    config = profile.generation_config(sync_app.thinking_supported())
+    model = await get_model(profile)
+
+    async def attempt(timeout):
+        async with sync_app.quota.reserve_async(estimate, deadline) as ticket:
+            with sync_app.profiled_call('stream', profile) as started:
+                response = await model.generate_content_async(
+                    contents, stream=True, generation_config=config,
+                    request_options=sync_app.request_options(timeout - ticket.waited))
+                first = True
+                streamed = False
+                chunk = None
+                async for chunk in response:
+                    if first:
+                        metrics.record_first_chunk(started)
+                        first = False
+                    text = gemini.response_text(chunk)
+                    if text:
+                        streamed = True
+                        yield text
+                if not streamed:
+                    # 텍스트 없이 끝난 스트림 (끝난 이유는 마지막 조각에 있다)
+                    sync_app.answer_text(chunk, profile, '')
+            ticket.used = sync_app.record_usage(response)
+
+    async for text in sync_app.model_caller.stream_async(attempt, deadline):
+        yield text
+
+
+async def generate_answer(user_message, window, deadline, user=None, profile=WEB_PROFILE):
+    with tracing.span('prompt'):
+        contents = sync_app.build_contents(user_message, window, profile)
+    sync_app.window_stats.record(window, sync_app.estimate_tokens(user_message))
+    with tracing.span('model'):
+        text = await model_pool.call(call_model, contents, deadline, profile, deadline=deadline, user=user)
+    with tracing.span('clean'):
+        return sync_app.clean_markdown(text)
+
+
+async def answer_once(user_message, window, deadline, user=None, profile=WEB_PROFILE):
+    async def generate():
+        answer = await generate_answer(user_message, window, deadline, user, profile)
+        sync_app.remember_answer(user_message, window, answer, profile)
+        return answer
+
+    key = sync_app.coalesce_key(user_message, window, profile)
+    if key is None:
+        return await generate()
+    return await single_flight.do_async(key, generate, deadline)
+
+
+async def get_chat_response(user_message, session_id, deadline, profile=WEB_PROFILE):
+    route_profile = profile
+    try:
+        with tracing.span('session'):
+            window = await asyncio.to_thread(sync_app.load_history, session_id)
+        with tracing.span('route'):
+            decision, route_profile = sync_app.route_message(user_message, window, profile)
+        started = time.perf_counter()
+
+        if decision.route == TEMPLATE:
+            clean_response = decision.answer
+            router.record(profile.name, decision, time.perf_counter() - started)
+        else:
+            with tracing.span('cache'):
+                clean_response = sync_app.cached_answer(user_message, window, route_profile)
+            if clean_response is None:
+                clean_response = await answer_once(user_message, window, deadline, session_id, route_profile)
+                router.record(profile.name, decision, time.perf_counter() - started)
+            clean_response = clean_response or sync_app.INCOMPLETE_MESSAGE
+
+        with tracing.span('save'):
+            await asyncio.to_thread(sync_app.commit_turn, session_id, user_message, clean_response)
+        return clean_response
+    except PoolBusy as e:
+        metrics.record_error('chat', e)
+        raise
+    except CircuitOpen as e:
+        metrics.record_error('chat', e)
+        return sync_app.fallback_answer(user_message, route_profile)
+    except Exception as e:
+        metrics.record_error('chat', e)
+        log.exception("Chat request failed", extra={'where': 'chat'})
+        return sync_app.ERROR_MESSAGE
+
+
+async def stream_chat_response(user_message, session_id, deadline, profile=WEB_PROFILE):
+    with tracing.span('session'):
+        window = await asyncio.to_thread(sync_app.load_history, session_id)
+    with tracing.span('route'):
+        decision, route_profile = sync_app.route_message(user_message, window, profile)
+    started = time.perf_counter()
+    with tracing.span('cache'):
+        cached = decision.answer or sync_app.cached_answer(user_message, window, route_profile)
+    if cached is not None:
+        yield cached
+        if decision.route == TEMPLATE:
+            router.record(profile.name, decision, time.perf_counter() - started)
+        with tracing.span('save'):
+            await asyncio.to_thread(sync_app.commit_turn, session_id, user_message, cached)
+        return
+
+    parts = []
+    key = sync_app.coalesce_key(user_message, window, route_profile)
+    if key is None:
+        chunks = stream_answer(user_message, window, deadline, session_id, route_profile)
+    else:
+        chunks = stream_once(key, user_message, window, deadline, session_id, route_profile)
+    async for text in chunks:
+        parts.append(text)
+        yield text
+    answer = ''.join(parts)
+    if not answer:
+        answer = sync_app.INCOMPLETE_MESSAGE
+        yield answer
+    router.record(profile.name, decision, time.perf_counter() - started)
+    with tracing.span('save'):
+        await asyncio.to_thread(sync_app.commit_turn, session_id, user_message, answer)
+
+
+async def stream_once(key, user_message, window, deadline, user=None, profile=WEB_PROFILE):
+    # 먼저 받은 요청만 모델을 스트리밍하고, 같은 질문의 다른 요청은 그 답변이 끝나면 한 번에 받는다
+    flight, leader = single_flight.join_async(key)
+    if not leader:
+        yield await flight.wait(deadline)
+        return
+    parts = []
+    try:
+        async with single_flight.hold_async(key, deadline) as slot:
+            if slot.answer is not None:
+                parts.append(slot.answer)
+                yield slot.answer
+            else:
+                async for text in stream_answer(user_message, window, deadline, user, profile):
+                    parts.append(text)
+                    yield text
+                slot.publish(''.join(parts))
+    except (asyncio.CancelledError, GeneratorExit):
+        # 클라이언트가 연결을 끊어 스트림이 중단되면 기다리던 요청은 혼잡 응답을 받는다
+        single_flight.finish(key, flight, error=QueueTimeout('leading stream was cancelled'))
+        raise
+    except Exception as e:
+        single_flight.finish(key, flight, error=e)
+        raise
+    single_flight.finish(key, flight, ''.join(parts))
+
+
+async def stream_answer(user_message, window, deadline, user=None, profile=WEB_PROFILE):
+    with tracing.span('prompt'):
+        contents = sync_app.build_contents(user_message, window, profile)
+    sync_app.window_stats.record(window, sync_app.estimate_tokens(user_message))
+    parts = []
+    with tracing.span('model'):
+        async for text in model_pool.stream(stream_model, contents, deadline, profile, deadline=deadline, user=user):
+            text = sync_app.clean_markdown(text)
+            if text:
+                parts.append(text)
+                yield text
+    # 스트림이 끝까지 완료된 경우에만 캐시에 반영
+    sync_app.remember_answer(user_message, window, ''.join(parts), profile)
+
+
+def get_web_session_id(request):
+    # app.get_web_session_id와 같다: 헤더 토큰(X-Session-Id) 우선, 없으면 쿠키
+    session_id = request.headers.get('X-Session-Id')
+    if session_id and sync_app.SESSION_ID_PATTERN.match(session_id):
+        return session_id, False
+    session_id = request.cookies.get(sync_app.SESSION_COOKIE)
+    if session_id and sync_app.SESSION_ID_PATTERN.match(session_id):
+        return session_id, True
+    return uuid.uuid4().hex, True
+
+
+def set_session_cookie(request, resp, session_id):
+    resp.set_cookie(sync_app.SESSION_COOKIE, session_id, max_age=sync_app.session_store.ttl,
+                    httponly=True, samesite='lax', secure=request.url.scheme == 'https')
+    return resp
+
+
+def busy_response():
+    return JSONResponse({'response': sync_app.BUSY_MESSAGE}, status_code=503,
+                        headers={'Retry-After': str(sync_app.BUSY_RETRY_AFTER)})
+
+
+def rate_limited_response(wait):
+    return JSONResponse({'response': sync_app.RATE_LIMIT_MESSAGE}, status_code=429,
+                        headers={'Retry-After': str(sync_app.retry_after_seconds(wait))})
+
+
+async def chat(request):
+    with tracing.span('parse'):
+        data = await request.json()
+        user_message = data.get('message', '')
+    session_id, needs_cookie = get_web_session_id(request)
+    tracing.annotate(session_id=session_id, message=user_message)
+    wait = sync_app.rate_limit('chat', session_id)
+    if wait:
+        return rate_limited_response(wait)
+    try:
+        response = await get_chat_response(user_message, session_id, time.monotonic() + sync_app.CHAT_DEADLINE)
+    except PoolBusy:
+        return busy_response()
+    with tracing.span('serialize'):
+        resp = JSONResponse({'response': response})
+    if needs_cookie:
+        set_session_cookie(request, resp, session_id)
+    return resp
+
+
+async def chat_stream(request):
+    with tracing.span('parse'):
+        data = await request.json()
+        user_message = data.get('message', '')
+    session_id, needs_cookie = get_web_session_id(request)
+    tracing.annotate(session_id=session_id, message=user_message)
+    wait = sync_app.rate_limit('chat', session_id)
+    if wait:
+        return rate_limited_response(wait)
+    # 스트림이 시작되면 상태 코드를 바꿀 수 없으므로, 이미 혼잡하면 미리 거절
+    if model_pool.saturated():
+        return busy_response()
+    deadline = time.monotonic() + sync_app.CHAT_DEADLINE
+
+    async def generate():
+        try:
+            async for text in stream_chat_response(user_message, session_id, deadline):
+                yield sync_app.sse_event({'delta': text})
+            yield sync_app.sse_event({}, event='done')
+        except PoolBusy as e:
+            metrics.record_error('chat_stream', e)
+            yield sync_app.sse_event({'error': sync_app.BUSY_MESSAGE}, event='error')
+        except CircuitOpen as e:
+            metrics.record_error('chat_stream', e)
+            yield sync_app.sse_event({'delta': sync_app.fallback_answer(user_message)})
+            yield sync_app.sse_event({}, event='done')
+        except Exception as e:
+            metrics.record_error('chat_stream', e)
+            log.exception("Chat stream failed", extra={'where': 'chat_stream'})
+            yield sync_app.sse_event({'error': sync_app.ERROR_MESSAGE}, event='error')
+
+    resp = StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    if needs_cookie:
+        set_session_cookie(request, resp, session_id)
+    return resp
+
+
+async def answer_kakao_callback(callback_url, user_message, session_id, deadline):
+    try:
+        try:
+            response = await get_chat_response(user_message, session_id,
+                                               deadline - sync_app.KAKAO_CALLBACK_SEND_MARGIN, KAKAO_PROFILE)
+        except PoolBusy:
+            response = sync_app.BUSY_MESSAGE
+        await asyncio.to_thread(sync_app.post_kakao_callback, callback_url,
+                                sync_app.kakao_text_response(response), deadline)
+    except Exception as e:
+        metrics.record_error('kakao_callback', e)
+        log.exception("Kakao callback answer failed", extra={'where': 'kakao_callback'})
+
+
+async def kakao_chat(request):
+    try:
+        received_at = time.monotonic()
+        with tracing.span('parse'):
+            req = await request.json()
+            user_message = req['userRequest']['utterance']
+            session_id = sync_app.get_kakao_session_id(req)
+            callback_url = req['userRequest'].get('callbackUrl')
+        tracing.annotate(session_id=session_id, message=user_message,
+                         callback=bool(callback_url and sync_app.KAKAO_CALLBACK_ENABLED))
+        if sync_app.rate_limit('kakao', session_id):
+            return JSONResponse(sync_app.kakao_text_response(sync_app.RATE_LIMIT_MESSAGE))
+
+        if callback_url and sync_app.KAKAO_CALLBACK_ENABLED:
+            task = asyncio.create_task(answer_kakao_callback(
+                callback_url, user_message, session_id, received_at + sync_app.KAKAO_CALLBACK_DEADLINE))
+            callback_tasks.add(task)
+            task.add_done_callback(callback_tasks.discard)
+            return JSONResponse({
+                "version": "2.0",
+                "useCallback": True,
+                "data": {
+                    "text": sync_app.KAKAO_CALLBACK_WAIT_MESSAGE
+                }
+            })
+
+        response = await get_chat_response(user_message, session_id, received_at + sync_app.KAKAO_DEADLINE,
+                                           KAKAO_PROFILE)
+        with tracing.span('serialize'):
+            return JSONResponse(sync_app.kakao_text_response(response))
+    except PoolBusy:
+        return JSONResponse(sync_app.kakao_text_response(sync_app.BUSY_MESSAGE))
+    except Exception as e:
+        metrics.record_error('kakao', e)
+        log.exception("Kakao request failed", extra={'where': 'kakao'})
+        return JSONResponse(sync_app.kakao_text_response(sync_app.ERROR_MESSAGE))
+
+
+async def ping_model_async():
+    # 이벤트 루프용 Gemini 연결(grpc.aio)은 동기 연결과 따로 맺으므로 워커 준비 때 한 번 보내 둔다
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            sync_app.summary_model.count_tokens_async(sync_app.WARMUP_PING_TEXT),
+            sync_app.WARMUP_TIMEOUT)
+    except Exception as e:
+        metrics.record_error('warm_up', e)
+        log.warning("Warm-up step failed", exc_info=e, extra={'where': 'warm_up', 'step': 'async_connection'})
+        sync_app.warm_up_state['errors']['async_connection'] = str(e)
+    sync_app.warm_up_state['phases_ms']['async_connection'] = round((time.perf_counter() - started) * 1000, 1)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # gunicorn에서는 post_worker_init에서 이미 준비를 마쳤으므로 warm_up()은 바로 돌아온다
+    await asyncio.to_thread(sync_app.warm_up)
+    await ping_model_async()
+    yield
+
+
+ASYNC_ROUTES = ('/chat', '/chat/stream', '/kakao')
+
+app = Starlette(
+    routes=[
+        Route('/chat', chat, methods=['POST']),
+        Route('/chat/stream', chat_stream, methods=['POST']),
+        Route('/kakao', kakao_chat, methods=['POST']),
+        Mount('/', app=WsgiToAsgi(sync_app.app)),
+    ],
+    middleware=[
+        Middleware(metrics.AsgiInstrument, routes=ASYNC_ROUTES),
+        Middleware(tracing.AsgiTracing, tracer=sync_app.tracer, routes=ASYNC_ROUTES),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=['X-Request-Id', 'Server-Timing']),
+    ],
+    lifespan=lifespan,
+)
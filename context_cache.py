@@ -0,0 +1,122 @@
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import gemini
+from history_window import estimate_tokens
+
+log = logging.getLogger('seondami.context_cache')
+
+
+class ContextCache:
+    # 시스템 프롬프트를 Gemini 캐시 콘텐츠(cached content)로 올려두고 그 캐시를 쓰는 모델을 돌려준다.
+    # 캐시를 만들 수 없는 경우(모델이 지원하지 않는 경우 등)에는 system_instruction만 설정한 기본 모델을 쓰고,
+    # retry_after초 뒤에 다시 시도한다. 같은 프롬프트로 만든 캐시는 display_name이 같으므로 여러 워커가 함께 쓴다.
+    #
+    # 캐시 조회·생성 API는 요청 경로에서 부르지 않는다. 워커 준비 단계에서 refresh()로 한 번 만들고, 그 뒤에는
+    # model()이 만료가 가까운 것을 보면 백그라운드 스레드에서 갱신하며 그동안은 지금 모델을 그대로 돌려준다.
+    # API 호출은 timeout초 안에 끝나지 않으면 포기한다 (SDK 기본값은 600초).
+    # Gemini는 min_tokens보다 짧은 내용은 캐시로 만들지 않으므로(2.5 Flash는 1,024토큰) 시스템 프롬프트가
+    # 그보다 짧으면 API를 부르지 않고 기본 모델만 쓴다.
+
+    def __init__(self, model_name, system_instruction, ttl=3600, refresh_margin=300,
+                 retry_after=3600, timeout=5.0, min_tokens=1024, enabled=True):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self.min_tokens = min_tokens
+        self.enabled = enabled
+        self.last_error = None
+        tokens = estimate_tokens(system_instruction)
+        if enabled and tokens < min_tokens:
+            self.enabled = False
+            self.last_error = f"system instruction is about {tokens} tokens, below the {min_tokens}-token cache minimum"
+        digest = hashlib.sha1(system_instruction.encode('utf-8')).hexdigest()[:12]
+        self.display_name = f"seondami-{digest}"
+        self.base_model = gemini.LazyModel(model_name, system_instruction=system_instruction)
+        # (캐시를 쓰는 모델, 만료 시각) - 함께 바뀌도록 튜플 하나로 둔다
+        self._active = (None, 0.0)
+        self._cache = None
+        self._retry_at = 0.0
+        self._refreshing_pid = None
+        self._lock = threading.Lock()
+
+    def model(self):
+        if not self.enabled:
+            return self.base_model
+        model, expires_at = self._active
+        now = time.time()
+        if now >= expires_at - self.refresh_margin and now >= self._retry_at:
+            self._refresh_in_background()
+        return model if model is not None and now < expires_at else self.base_model
+
+    def refresh(self, timeout=None):
+        # 캐시를 찾거나 만든다 (워커 준비 단계와 백그라운드 갱신에서 호출). 성공하면 True
+        if not self.enabled:
+            return False
+        timeout = min(timeout, self.timeout) if timeout is not None else self.timeout
+        try:
+            cache = self._find_or_create(max(timeout, 0.1))
+            model = gemini.sdk().GenerativeModel.from_cached_content(cached_content=cache)
+        except Exception as e:
+            log.warning("Context cache unavailable, using system_instruction only", exc_info=e,
+                        extra={'model': self.model_name})
+            self.last_error = str(e)
+            self._retry_at = time.time() + self.retry_after
+            return False
+        self._cache = cache
+        self._active = (model, cache.expire_time.timestamp())
+        self.last_error = None
+        return True
+
+    def _refresh_in_background(self):
+        # 프로세스마다 갱신 스레드는 하나만 (gunicorn이 fork한 워커에는 부모의 스레드가 없다)
+        with self._lock:
+            if self._refreshing_pid == os.getpid():
+                return
+            self._refreshing_pid = os.getpid()
+        threading.Thread(target=self._run_refresh, name='context-cache-refresh', daemon=True).start()
+
+    def _run_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing_pid = None
+
+    def status(self):
+        model, expires_at = self._active
+        return {
+            'enabled': self.enabled,
+            'active': model is not None and time.time() < expires_at,
+            'name': self._cache.name if self._cache is not None else None,
+            'expires_in': max(0, round(expires_at - time.time())) if expires_at else 0,
+            'refreshing': self._refreshing_pid == os.getpid(),
+            'last_error': self.last_error,
+        }
+
+    def _find_or_create(self, timeout):
+        # 고수준 CachedContent.list/create는 시간 제한을 받지 않으므로 같은 요청을 클라이언트로 직접 보낸다
+        caching = gemini.sdk().caching
+        client = caching.get_default_cache_client()
+        options = {'timeout': timeout, 'retry': None}
+        min_expire = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=self.refresh_margin)
+        request = gemini.sdk().protos.ListCachedContentsRequest(page_size=100)
+        for obj in client.list_cached_contents(request, **options):
+            cache = caching.CachedContent._from_obj(obj)
+            if (cache.display_name == self.display_name
+                    and cache.model.endswith(self.model_name)
+                    and cache.expire_time > min_expire):
+                return cache
+        request = caching.CachedContent._prepare_create_request(
+            model=self.model_name,
+            display_name=self.display_name,
+            system_instruction=self.system_instruction,
+            ttl=datetime.timedelta(seconds=self.ttl),
+        )
+        return caching.CachedContent._from_obj(client.create_cached_content(request, **options))
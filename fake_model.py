@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+from google.api_core import exceptions
+
+from history_window import estimate_tokens
+
+# 부하 시험용 가짜 Gemini 모델 (MODEL_BACKEND=fake)
+# 실제 API를 부르지 않고 설정한 지연 시간, 스트리밍 속도, 오류 비율로 응답을 흉내 낸다.
+# latencies({사용자 메시지: [지연(초), ...]})를 주면 그 메시지가 들어 있는 요청은 기록된 지연을 차례로 돌려 쓴다
+# (tools/replay.py가 트래픽 기록으로 만든 FAKE_MODEL_LATENCY_FILE).
+
+Usage = namedtuple('Usage', 'prompt_token_count cached_content_token_count candidates_token_count')
+CountTokensResponse = namedtuple('CountTokensResponse', 'total_tokens')
+
+ANSWER = ("마음이 힘드실 때는 잠시 멈추어 호흡을 바라보는 것부터 시작해보세요. "
+          "부처님께서는 괴로움의 원인을 알아차리는 것이 괴로움에서 벗어나는 첫걸음이라고 하셨습니다. "
+          "지금 느끼는 감정을 있는 그대로 인정하고, 조금씩 내려놓는 연습을 함께 해보아요.")
+
+
+class FakeResponse:
+    # GenerateContentResponse 중 앱이 쓰는 부분(text, usage_metadata, 스트리밍 반복)만 구현
+
+    def __init__(self, chunks, usage, chunk_interval=0.0):
+        self._chunks = chunks
+        self._chunk_interval = chunk_interval
+        self.text = ''.join(chunks)
+        self.usage_metadata = usage
+
+    def __iter__(self):
+        for i, chunk in enumerate(self._chunks):
+            if i and self._chunk_interval:
+                time.sleep(self._chunk_interval)
+            yield FakeResponse([chunk], None)
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self._chunks):
+            if i and self._chunk_interval:
+                await asyncio.sleep(self._chunk_interval)
+            yield FakeResponse([chunk], None)
+
+
+class FakeModel:
+
+    def __init__(self, latency=0.8, jitter=0.25, chunks=8, chunk_interval=0.05,
+                 error_rate=0.0, answer=ANSWER, latencies=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunks = chunks
+        self.chunk_interval = chunk_interval
+        self.error_rate = error_rate
+        self.answer = answer
+        self.latencies = latencies or {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        latencies = None
+        latency_file = os.getenv('FAKE_MODEL_LATENCY_FILE')
+        if latency_file:
+            with open(latency_file, encoding='utf-8') as f:
+                latencies = json.load(f)
+        return cls(
+            latency=float(os.getenv('FAKE_MODEL_LATENCY', 0.8)),
+            jitter=float(os.getenv('FAKE_MODEL_JITTER', 0.25)),
+            chunks=int(os.getenv('FAKE_MODEL_CHUNKS', 8)),
+            chunk_interval=float(os.getenv('FAKE_MODEL_CHUNK_INTERVAL', 0.05)),
+            error_rate=float(os.getenv('FAKE_MODEL_ERROR_RATE', 0)),
+            latencies=latencies,
+        )
+
+    def generate_content(self, contents, stream=False, request_options=None, **kwargs):
+        # 비스트리밍은 전체 답변, 스트리밍은 첫 조각까지 latency만큼 기다린다 (±jitter 비율로 흔듦)
+        # request_options의 timeout보다 오래 걸리면 실제 SDK처럼 DeadlineExceeded를 낸다
+        delay, timed_out = self._delay(contents, request_options)
+        time.sleep(delay)
+        return self._respond(contents, stream, timed_out)
+
+    async def generate_content_async(self, contents, stream=False, request_options=None, **kwargs):
+        # generate_content_async와 같은 형태 (스트리밍 응답은 async for로 읽는다)
+        delay, timed_out = self._delay(contents, request_options)
+        await asyncio.sleep(delay)
+        return self._respond(contents, stream, timed_out)
+
+    def _delay(self, contents, request_options):
+        # (기다릴 시간, 시간 제한에 걸렸는지 여부)
+        latency = self._recorded_latency(contents)
+        if latency is None:
+            latency = self.latency
+        delay = max(0.0, latency * (1 + random.uniform(-self.jitter, self.jitter)))
+        timeout = (request_options or {}).get('timeout')
+        if timeout is not None and delay > timeout:
+            return timeout, True
+        return delay, False
+
+    def _recorded_latency(self, contents):
+        # 이번 사용자 메시지(마지막 content의 part 중 하나)에 기록된 지연이 있으면 순서대로 돌려 쓴다
+        if not self.latencies or isinstance(contents, str):
+            return None
+        for part in contents[-1]['parts']:
+            recorded = self.latencies.get(part)
+            if recorded:
+                with self._lock:
+                    index = self._next.get(part, 0)
+                    self._next[part] = index + 1
+                return recorded[index % len(recorded)]
+        return None
+
+    def _respond(self, contents, stream, timed_out):
+        if timed_out:
+            raise exceptions.DeadlineExceeded('fake model: request timed out')
+        if random.random() < self.error_rate:
+            raise exceptions.ServiceUnavailable('fake model: simulated upstream error')
+
+        usage = Usage(self._prompt_tokens(contents), 0, estimate_tokens(self.answer))
+        if not stream:
+            return FakeResponse([self.answer], usage)
+        # 빈 답변(answer='')이면 텍스트 없이 끝난 응답을 흉내 낸다
+        size = max(1, -(-len(self.answer) // max(1, self.chunks)))
+        chunks = [self.answer[i:i + size] for i in range(0, len(self.answer), size)]
+        return FakeResponse(chunks, usage, self.chunk_interval)
+
+    def count_tokens(self, contents, **kwargs):
+        # 워커 준비 단계의 연결 확인용 (실제 SDK처럼 total_tokens를 가진 응답)
+        time.sleep(self.latency * 0.1)
+        return CountTokensResponse(self._prompt_tokens(contents))
+
+    async def count_tokens_async(self, contents, **kwargs):
+        await asyncio.sleep(self.latency * 0.1)
+        return CountTokensResponse(self._prompt_tokens(contents))
+
+    @staticmethod
+    def _prompt_tokens(contents):
+        if isinstance(contents, str):
+            return estimate_tokens(contents)
+        return sum(estimate_tokens(part) for content in contents for part in content['parts'])
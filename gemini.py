@@ -0,0 +1,78 @@
+import threading
+import time
+
+# google.generativeai는 import만 1초 가까이 걸리므로(IPython 등 의존 모듈 포함) 처음 쓸 때 불러온다.
+# gunicorn preload_app이면 마스터에서 한 번 불러 두고 워커가 fork로 함께 쓴다 (gunicorn.conf.py).
+
+_lock = threading.Lock()
+_api_key = None
+_genai = None
+import_seconds = None
+
+
+def configure(api_key):
+    global _api_key
+    _api_key = api_key
+
+
+def sdk():
+    # 설정을 마친 google.generativeai 모듈
+    global _genai, import_seconds
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                started = time.perf_counter()
+                import google.generativeai as genai
+                genai.configure(api_key=_api_key)
+                import_seconds = time.perf_counter() - started
+                _genai = genai
+    return _genai
+
+
+def loaded():
+    return _genai is not None
+
+
+def supports_thinking_budget():
+    # 설치된 SDK의 GenerationConfig에 thinking_config가 있어야 thinking 예산을 보낼 수 있다
+    return 'thinking_config' in sdk().protos.GenerationConfig.meta.fields
+
+
+def response_text(response):
+    # 응답(또는 스트림 조각)의 텍스트. 첫 후보에 텍스트 part가 없으면 ''
+    # (thinking에 출력 토큰 상한을 다 써서 MAX_TOKENS로 끝났거나 안전 필터에 걸린 경우 SDK의 .text는 ValueError를 낸다)
+    candidates = getattr(response, 'candidates', None)
+    if candidates is None:
+        # 가짜 모델 응답 (fake_model.FakeResponse)
+        return response.text
+    if not candidates:
+        return ''
+    return ''.join(part.text for part in candidates[0].content.parts)
+
+
+def finish_reason(response):
+    # 첫 후보가 끝난 이유 ('STOP', 'MAX_TOKENS', 'SAFETY' 등, 알 수 없으면 None)
+    candidates = getattr(response, 'candidates', None)
+    if not candidates:
+        return None
+    return candidates[0].finish_reason.name
+
+
+class LazyModel:
+    # GenerativeModel을 처음 쓸 때 만든다 (메서드와 속성은 만든 모델로 넘긴다)
+
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+        self._kwargs = kwargs
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = sdk().GenerativeModel(self.model_name, **self._kwargs)
+        return self._model
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
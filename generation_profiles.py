@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import deque
+
+
+class GenerationProfile:
+    # 채널(라우트)별 생성 설정: 출력 토큰 상한, temperature, thinking 예산, 모델, 답변 형식 안내(hint).
+    # slo(초)를 주면 이 프로필로 한 모델 호출의 최근 p95 지연이 slo를 넘을 때 출력 토큰 상한을
+    # shrink 비율만큼 줄이고(min_output_tokens까지), p95가 slo * relax 아래로 내려가면 grow 비율만큼 되돌린다.
+    # 2.5 모델은 thinking 토큰도 출력 토큰 상한 안에서 쓰므로, 하한은 thinking 예산만큼 높여 두고
+    # thinking 예산을 보낼 수 없으면(SDK 미지원, 예산 미설정) 상한을 줄이지 않는다
+    # (thinking에 상한을 다 쓰면 답변 텍스트 없이 MAX_TOKENS로 끝난다).
+    # None인 설정은 모델 기본값을 쓴다.
+
+    def __init__(self, name, max_output_tokens=None, temperature=None, thinking_budget=None, model=None,
+                 hint=None, slo=0.0, min_output_tokens=256, window=100, adjust_every=20,
+                 shrink=0.8, grow=1.1, relax=0.7):
+        self.name = name
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.thinking_budget = thinking_budget
+        self.model = model
+        self.hint = hint
+        self.slo = slo
+        floor = min_output_tokens + (thinking_budget or 0)
+        self.min_output_tokens = min(floor, max_output_tokens or floor)
+        self.adjust_every = adjust_every
+        self.shrink = shrink
+        self.grow = grow
+        self.relax = relax
+        self.output_tokens = max_output_tokens
+        self._latencies = deque(maxlen=window)
+        self._since_adjust = 0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tightened = 0
+        self.relaxed = 0
+        self.thinking_bounded = None
+
+    @classmethod
+    def from_env(cls, name, **defaults):
+        # GENERATION_<NAME>_MAX_TOKENS 등 환경 변수가 있으면 기본값을 덮어쓴다 (빈 문자열이면 모델 기본값)
+        prefix = f'GENERATION_{name.upper()}_'
+        settings = {
+            'max_output_tokens': ('MAX_TOKENS', int),
+            'temperature': ('TEMPERATURE', float),
+            'thinking_budget': ('THINKING_BUDGET', int),
+            'model': ('MODEL', str),
+            'slo': ('SLO', float),
+            'min_output_tokens': ('MIN_TOKENS', int),
+        }
+        for key, (suffix, convert) in settings.items():
+            value = os.getenv(prefix + suffix)
+            if value is not None:
+                defaults[key] = convert(value) if value else None
+        return cls(name, **defaults)
+
+    @property
+    def adaptive(self):
+        return bool(self.slo) and self.max_output_tokens is not None
+
+    def generation_config(self, thinking_supported=False):
+        # generate_content(generation_config=...)에 넘길 dict
+        config = {}
+        if self.output_tokens is not None:
+            config['max_output_tokens'] = self.output_tokens
+        if self.temperature is not None:
+            config['temperature'] = self.temperature
+        if self.thinking_budget is not None and thinking_supported:
+            config['thinking_config'] = {'thinking_budget': self.thinking_budget}
+        return config
+
+    def observe(self, seconds, thinking_supported=False):
+        # 이 프로필로 한 모델 호출 하나의 지연(초)을 기록하고, adjust_every번마다 출력 토큰 상한을 조정한다
+        with self._lock:
+            self.calls += 1
+            self.thinking_bounded = thinking_supported and self.thinking_budget is not None
+            if not self.adaptive or not self.thinking_bounded:
+                return
+            self._latencies.append(seconds)
+            self._since_adjust += 1
+            if self._since_adjust < self.adjust_every:
+                return
+            self._since_adjust = 0
+            latencies = sorted(self._latencies)
+            p95 = latencies[int(len(latencies) * 0.95)]
+            if p95 > self.slo and self.output_tokens > self.min_output_tokens:
+                self.output_tokens = max(self.min_output_tokens, int(self.output_tokens * self.shrink))
+                self.tightened += 1
+                # 줄인 뒤의 지연으로 다시 판단하도록 이전 기록은 버린다
+                self._latencies.clear()
+            elif p95 < self.slo * self.relax and self.output_tokens < self.max_output_tokens:
+                self.output_tokens = min(self.max_output_tokens, int(self.output_tokens * self.grow) + 1)
+                self.relaxed += 1
+                self._latencies.clear()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'model': self.model,
+                'max_output_tokens': self.max_output_tokens,
+                'output_tokens': self.output_tokens,
+                'temperature': self.temperature,
+                'thinking_budget': self.thinking_budget,
+                'slo': self.slo or None,
+                'adjusting': self.adaptive and bool(self.thinking_bounded),
+                'latency_p95': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None,
+                'calls': self.calls,
+                'tightened': self.tightened,
+                'relaxed': self.relaxed,
+            }
@@ -0,0 +1,40 @@
+# gunicorn 설정 (gunicorn은 작업 폴더의 gunicorn.conf.py를 자동으로 읽는다)
+import glob
+import os
+
+# `gunicorn`만 실행해도 앱을 띄운다 (명령줄에 app:app을 주면 그쪽이 우선)
+wsgi_app = 'app:app'
+
+# 마스터가 앱을 한 번 불러 두고 워커를 fork한다. 정적 파일 압축, 설정 읽기, Gemini SDK import를
+# 워커마다 반복하지 않으므로 새 워커가 빨리 뜨고, 불러 둔 메모리를 워커끼리 함께 쓴다.
+# 앱은 fork 전에 스레드나 연결을 만들지 않는다 (스레드·DB 연결·잠금 파일은 프로세스마다 처음 쓸 때 만든다).
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def on_starting(server):
+    # 이전 실행에서 남은 워커별 지표 파일을 지운다
+    multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, '*.db')):
+            os.remove(path)
+
+
+def when_ready(server):
+    # preload_app이면 앱은 이미 마스터에 올라와 있다. 워커를 띄우기 전에 SDK import까지 끝내 둔다.
+    if server.cfg.preload_app:
+        import app
+        app.preload()
+
+
+def post_worker_init(worker):
+    # 워커가 연결을 받기 전에 Gemini 연결을 맺고 캐시 콘텐츠를 찾아 둔다 (끝나면 /ready가 200)
+    import app
+    app.warm_up()
+
+
+def child_exit(server, worker):
+    # 종료된 워커의 처리 중 요청 수(livesum 게이지)가 합계에 남지 않도록 한다
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,133 @@
+import logging
+import re
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from session_store import USER
+
+log = logging.getLogger('seondami.history_window')
+
+_HANGUL = re.compile(r'[가-힣ㄱ-ㆎ]')
+
+# 프롬프트에 넣을 대화 기록
+# turns: 원문 그대로 보낼 최근 턴, summary: 그보다 오래된 턴의 요약, tokens: 추정 토큰 수
+Window = namedtuple('Window', 'turns summary tokens')
+
+EMPTY_WINDOW = Window([], None, 0)
+
+
+def estimate_tokens(text):
+    # Gemini 토크나이저 기준 대략 한글 1.5자, 그 외 문자 4자당 1토큰으로 추정
+    # (요청 경로에서 count_tokens API를 부르지 않기 위한 근사값)
+    hangul = len(_HANGUL.findall(text))
+    return int(hangul / 1.5 + (len(text) - hangul) / 4) + 1
+
+
+def has_context(window):
+    return bool(window.turns or window.summary)
+
+
+def select_window(context, budget):
+    # 최근 턴부터 토큰 예산을 채운다. 예산에서 밀려났지만 아직 요약되지 않은 턴은 pending으로 돌려준다.
+    # 한 번 요약에 들어간 턴은 다시 원문으로 보내지 않는다.
+    # 반환값: (Window, pending 턴 목록, pending의 끝 일련번호)
+    summary_tokens = estimate_tokens(context.summary) if context.summary else 0
+    remaining = budget - summary_tokens
+    turns = context.turns
+    start = len(turns)
+    used = 0
+    while start > 0:
+        seq = context.first_seq + start - 1
+        if seq < context.summary_upto:
+            break
+        cost = estimate_tokens(turns[start - 1][1])
+        if used + cost > remaining:
+            break
+        used += cost
+        start -= 1
+
+    # 대화는 사용자 메시지로 시작해야 하므로 맨 앞의 선다미 답변은 요약 쪽으로 넘긴다
+    while start < len(turns) and turns[start][0] != USER:
+        used -= estimate_tokens(turns[start][1])
+        start += 1
+
+    pending_from = max(context.summary_upto - context.first_seq, 0)
+    pending = turns[pending_from:start]
+    window = Window(turns[start:], context.summary, used + summary_tokens)
+    return window, pending, context.first_seq + start
+
+
+class Summarizer:
+    # 창에서 밀려난 턴을 세션별 누적 요약에 합치는 작업을 요청 경로 밖(백그라운드 스레드)에서 처리한다
+
+    def __init__(self, session_store, summarize, workers=2):
+        self.session_store = session_store
+        self.summarize = summarize
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='summarizer')
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, session_id, pending, upto):
+        if not pending:
+            return
+        with self._lock:
+            if session_id in self._in_flight:
+                return
+            self._in_flight.add(session_id)
+        self._executor.submit(self._run, session_id, upto)
+
+    def _run(self, session_id, upto):
+        try:
+            context = self.session_store.context(session_id)
+            start = max(context.summary_upto - context.first_seq, 0)
+            end = upto - context.first_seq
+            turns = context.turns[start:end]
+            if turns:
+                summary = self.summarize(context.summary, turns)
+                self.session_store.set_summary(session_id, summary, upto)
+            self.completed += 1
+        except Exception as e:
+            log.warning("Error summarizing session", exc_info=e, extra={'session_id': session_id})
+            self.failed += 1
+        finally:
+            with self._lock:
+                self._in_flight.discard(session_id)
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {
+            'in_flight': in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+
+class WindowStats:
+    # 요청별로 프롬프트에 넣은 대화 기록의 추정 토큰 수
+
+    def __init__(self, size=1024):
+        self._recent = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total = 0
+
+    def record(self, window, message_tokens):
+        tokens = window.tokens + message_tokens
+        with self._lock:
+            self.requests += 1
+            self.total += tokens
+            self._recent.append(tokens)
+
+    def stats(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            return {
+                'requests': self.requests,
+                'avg_tokens': round(self.total / self.requests, 1) if self.requests else 0.0,
+                'p95_tokens': recent[int(len(recent) * 0.95)] if recent else 0,
+                'max_tokens': recent[-1] if recent else 0,
+            }
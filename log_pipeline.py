@@ -0,0 +1,223 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+from tracing import current_request_id
+
+# 모든 모듈은 logging.getLogger('seondami.<모듈>')로 기록하고, LogPipeline이 'seondami' 로거에 붙는다
+ROOT_LOGGER = 'seondami'
+
+# LogRecord 기본 속성 (이 밖의 속성은 extra로 넘긴 필드로 보고 JSON에 그대로 넣는다)
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName', 'ring_entry'}
+
+# 중복 판단에서 예외 내용의 객체 주소(0x7f...)와 숫자(포트, 소요 시간, 재시도 횟수 등)는 같은 것으로 본다
+_VOLATILE = re.compile(r'0x[0-9a-fA-F]+|\d+(?:\.\d+)?')
+
+
+def _iso(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat(timespec='milliseconds')
+
+
+class JsonFormatter(logging.Formatter):
+    # 한 줄에 JSON 하나: time, level, logger, message, extra 필드, (있으면) traceback
+
+    def format(self, record):
+        entry = {
+            'time': _iso(record.created),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+            entry['traceback'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _Enqueue(QueueHandler):
+    # 기본 QueueHandler는 요청 스레드에서 메시지와 traceback을 문자열로 만든 뒤 넣고, 큐가 가득 차면 오류를 낸다.
+    # 여기서는 중복 거르기만 요청 스레드에서 하고, 문자열 만들기와 출력은 리스너 스레드에 맡기며, 큐가 가득 차면 버린다.
+
+    def __init__(self, pipeline):
+        super().__init__(None)
+        self.pipeline = pipeline
+
+    def handle(self, record):
+        if not self.pipeline._admit(record):
+            return False
+        self.pipeline._put(record)
+        return True
+
+    def prepare(self, record):
+        return record
+
+
+class _Output(logging.StreamHandler):
+    # 리스너 스레드에서 실행: JSON으로 바꿔 쓰고, 최근 오류 목록의 항목에 traceback을 채운다
+
+    def emit(self, record):
+        super().emit(record)
+        entry = getattr(record, 'ring_entry', None)
+        if entry is not None and record.exc_text:
+            entry['traceback'] = record.exc_text
+
+
+class LogPipeline:
+    # 요청 스레드에서 로그 I/O를 하지 않도록 기록을 큐에 넣고, 프로세스마다 하나인 리스너 스레드가 JSON 한 줄로 출력한다.
+    #
+    # 장애 중 같은 오류가 요청마다 쏟아지는 것을 막기 위해 경고 이상의 기록은
+    # (로거, 메시지, 예외 종류, 주소·숫자를 뺀 예외 내용)이 같으면 dedup_window초 동안 한 번만 출력하고,
+    # 다음에 출력할 때 그동안 건너뛴 횟수를 repeated로 붙인다.
+    # traceback은 예외 종류마다 traceback_interval초에 한 번만 남긴다 (나머지는 종류와 내용만).
+    # 경고 이상의 기록은 최근 ring_size개를 메모리에 두고 /admin/errors로 보여준다 (중복은 count만 늘린다).
+    #
+    # 리스너 스레드는 처음 기록할 때 프로세스마다 만든다 (gunicorn preload 후 fork한 워커에서도 동작).
+    # observe: 기록 결과('logged', 'suppressed', 'dropped')를 받을 함수 (지표 기록용)
+
+    def __init__(self, level=logging.INFO, queue_size=10000, dedup_window=60.0, traceback_interval=10.0,
+                 ring_size=100, stream=None, observe=None):
+        self.level = level
+        self.queue_size = queue_size
+        self.dedup_window = dedup_window
+        self.traceback_interval = traceback_interval
+        self.stream = stream
+        self.observe = observe or (lambda outcome: None)
+        self.ring = deque(maxlen=ring_size)
+        self._seen = {}
+        self._last_traceback = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._listener = None
+        self.logged = 0
+        self.suppressed = 0
+        self.dropped = 0
+        self.tracebacks = 0
+
+    def install(self):
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.setLevel(self.level)
+        logger.propagate = False
+        logger.addHandler(_Enqueue(self))
+        return logger
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            output = _Output(self.stream or sys.stdout)
+            output.setFormatter(JsonFormatter())
+            self._queue = queue.Queue(self.queue_size)
+            self._listener = QueueListener(self._queue, output)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def stop(self):
+        # 남은 기록을 모두 쓰고 리스너 스레드를 끝낸다 (프로세스 종료 시)
+        if self._pid == os.getpid() and self._listener is not None:
+            self._listener.stop()
+            self._pid = None
+
+    def _put(self, record):
+        self._ensure_listener()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            self.observe('dropped')
+            return
+        with self._lock:
+            self.logged += 1
+        self.observe('logged')
+
+    def _admit(self, record):
+        # 요청 스레드에서 실행: 요청 ID를 붙이고, 중복이면 False를 돌려준다
+        if not hasattr(record, 'request_id'):
+            record.request_id = current_request_id()
+        if record.levelno < logging.WARNING:
+            return True
+        error = record.exc_info[1] if record.exc_info else None
+        if error is not None:
+            record.error_type = type(error).__name__
+            record.error = str(error)[:500]
+        error_text = getattr(record, 'error', None)
+        key = (record.name, record.msg, getattr(record, 'error_type', None),
+               _VOLATILE.sub('#', error_text) if error_text else error_text)
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen['logged_at'] < self.dedup_window:
+                seen['suppressed'] += 1
+                seen['entry']['count'] += 1
+                seen['entry']['last_seen'] = _iso(time.time())
+                self.suppressed += 1
+                suppressed = True
+            else:
+                suppressed = False
+                if seen is not None and seen['suppressed']:
+                    record.repeated = seen['suppressed']
+                if error is not None:
+                    if now - self._last_traceback.get(record.error_type, float('-inf')) >= self.traceback_interval:
+                        self._last_traceback[record.error_type] = now
+                        self.tracebacks += 1
+                    else:
+                        record.exc_info = None
+                entry = {
+                    'time': _iso(record.created),
+                    'last_seen': _iso(record.created),
+                    'count': 1,
+                    'level': record.levelname.lower(),
+                    'logger': record.name,
+                    'message': record.getMessage(),
+                    'where': getattr(record, 'where', None),
+                    'error_type': getattr(record, 'error_type', None),
+                    'error': getattr(record, 'error', None),
+                    'request_id': record.request_id,
+                    'traceback': None,
+                }
+                record.ring_entry = entry
+                self.ring.append(entry)
+                if len(self._seen) >= 4096:
+                    self._seen = {k: v for k, v in self._seen.items() if now - v['logged_at'] < self.dedup_window}
+                self._seen[key] = {'logged_at': now, 'suppressed': 0, 'entry': entry}
+        if suppressed:
+            self.observe('suppressed')
+        return not suppressed
+
+    def recent_errors(self, limit=None):
+        # 최근 경고·오류 (최신 순)
+        with self._lock:
+            entries = [dict(entry) for entry in reversed(self.ring)]
+        return entries[:limit] if limit else entries
+
+    def stats(self):
+        with self._lock:
+            return {
+                'logged': self.logged,
+                'suppressed': self.suppressed,
+                'dropped': self.dropped,
+                'tracebacks': self.tracebacks,
+                'queue_depth': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+                'queue_size': self.queue_size,
+                'recent_errors': len(self.ring),
+                'dedup_window': self.dedup_window,
+                'traceback_interval': self.traceback_interval,
+            }
@@ -0,0 +1,241 @@
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+# gunicorn처럼 여러 프로세스로 실행할 때는 PROMETHEUS_MULTIPROC_DIR을 지정하면
+# 워커별 지표가 그 폴더의 mmap 파일에 기록되고, /metrics가 모든 워커의 값을 합쳐서 보여준다.
+# (prometheus_client가 import 시점에 환경 변수를 확인하므로 앱보다 먼저 설정해야 한다)
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# 카카오 스킬 마감(5초)과 웹 마감(60초) 근처를 구분할 수 있도록 버킷을 잡는다
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 4, 4.5, 5, 7.5, 10, 20, 30, 60)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+http_requests = Counter(
+    'seondami_http_requests_total', 'HTTP 요청 수', ['method', 'route', 'status'])
+http_latency = Histogram(
+    'seondami_http_request_duration_seconds', 'HTTP 요청 처리 시간 (스트리밍은 스트림 종료까지)',
+    ['route'], buckets=LATENCY_BUCKETS)
+http_in_progress = Gauge(
+    'seondami_http_requests_in_progress', '처리 중인 HTTP 요청 수',
+    ['route'], multiprocess_mode='livesum')
+
+model_latency = Histogram(
+    'seondami_model_call_duration_seconds', 'Gemini 호출 시간',
+    ['mode', 'profile'], buckets=LATENCY_BUCKETS)
+model_first_chunk = Histogram(
+    'seondami_model_first_chunk_seconds', 'Gemini 스트리밍 첫 조각까지 걸린 시간',
+    buckets=LATENCY_BUCKETS)
+model_in_progress = Gauge(
+    'seondami_model_calls_in_progress', '진행 중인 Gemini 호출 수',
+    ['mode'], multiprocess_mode='livesum')
+model_queue_wait = Histogram(
+    'seondami_model_queue_wait_seconds', 'Gemini 호출 실행기 대기열에서 기다린 시간',
+    buckets=LATENCY_BUCKETS)
+# 생성 프로필별 현재 출력 토큰 상한 (지연 SLO에 따라 조정된 값)
+generation_output_tokens = Gauge(
+    'seondami_generation_output_tokens', '생성 프로필별 현재 max_output_tokens',
+    ['profile'], multiprocess_mode='mostrecent')
+model_tokens = Histogram(
+    'seondami_model_tokens', '요청별 토큰 수 (usage_metadata 기준)',
+    ['kind'], buckets=TOKEN_BUCKETS)
+
+# 회로 차단기 상태 (0: closed, 1: half_open, 2: open). 여러 워커 중 가장 나쁜 상태를 보여준다
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+model_breaker_state = Gauge(
+    'seondami_model_breaker_state', 'Gemini 회로 차단기 상태 (0 closed, 1 half_open, 2 open)',
+    multiprocess_mode='max')
+# retry: 재시도, hedge: 헤지 요청 전송, hedge_win: 헤지 요청이 먼저 끝남 (헤지 승률 = hedge_win / hedge)
+model_events = Counter(
+    'seondami_model_events_total', 'Gemini 호출 재시도·헤지 횟수', ['event'])
+# 답변 텍스트 없이 끝난 Gemini 응답 (finish_reason: MAX_TOKENS면 thinking에 출력 토큰 상한을 다 쓴 경우)
+model_empty_answers = Counter(
+    'seondami_model_empty_answers_total', '텍스트 없이 끝난 Gemini 응답 수', ['profile', 'finish_reason'])
+
+# 모든 워커가 같은 버킷을 보므로 가장 최근에 기록한 값을 쓴다
+quota_remaining = Gauge(
+    'seondami_quota_remaining', 'Gemini 할당량 버킷 잔량 (requests: 요청 수, tokens: 토큰 수)',
+    ['kind'], multiprocess_mode='mostrecent')
+quota_wait = Histogram(
+    'seondami_quota_wait_seconds', 'Gemini 할당량이 찰 때까지 기다린 시간',
+    buckets=LATENCY_BUCKETS)
+
+rate_limited = Counter(
+    'seondami_rate_limited_total', '사용자별 요청 한도를 넘어 거절한 요청 수', ['channel'])
+
+# 메시지 경로 고르기: template은 정해진 인사말, lite는 가벼운 모델, full은 기본 모델
+model_routes = Counter(
+    'seondami_model_routes_total', '경로별 메시지 수', ['channel', 'route', 'reason'])
+model_route_saved = Histogram(
+    'seondami_model_route_saved_seconds', '기본 모델 대신 다른 경로로 답해 줄인 시간(추정)',
+    ['route'], buckets=LATENCY_BUCKETS)
+
+# TRACE_SLOW_MS보다 오래 걸린 요청 (느린 요청 로그의 표본 추출과 관계없이 모두 센다)
+slow_requests = Counter(
+    'seondami_slow_requests_total', '느린 요청 수', ['route'])
+
+# 로그 기록 결과: logged(출력 대기열에 넣음), suppressed(같은 오류가 반복되어 건너뜀), dropped(대기열이 가득 차 버림)
+log_records = Counter(
+    'seondami_log_records_total', '로그 기록 수', ['outcome'])
+
+errors = Counter(
+    'seondami_errors_total', '처리 중 발생한 예외 수', ['where', 'type'])
+
+# 같은 질문 묶어 처리하기: leader는 직접 생성, follower는 같은 워커의 생성 결과를 기다림,
+# shared는 다른 워커가 만든 답변을 받아 씀 (묶인 비율 = (follower + shared) / (leader + follower))
+single_flight_requests = Counter(
+    'seondami_single_flight_total', '같은 질문 묶어 처리하기 결과', ['role'])
+
+
+def route_label():
+    # 경로 변수 값 대신 등록된 라우트 규칙을 써서 레이블 종류가 늘어나지 않게 한다
+    if request.url_rule is None:
+        return 'unmatched'
+    return request.url_rule.rule
+
+
+def instrument(app):
+    # 모든 요청의 수, 처리 시간, 처리 중인 요청 수를 라우트별로 기록
+    @app.before_request
+    def _start_request():
+        g.metrics_route = route_label()
+        g.metrics_started = time.perf_counter()
+        http_in_progress.labels(g.metrics_route).inc()
+
+    @app.after_request
+    def _record_status(resp):
+        g.metrics_status = resp.status_code
+        return resp
+
+    # 스트리밍 응답(stream_with_context)은 스트림이 끝난 뒤에 teardown이 호출된다
+    @app.teardown_request
+    def _finish_request(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        route = g.metrics_route
+        status = 500 if exc is not None else g.get('metrics_status', 500)
+        http_requests.labels(request.method, route, str(status)).inc()
+        http_latency.labels(route).observe(time.perf_counter() - started)
+        http_in_progress.labels(route).dec()
+
+
+class AsgiInstrument:
+    # instrument()와 같은 HTTP 지표를 ASGI 앱의 routes 경로에 기록한다 (asgi.py)
+    # 스트리밍 응답은 마지막 조각을 보낼 때까지 잰다
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = set(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        route = scope['path']
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        http_in_progress.labels(route).inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests.labels(scope['method'], route, str(status)).inc()
+            http_latency.labels(route).observe(time.perf_counter() - started)
+            http_in_progress.labels(route).dec()
+
+
+@contextmanager
+def model_call(mode, profile):
+    model_in_progress.labels(mode).inc()
+    started = time.perf_counter()
+    try:
+        yield started
+    finally:
+        model_latency.labels(mode, profile).observe(time.perf_counter() - started)
+        model_in_progress.labels(mode).dec()
+
+
+def record_output_tokens(profile, tokens):
+    if tokens is not None:
+        generation_output_tokens.labels(profile).set(tokens)
+
+
+def record_first_chunk(started):
+    model_first_chunk.observe(time.perf_counter() - started)
+
+
+def record_tokens(usage):
+    model_tokens.labels('prompt').observe(usage.prompt_token_count)
+    model_tokens.labels('cached').observe(usage.cached_content_token_count)
+    model_tokens.labels('output').observe(usage.candidates_token_count)
+
+
+def record_queue_wait(seconds):
+    model_queue_wait.observe(seconds)
+
+
+def record_quota(waited, remaining):
+    quota_wait.observe(waited)
+    for kind, value in remaining.items():
+        if value is not None:
+            quota_remaining.labels(kind).set(value)
+
+
+def record_rate_limited(channel):
+    rate_limited.labels(channel).inc()
+
+
+def record_breaker_state(state):
+    model_breaker_state.set(BREAKER_STATES[state])
+
+
+def record_model_event(event):
+    model_events.labels(event).inc()
+
+
+def record_empty_answer(profile, finish_reason):
+    model_empty_answers.labels(profile, finish_reason or 'unknown').inc()
+
+
+def record_route(channel, route, reason, saved):
+    model_routes.labels(channel, route, reason).inc()
+    if saved is not None:
+        model_route_saved.labels(route).observe(saved)
+
+
+def record_single_flight(role):
+    single_flight_requests.labels(role).inc()
+
+
+def record_slow_request(route):
+    slow_requests.labels(route).inc()
+
+
+def record_log(outcome):
+    log_records.labels(outcome).inc()
+
+
+def record_error(where, error):
+    errors.labels(where, type(error).__name__).inc()
+
+
+def render():
+    # 다중 프로세스 모드에서는 매번 모든 워커의 파일을 읽어 합친다
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
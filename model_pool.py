@@ -0,0 +1,401 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeout
+
+
+class PoolBusy(Exception):
+    # 모델 호출을 받아들일 수 없는 상태 (호출 측에서 429/503 또는 "혼잡" 안내로 응답)
+    pass
+
+
+class QueueFull(PoolBusy):
+    pass
+
+
+class QueueTimeout(PoolBusy):
+    pass
+
+
+class _Failure:
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+_DONE = object()
+
+
+class _Work:
+    __slots__ = ('user', 'fn', 'args', 'kwargs', 'future', 'queued_at', 'deadline')
+
+    def __init__(self, user, fn, args, kwargs, deadline):
+        self.user = user
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.deadline = deadline
+
+
+class ModelPool:
+    # 모델 호출 전용 실행기
+    # 동시에 workers개까지 실행하고, 나머지는 max_queue개까지만 대기시킨다.
+    # 대기열이 가득 차면 즉시 QueueFull, 마감 시각까지 결과를 받지 못하면 QueueTimeout을 낸다.
+    # 대기열은 사용자(user)별로 따로 두고 사용자를 돌아가며 하나씩 꺼내므로(라운드 로빈),
+    # 한 사용자가 요청을 몰아 보내도 다른 사용자의 요청이 그 뒤에 밀리지 않는다.
+    # 한 사용자가 동시에 올릴 수 있는 요청은 max_user_queue개까지다 (실행 중 포함, 0이면 제한 없음).
+    # observe: 대기 시간(초)을 받을 함수 (지표 기록용)
+
+    def __init__(self, workers=8, max_queue=16, max_user_queue=0, observe=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        self.observe = observe or (lambda wait: None)
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queues = OrderedDict()
+        self._user_pending = {}
+        self._worker_pid = None
+        self._pending = 0
+        self._running = 0
+        self._waits = deque(maxlen=1024)
+        self.submitted = 0
+        self.rejected = 0
+        self.user_rejected = 0
+        self.timed_out = 0
+        self.expired = 0
+        self.abandoned = 0
+
+    def call(self, fn, *args, deadline=None, user=None, **kwargs):
+        work = self._submit(fn, args, kwargs, deadline, user)
+        try:
+            return work.future.result(timeout=self._remaining(deadline))
+        except FutureTimeout:
+            self._give_up(work)
+            raise QueueTimeout('model call did not finish before the deadline')
+        except CancelledError:
+            raise QueueTimeout('model call expired in the queue')
+
+    def stream(self, fn, *args, deadline=None, user=None, **kwargs):
+        # fn이 돌려주는 이터레이터를 작업 스레드에서 읽어 조각 단위로 넘겨준다
+        # 받는 쪽이 중간에 그만두면(클라이언트 연결 끊김으로 GeneratorExit, 마감 시각 초과) cancelled를 세워
+        # 작업 스레드가 다음 조각에서 읽기를 멈추고 fn의 이터레이터를 닫게 한다 (업스트림 스트림도 함께 닫힌다)
+        chunks = queue.Queue()
+        cancelled = threading.Event()
+
+        def run(*args, **kwargs):
+            if cancelled.is_set():
+                return
+            items = None
+            try:
+                items = iter(fn(*args, **kwargs))
+                for item in items:
+                    if cancelled.is_set():
+                        break
+                    chunks.put(item)
+                else:
+                    chunks.put(_DONE)
+            except BaseException as e:
+                chunks.put(_Failure(e))
+            finally:
+                close = getattr(items, 'close', None)
+                if close is not None:
+                    close()
+
+        work = self._submit(run, args, kwargs, deadline, user)
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=self._remaining(deadline))
+                except queue.Empty:
+                    self._give_up(work)
+                    raise QueueTimeout('model stream did not finish before the deadline')
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        except GeneratorExit:
+            # 조각을 하나 이상 넘긴 뒤이므로 작업은 이미 실행 중이다
+            with self._lock:
+                self.abandoned += 1
+            raise
+        finally:
+            cancelled.set()
+
+    def saturated(self):
+        with self._lock:
+            return self._pending >= self.workers + self.max_queue
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queue_depth': self._pending - self._running,
+                'queued_users': len(self._queues),
+                'max_user_queue': self.max_user_queue,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'user_rejected': self.user_rejected,
+                'timed_out': self.timed_out,
+                'expired': self.expired,
+                'abandoned': self.abandoned,
+                'wait_ms_p50': round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                'wait_ms_p95': round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+                'wait_ms_max': round(waits[-1] * 1000, 1) if waits else 0.0,
+            }
+
+    def _submit(self, fn, args, kwargs, deadline, user):
+        work = _Work(user, fn, args, kwargs, deadline)
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFull('model pool queue is full')
+            user_pending = self._user_pending.get(user, 0)
+            if user is not None and self.max_user_queue and user_pending >= self.max_user_queue:
+                self.user_rejected += 1
+                raise QueueFull('too many pending model calls for this user')
+            self._ensure_workers()
+            self._pending += 1
+            self._user_pending[user] = user_pending + 1
+            self.submitted += 1
+            self._queues.setdefault(user, deque()).append(work)
+            self._ready.notify()
+        return work
+
+    def _ensure_workers(self):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        # gunicorn이 fork한 뒤에는 부모의 스레드가 없으므로 프로세스마다 새로 띄운다
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f'model_{i}', daemon=True).start()
+
+    def _next(self):
+        # 가장 오래 차례를 기다린 사용자의 첫 요청을 꺼내고, 남은 요청이 있으면 그 사용자를 맨 뒤로 보낸다
+        with self._lock:
+            while not self._queues:
+                self._ready.wait()
+            user, works = next(iter(self._queues.items()))
+            work = works.popleft()
+            if works:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            return work
+
+    def _worker(self):
+        while True:
+            work = self._next()
+            # 대기 중에 포기(취소)된 요청은 _give_up에서 이미 정리했다
+            if work.future.set_running_or_notify_cancel():
+                self._run(work)
+
+    def _run(self, work):
+        started = time.monotonic()
+        wait = started - work.queued_at
+        with self._lock:
+            self._running += 1
+            self._waits.append(wait)
+        self.observe(wait)
+        try:
+            # 대기하는 동안 마감 시각이 지났으면 호출하지 않는다 (호출 측은 이미 포기한 상태)
+            if work.deadline is not None and started >= work.deadline:
+                with self._lock:
+                    self.expired += 1
+                work.future.set_exception(QueueTimeout('model call expired in the queue'))
+                return
+            work.future.set_result(work.fn(*work.args, **work.kwargs))
+        except BaseException as e:
+            work.future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._done(work.user)
+
+    def _done(self, user):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        self._pending -= 1
+        count = self._user_pending.get(user, 0) - 1
+        if count > 0:
+            self._user_pending[user] = count
+        else:
+            self._user_pending.pop(user, None)
+
+    def _give_up(self, work):
+        with self._lock:
+            self.timed_out += 1
+        # 아직 대기 중이면 취소하고, 이미 실행 중이면 끝날 때까지 두되 결과는 버린다
+        # 취소한 요청은 대기열에 남아 있다가 작업 스레드가 꺼낼 때 버린다
+        if work.future.cancel():
+            with self._lock:
+                self._done(work.user)
+
+    @staticmethod
+    def _remaining(deadline):
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+
+class AsyncModelPool:
+    # ModelPool의 asyncio 버전 (ASGI 서버용, asgi.py 참고)
+    # 모델 호출을 이벤트 루프의 코루틴으로 실행하므로 작업 스레드 없이 동시에 concurrency개까지 실행한다.
+    # 대기열 상한(max_queue), 사용자별 라운드 로빈, 사용자별 상한(max_user_queue), 마감 시각은 ModelPool과 같다.
+    # 한 이벤트 루프(워커 프로세스 하나)에서만 쓴다.
+
+    def __init__(self, concurrency=64, max_queue=128, max_user_queue=0, observe=None):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        self.observe = observe or (lambda wait: None)
+        self._queues = OrderedDict()
+        self._user_pending = {}
+        self._pending = 0
+        self._running = 0
+        self._waits = deque(maxlen=1024)
+        self.submitted = 0
+        self.rejected = 0
+        self.user_rejected = 0
+        self.timed_out = 0
+
+    async def call(self, fn, *args, deadline=None, user=None, **kwargs):
+        # fn은 코루틴 함수. 마감 시각이 지나면 호출을 취소하고 QueueTimeout을 낸다
+        async with self._slot(user, deadline):
+            try:
+                return await asyncio.wait_for(fn(*args, **kwargs), self._remaining(deadline))
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise QueueTimeout('model call did not finish before the deadline') from None
+
+    async def stream(self, fn, *args, deadline=None, user=None, **kwargs):
+        # fn이 돌려주는 async 이터레이터를 조각 단위로 넘겨준다
+        async with self._slot(user, deadline):
+            chunks = fn(*args, **kwargs).__aiter__()
+            while True:
+                try:
+                    item = await asyncio.wait_for(anext(chunks, _DONE), self._remaining(deadline))
+                except asyncio.TimeoutError:
+                    self.timed_out += 1
+                    raise QueueTimeout('model stream did not finish before the deadline') from None
+                if item is _DONE:
+                    return
+                yield item
+
+    def saturated(self):
+        return self._pending >= self.concurrency + self.max_queue
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'running': self._running,
+            'queue_depth': self._pending - self._running,
+            'queued_users': len(self._queues),
+            'max_user_queue': self.max_user_queue,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'user_rejected': self.user_rejected,
+            'timed_out': self.timed_out,
+            'wait_ms_p50': round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+            'wait_ms_p95': round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            'wait_ms_max': round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+
+    @asynccontextmanager
+    async def _slot(self, user, deadline):
+        if self._pending >= self.concurrency + self.max_queue:
+            self.rejected += 1
+            raise QueueFull('model pool queue is full')
+        user_pending = self._user_pending.get(user, 0)
+        if user is not None and self.max_user_queue and user_pending >= self.max_user_queue:
+            self.user_rejected += 1
+            raise QueueFull('too many pending model calls for this user')
+        self._pending += 1
+        self._user_pending[user] = user_pending + 1
+        self.submitted += 1
+        try:
+            await self._acquire(user, deadline)
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            self._done(user)
+
+    async def _acquire(self, user, deadline):
+        # 실행 자리가 비어 있고 먼저 기다리는 요청이 없으면 바로 실행하고, 아니면 차례를 넘겨받을 때까지 기다린다
+        queued_at = time.monotonic()
+        if self._running < self.concurrency and not self._queues:
+            self._running += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._queues.setdefault(user, deque()).append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self._remaining(deadline))
+            except BaseException as e:
+                if waiter.done() and not waiter.cancelled():
+                    # 차례를 넘겨받은 직후에 포기했으면 자리를 다음 요청에 넘긴다
+                    self._release()
+                else:
+                    waiter.cancel()
+                    self._discard(user, waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timed_out += 1
+                    raise QueueTimeout('model call expired in the queue') from None
+                raise
+        wait = time.monotonic() - queued_at
+        self._waits.append(wait)
+        self.observe(wait)
+
+    def _release(self):
+        # 가장 오래 차례를 기다린 사용자의 첫 요청에 실행 자리를 넘기고(남은 요청이 있으면 그 사용자를 맨 뒤로),
+        # 기다리는 요청이 없으면 자리를 비운다
+        while self._queues:
+            user, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._running -= 1
+
+    def _discard(self, user, waiter):
+        waiters = self._queues.get(user)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del self._queues[user]
+
+    def _done(self, user):
+        self._pending -= 1
+        count = self._user_pending.get(user, 0) - 1
+        if count > 0:
+            self._user_pending[user] = count
+        else:
+            self._user_pending.pop(user, None)
+
+    @staticmethod
+    def _remaining(deadline):
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
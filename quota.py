@@ -0,0 +1,251 @@
+import asyncio
+import os
+import struct
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from google.api_core import exceptions
+
+from model_pool import PoolBusy
+
+# 공유 상태: 요청 버킷 잔량, 토큰 버킷 잔량, 마지막 갱신 시각(time.time())
+_STATE = struct.Struct('<ddd')
+
+
+class QuotaExceeded(PoolBusy):
+    # 마감 시각(또는 max_wait) 안에 Gemini 할당량이 다시 차지 않아 호출하지 않고 거절
+    pass
+
+
+class _Ticket:
+    # reserve()가 돌려주는 값: 호출이 끝나면 used에 실제 토큰 수(usage_metadata)를 넣는다
+    # waited는 할당량을 기다린 시간(초)이므로 호출 시간 제한에서 빼고 쓴다
+    # charged는 토큰 버킷에서 실제로 뺀 양 (추정치가 버킷 크기보다 크면 버킷 크기만큼만 뺀다)
+
+    __slots__ = ('estimated', 'charged', 'waited', 'used')
+
+    def __init__(self, estimated, charged, waited):
+        self.estimated = estimated
+        self.charged = charged
+        self.waited = waited
+        self.used = None
+
+
+class QuotaGovernor:
+    # 분당 요청 수(rpm)와 분당 토큰 수(tpm) 할당량을 모든 gunicorn 워커가 함께 지키도록 하는 토큰 버킷.
+    # path를 지정하면 그 파일에 버킷 상태를 두고 파일 잠금(flock)으로 워커끼리 조율한다.
+    #
+    # 어느 60초 구간에서도 할당량을 넘지 않도록, 버킷 크기(한꺼번에 쓸 수 있는 양)를 할당량의 burst 비율로,
+    # 채우는 속도를 나머지(1 - headroom - burst)로 나눈다. 예: rpm 60, burst 0.1, headroom 0.05이면
+    # 한꺼번에 6건, 이후 분당 51건까지 보낸다.
+    # 호출 전에는 추정 토큰 수로 미리 빼 두고, 호출이 끝나면 usage_metadata의 실제 토큰 수로 정산한다.
+    # 할당량이 모자라면 채워질 때까지 기다리되, max_wait나 마감 시각을 넘기게 되면 QuotaExceeded를 낸다.
+    # observe: (기다린 시간(초), remaining()) 을 받을 함수 (지표 기록용)
+
+    def __init__(self, rpm=0, tpm=0, path=None, burst=0.1, headroom=0.05, max_wait=2.0, observe=None):
+        if path and fcntl is None:
+            raise RuntimeError('cross-process quota requires fcntl (Unix)')
+        self.rpm = rpm
+        self.tpm = tpm
+        self.path = path
+        self.max_wait = max_wait
+        self.observe = observe or (lambda waited, remaining: None)
+        sustained = max(0.0, 1 - headroom - burst)
+        self._request_capacity = max(1.0, rpm * burst)
+        self._request_rate = rpm * sustained / 60
+        self._token_capacity = max(1.0, tpm * burst)
+        self._token_rate = tpm * sustained / 60
+        self._lock = threading.Lock()
+        self._memory = None
+        self._fd = None
+        self._fd_pid = None
+        self.granted = 0
+        self.waited = 0
+        self.rejected = 0
+        self.exhausted = 0
+        self.tokens_estimated = 0
+        self.tokens_used = 0
+
+    @property
+    def enabled(self):
+        return self.rpm > 0 or self.tpm > 0
+
+    def acquire(self, tokens, deadline=None, max_wait=None):
+        # 요청 1건과 tokens개를 예약하고 할당량이 찰 때까지 기다린다.
+        # (기다린 시간(초), 토큰 버킷에서 실제로 뺀 양)을 돌려준다 (뺀 양은 settle()에 넘긴다)
+        wait, charged = self._take(tokens, deadline, max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        self._observe(wait)
+        return wait, charged
+
+    async def acquire_async(self, tokens, deadline=None, max_wait=None):
+        # acquire()의 asyncio 버전 (버킷 상태를 읽고 쓰는 잠금 구간은 짧으므로 그대로 잡는다)
+        wait, charged = self._take(tokens, deadline, max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._observe(wait)
+        return wait, charged
+
+    def _take(self, tokens, deadline, max_wait):
+        # 예약만 하고 (기다려야 할 시간(초), 토큰 버킷에서 뺀 양)을 돌려준다. 그 안에 차지 않으면 QuotaExceeded
+        if not self.enabled:
+            return 0.0, 0
+        limit = self.max_wait if max_wait is None else max_wait
+        if deadline is not None:
+            limit = min(limit, deadline - time.monotonic())
+        # 버킷 크기보다 큰 추정치는 영원히 기다리게 되므로 버킷 크기만큼만 뺀다
+        charged = min(tokens, self._token_capacity) if self.tpm > 0 else 0
+        with self._state() as state:
+            requests_left, tokens_left = state[0] - 1, state[1] - charged
+            wait = max(self._wait(requests_left, self._request_rate, self.rpm),
+                       self._wait(tokens_left, self._token_rate, self.tpm))
+            if wait > limit:
+                rejected = True
+            else:
+                rejected = False
+                state[0], state[1] = requests_left, tokens_left
+        with self._lock:
+            if rejected:
+                self.rejected += 1
+            else:
+                self.granted += 1
+                self.tokens_estimated += tokens
+                if wait > 0:
+                    self.waited += 1
+        if rejected:
+            raise QuotaExceeded(f'model quota exhausted (next slot in {wait:.1f}s)')
+        return wait, charged
+
+    def _observe(self, wait):
+        if self.enabled:
+            self.observe(wait, self.remaining())
+
+    def settle(self, charged, used):
+        # 예약할 때 토큰 버킷에서 실제로 뺀 양(charged)과 실제 사용량의 차이를 반영한다
+        # (추정치가 아니라 뺀 양을 기준으로 해야 추정치가 버킷 크기보다 클 때 과하게 돌려주지 않는다)
+        if not self.enabled or used is None:
+            return
+        with self._lock:
+            self.tokens_used += used
+        if self.tpm <= 0 or used == charged:
+            return
+        with self._state() as state:
+            state[1] = min(self._token_capacity, state[1] + charged - used)
+
+    def exhaust(self):
+        # Gemini가 429를 돌려주면 다른 워커도 버킷이 다시 찰 때까지 호출하지 않도록 비운다
+        if not self.enabled:
+            return
+        with self._state() as state:
+            state[0] = min(state[0], 0.0)
+            state[1] = min(state[1], 0.0)
+        with self._lock:
+            self.exhausted += 1
+
+    @contextmanager
+    def reserve(self, tokens, deadline=None):
+        # acquire + settle: with 블록 안에서 ticket.used에 실제 토큰 수를 넣으면 끝날 때 정산한다
+        waited, charged = self.acquire(tokens, deadline)
+        ticket = _Ticket(tokens, charged, waited)
+        try:
+            yield ticket
+        except exceptions.TooManyRequests:
+            self.exhaust()
+            raise
+        finally:
+            self.settle(ticket.charged, ticket.used)
+
+    @asynccontextmanager
+    async def reserve_async(self, tokens, deadline=None):
+        # reserve()의 asyncio 버전
+        waited, charged = await self.acquire_async(tokens, deadline)
+        ticket = _Ticket(tokens, charged, waited)
+        try:
+            yield ticket
+        except exceptions.TooManyRequests:
+            self.exhaust()
+            raise
+        finally:
+            self.settle(ticket.charged, ticket.used)
+
+    def remaining(self):
+        if not self.enabled:
+            return {'requests': None, 'tokens': None}
+        with self._state(write=False) as state:
+            return {
+                'requests': round(state[0], 2) if self.rpm > 0 else None,
+                'tokens': round(state[1]) if self.tpm > 0 else None,
+            }
+
+    def stats(self):
+        stats = {
+            'enabled': self.enabled,
+            'shared': bool(self.path),
+            'rpm': self.rpm,
+            'tpm': self.tpm,
+            'remaining': self.remaining(),
+        }
+        with self._lock:
+            stats.update({
+                'granted': self.granted,
+                'waited': self.waited,
+                'rejected': self.rejected,
+                'exhausted': self.exhausted,
+                'tokens_estimated': self.tokens_estimated,
+                'tokens_used': self.tokens_used,
+            })
+        return stats
+
+    @staticmethod
+    def _wait(left, rate, limit):
+        # 잔량이 0 이상이 될 때까지 걸리는 시간 (할당량을 정하지 않은 쪽은 기다리지 않는다)
+        if limit <= 0 or left >= 0:
+            return 0.0
+        return -left / rate if rate > 0 else float('inf')
+
+    def _refill(self, state):
+        now = time.time()
+        elapsed = max(0.0, now - state[2])
+        state[0] = min(self._request_capacity, state[0] + elapsed * self._request_rate)
+        state[1] = min(self._token_capacity, state[1] + elapsed * self._token_rate)
+        state[2] = now
+
+    @contextmanager
+    def _state(self, write=True):
+        # 버킷 상태를 잠그고 채운 뒤 돌려준다. with 블록에서 바꾼 값은 끝날 때 기록한다.
+        with self._lock:
+            if not self.path:
+                if self._memory is None:
+                    self._memory = [self._request_capacity, self._token_capacity, time.time()]
+                self._refill(self._memory)
+                yield self._memory
+                return
+            fd = self._file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, _STATE.size, 0)
+                if len(data) == _STATE.size:
+                    state = list(_STATE.unpack(data))
+                else:
+                    state = [self._request_capacity, self._token_capacity, time.time()]
+                self._refill(state)
+                yield state
+                if write:
+                    os.pwrite(fd, _STATE.pack(*state), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _file(self):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        # fork한 프로세스끼리 같은 파일 디스크립터를 쓰면 flock이 서로를 막지 못하므로 프로세스마다 새로 연다
+        if self._fd_pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._fd_pid = os.getpid()
+        return self._fd
@@ -0,0 +1,80 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    # 사용자별 토큰 버킷: 분당 per_minute개씩 채워지고 최대 burst개까지 모아 둘 수 있다.
+    # 버킷은 최근에 쓴 순서로 두고 max_users개를 넘으면 가장 오래 쓰지 않은 사용자부터 지운다.
+    # 가득 찰 만큼 쉰 사용자의 버킷은 새 버킷과 같으므로 지워도 결과가 달라지지 않는다.
+
+    def __init__(self, per_minute=20, burst=5, max_users=10000):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0 and self.burst > 0
+
+    def acquire(self, user):
+        # 요청 하나를 받아도 되면 0을, 아니면 다시 시도할 수 있을 때까지의 시간(초)을 돌려준다
+        if not self.enabled:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(user, None)
+            if bucket is None:
+                bucket = _Bucket(self.burst, now)
+            else:
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+            self._buckets[user] = bucket
+            self._evict(now)
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                self.allowed += 1
+                return 0
+            self.rejected += 1
+            return (1 - bucket.tokens) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {
+                'per_minute': round(self.rate * 60, 3),
+                'burst': self.burst,
+                'users': len(self._buckets),
+                'max_users': self.max_users,
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+                'evicted': self.evicted,
+            }
+
+    def _evict(self, now):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        idle = self.burst / self.rate
+        while self._buckets:
+            user, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_users and now - bucket.updated < idle:
+                break
+            del self._buckets[user]
+            self.evicted += 1
+
+
+def retry_after_seconds(wait):
+    # Retry-After 헤더용 정수 초
+    return max(1, math.ceil(wait))
@@ -0,0 +1,366 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from google.api_core import exceptions
+
+# 다시 시도하면 성공할 수 있는 업스트림 오류 (회로 차단기 실패로도 센다)
+# 요청 자체가 잘못된 경우(InvalidArgument 등)는 재시도하지 않는다
+RETRYABLE_ERRORS = (
+    exceptions.ServiceUnavailable,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.TooManyRequests,
+    exceptions.GatewayTimeout,
+)
+
+
+class CircuitOpen(Exception):
+    # 업스트림이 불안정해 회로가 열려 있어 호출하지 않고 바로 실패
+    pass
+
+
+class CircuitBreaker:
+    # 연속 failure_threshold번 실패하면 reset_timeout초 동안 호출을 막고(open),
+    # 그 뒤 한 번만 시험 호출(half_open)을 보내 성공하면 다시 연다(closed).
+
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, on_change=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_change = on_change or (lambda state: None)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self._set(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._set(self.CLOSED)
+
+    def release(self):
+        # 업스트림을 부르지 못하고 끝난 경우: 상태는 그대로 두고 시험 호출 자리만 돌려준다
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self.opened += 1
+                    self._set(self.OPEN)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+    def _set(self, state):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        self.state = state
+        self.on_change(state)
+
+
+class ModelCaller:
+    # 모델 호출에 마감 시각, 지터 백오프 재시도, 헤지 요청, 회로 차단기를 적용한다.
+    # fn(timeout)은 timeout초 안에 끝나야 하는 호출 한 번 (SDK 자체 재시도는 끈 상태로 넘긴다).
+    # 헤지: 첫 요청이 최근 성공 지연의 p95만큼 지나도 끝나지 않으면 같은 요청을 하나 더 보내고
+    # 먼저 끝난 쪽을 쓴다. 전체 호출 중 hedge_max_ratio 비율까지만 보낸다.
+    # local_errors: 업스트림을 부르기 전에 난 오류 (할당량 초과 등). 재시도하지 않고 회로 상태에도 넣지 않는다.
+    # observe: 'retry'/'hedge'/'hedge_win' 이벤트를 받을 함수 (지표 기록용)
+
+    def __init__(self, breaker, max_attempts=3, backoff_base=0.2, backoff_cap=2.0, min_attempt_time=0.5,
+                 hedge=False, hedge_min_delay=0.5, hedge_max_ratio=0.1, hedge_workers=8, local_errors=(),
+                 observe=None):
+        self.breaker = breaker
+        self.local_errors = local_errors
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.min_attempt_time = min_attempt_time
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.observe = observe or (lambda event: None)
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='hedge') if hedge else None
+        self._latencies = deque(maxlen=256)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def call(self, fn, deadline):
+        with self._lock:
+            self.calls += 1
+        attempt = 0
+        while True:
+            self._before_attempt()
+            started = time.monotonic()
+            try:
+                result = self._attempt(fn, deadline)
+            except self.local_errors:
+                self.breaker.release()
+                raise
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                attempt += 1
+                time.sleep(self._backoff(attempt, deadline, e))
+                continue
+            except Exception:
+                # 요청이 잘못된 경우 등은 업스트림이 응답은 한 것이므로 실패로 세지 않는다
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            self._record_latency(time.monotonic() - started)
+            return result
+
+    def stream(self, fn, deadline):
+        # 첫 조각을 받기 전까지만 재시도한다 (이미 보낸 조각은 되돌릴 수 없으므로)
+        with self._lock:
+            self.calls += 1
+        attempt = 0
+        while True:
+            self._before_attempt()
+            started = time.monotonic()
+            try:
+                chunks = iter(fn(self._remaining(deadline)))
+                first = next(chunks, None)
+            except self.local_errors:
+                self.breaker.release()
+                raise
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                attempt += 1
+                time.sleep(self._backoff(attempt, deadline, e))
+                continue
+            except Exception:
+                self.breaker.record_success()
+                raise
+            break
+        # 첫 조각이 왔으면 업스트림은 정상으로 본다 (클라이언트가 중간에 끊어도 시험 호출 상태가 풀리도록)
+        self.breaker.record_success()
+        self._record_latency(time.monotonic() - started)
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        except RETRYABLE_ERRORS:
+            self.breaker.record_failure()
+            raise
+
+    async def call_async(self, fn, deadline):
+        # call()의 asyncio 버전: fn(timeout)은 코루틴 함수이고, 헤지 요청은 스레드 대신 태스크로 보낸다
+        # 호출 측이 취소되면(클라이언트 연결 끊김 등) 회로 상태는 그대로 두고 시험 호출 자리만 돌려준다
+        with self._lock:
+            self.calls += 1
+        attempt = 0
+        while True:
+            self._before_attempt()
+            started = time.monotonic()
+            try:
+                result = await self._attempt_async(fn, deadline)
+            except (asyncio.CancelledError, *self.local_errors):
+                self.breaker.release()
+                raise
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                attempt += 1
+                await asyncio.sleep(self._backoff(attempt, deadline, e))
+                continue
+            except Exception:
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            self._record_latency(time.monotonic() - started)
+            return result
+
+    async def stream_async(self, fn, deadline):
+        # stream()의 asyncio 버전: fn(timeout)은 조각을 내는 async 이터러블을 돌려준다
+        with self._lock:
+            self.calls += 1
+        attempt = 0
+        while True:
+            self._before_attempt()
+            started = time.monotonic()
+            try:
+                chunks = fn(self._remaining(deadline)).__aiter__()
+                first = await anext(chunks, None)
+            except (asyncio.CancelledError, *self.local_errors):
+                self.breaker.release()
+                raise
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                attempt += 1
+                await asyncio.sleep(self._backoff(attempt, deadline, e))
+                continue
+            except Exception:
+                self.breaker.record_success()
+                raise
+            break
+        self.breaker.record_success()
+        self._record_latency(time.monotonic() - started)
+        try:
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        except RETRYABLE_ERRORS:
+            self.breaker.record_failure()
+            raise
+
+    def hedge_delay(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < 20:
+            return max(self.hedge_min_delay, latencies[-1] if latencies else 0.0)
+        return max(self.hedge_min_delay, latencies[int(len(latencies) * 0.95)])
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'calls': self.calls,
+                'retries': self.retries,
+                'hedge_enabled': self.hedge,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'hedge_win_rate': round(self.hedge_wins / self.hedges, 4) if self.hedges else 0.0,
+            }
+        stats['hedge_delay'] = round(self.hedge_delay(), 3) if self.hedge else None
+        stats['breaker'] = self.breaker.stats()
+        return stats
+
+    def _before_attempt(self):
+        if not self.breaker.allow():
+            raise CircuitOpen('model circuit breaker is open')
+
+    def _backoff(self, attempt, deadline, error):
+        # full jitter 백오프 시간(초). 다음 시도에 쓸 시간이 남지 않으면 마지막 오류를 그대로 올린다
+        if attempt >= self.max_attempts:
+            raise error
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        if time.monotonic() + delay + self.min_attempt_time > deadline:
+            raise error
+        with self._lock:
+            self.retries += 1
+        self.observe('retry')
+        return delay
+
+    def _attempt(self, fn, deadline):
+        if not self.hedge:
+            return fn(self._remaining(deadline))
+
+        primary = self._executor.submit(fn, self._remaining(deadline))
+        done, _ = wait([primary], timeout=min(self.hedge_delay(), self._remaining(deadline)))
+        if done or not self._take_hedge(deadline):
+            return self._result(primary, deadline)
+
+        secondary = self._executor.submit(fn, self._remaining(deadline))
+        pending = {primary, secondary}
+        error = None
+        # 먼저 성공한 쪽을 쓴다. 늦게 끝난 쪽의 결과는 버린다.
+        while pending:
+            done, pending = wait(pending, timeout=self._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                        self.observe('hedge_win')
+                    return future.result()
+                error = future.exception()
+        raise error or exceptions.DeadlineExceeded('model call did not finish before the deadline')
+
+    async def _attempt_async(self, fn, deadline):
+        if not self.hedge:
+            return await fn(self._remaining(deadline))
+
+        primary = asyncio.ensure_future(fn(self._remaining(deadline)))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_delay(), self._remaining(deadline)))
+            if not done and self._take_hedge(deadline):
+                tasks.append(asyncio.ensure_future(fn(self._remaining(deadline))))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=self._remaining(deadline), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            with self._lock:
+                                self.hedge_wins += 1
+                            self.observe('hedge_win')
+                        return task.result()
+                    error = task.exception()
+            raise error or exceptions.DeadlineExceeded('model call did not finish before the deadline')
+        finally:
+            # 늦게 끝난 쪽은 결과를 버리고 취소한다 (스레드와 달리 태스크는 중간에 취소할 수 있다)
+            for task in tasks:
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()
+                else:
+                    task.cancel()
+
+    def _take_hedge(self, deadline):
+        if self._remaining(deadline) < self.min_attempt_time:
+            return False
+        with self._lock:
+            if self.hedges >= self.calls * self.hedge_max_ratio:
+                return False
+            self.hedges += 1
+        self.observe('hedge')
+        return True
+
+    def _result(self, future, deadline):
+        done, _ = wait([future], timeout=self._remaining(deadline))
+        if not done:
+            raise exceptions.DeadlineExceeded('model call did not finish before the deadline')
+        return future.result()
+
+    def _record_latency(self, elapsed):
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    @staticmethod
+    def _remaining(deadline):
+        return max(0.0, deadline - time.monotonic())
@@ -0,0 +1,188 @@
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# 어미를 떼어낸 자리에 남기는 문장 종류 표시 (의문, 요청, 서술)
+QUESTION_MARK = '?'
+REQUEST_MARK = '!'
+STATEMENT_MARK = '.'
+# 해요체 어미는 의문과 서술에 함께 쓰이므로 물음표나 의문사가 있을 때만 의문으로 본다
+_POLITE = None
+
+# 문장 끝 어절의 높임/의문 어미와 그 종류 (길이가 긴 것부터 확인)
+# "윤회를 믿나요"(의문)와 "윤회를 믿어요"(서술)가 같은 키가 되지 않도록 떼어낸 자리에 종류를 남긴다.
+# "필요"의 '요'처럼 어간의 일부일 수 있는 한 글자 '요'는 넣지 않는다.
+SENTENCE_ENDINGS = sorted([
+    ('설명해주세요', REQUEST_MARK), ('알려주세요', REQUEST_MARK), ('해주세요', REQUEST_MARK),
+    ('주세요', REQUEST_MARK), ('해주실래요', REQUEST_MARK),
+    ('할까요', QUESTION_MARK), ('하나요', QUESTION_MARK), ('합니까', QUESTION_MARK), ('입니까', QUESTION_MARK),
+    ('습니까', QUESTION_MARK), ('인가요', QUESTION_MARK), ('인지요', QUESTION_MARK), ('나요', QUESTION_MARK),
+    ('까요', QUESTION_MARK), ('죠', QUESTION_MARK),
+    ('합니다', STATEMENT_MARK), ('입니다', STATEMENT_MARK), ('습니다', STATEMENT_MARK),
+    ('이에요', _POLITE), ('이예요', _POLITE), ('인데요', _POLITE), ('하세요', _POLITE), ('예요', _POLITE),
+    ('에요', _POLITE), ('해요', _POLITE), ('세요', _POLITE), ('어요', _POLITE), ('아요', _POLITE),
+], key=lambda item: len(item[0]), reverse=True)
+
+_QUESTION_WORDS = ('뭐', '무엇', '무슨', '왜', '어떻게', '어떤', '언제', '어디', '누구', '얼마', '몇')
+
+_SPACES = re.compile(r'\s+')
+
+_ENTRY_OVERHEAD = 200
+
+
+def normalize_question(text):
+    # 같은 질문이 같은 키가 되도록 정규화
+    # 1) 한글 자모 조합을 NFC로 통일 2) 대소문자 통일 3) 문장부호·기호 제거
+    # 4) 마지막 어절 끝의 높임/의문 어미를 문장 종류 표시로 바꾸고 5) 띄어쓰기 차이를 없앤다
+    text = unicodedata.normalize('NFC', text).lower()
+    asked = '?' in text or '？' in text
+    text = ''.join(
+        ' ' if unicodedata.category(ch)[0] in 'PSZ' else ch
+        for ch in text
+    )
+    words = text.split()
+    if not words:
+        return ''
+    # 본용언과 보조 용언은 띄어 써도 되므로("설명해 주세요") 붙여서 어미를 찾는다
+    if len(words) > 1 and words[-1].startswith('주'):
+        words[-2:] = [words[-2] + words[-1]]
+    last = words[-1]
+    for ending, mark in SENTENCE_ENDINGS:
+        # 어절 하나만 남은 질문이 통째로 지워지지 않도록 한다
+        if last.endswith(ending) and (len(last) > len(ending) or len(words) > 1):
+            if mark is _POLITE:
+                asked = asked or any(word in text for word in _QUESTION_WORDS)
+                mark = QUESTION_MARK if asked else STATEMENT_MARK
+            words[-1] = last[:-len(ending)]
+            return ''.join(words) + mark
+    return ''.join(words)
+
+
+class _Entry:
+    __slots__ = ('question', 'answer', 'created', 'hits', 'size')
+
+    def __init__(self, question, answer, size):
+        self.question = question
+        self.answer = answer
+        self.created = time.monotonic()
+        self.hits = 0
+        self.size = size
+
+
+def cache_key(question, namespace=''):
+    # namespace(생성 프로필)가 다르면 같은 질문도 다른 항목이다 (카카오용 짧은 답변과 웹 답변을 섞지 않는다)
+    key = normalize_question(question)
+    if namespace and key:
+        return f"{namespace}|{key}"
+    return key
+
+
+class ResponseCache:
+    # 정규화한 질문을 키로 답변을 보관하는 캐시 (TTL + 바이트 상한 LRU)
+
+    def __init__(self, ttl=86400, max_bytes=16 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._evicted = 0
+        self._namespaces = {''}
+
+    def get(self, question, namespace=''):
+        key = cache_key(question, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry.hits += 1
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.answer
+
+    def __contains__(self, question):
+        # 적중/실패 횟수에 반영하지 않고 유효한 항목이 있는지만 확인
+        return self.contains(question)
+
+    def contains(self, question, namespace=''):
+        key = cache_key(question, namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry.created <= self.ttl
+
+    def put(self, question, answer, namespace=''):
+        key = cache_key(question, namespace)
+        if not key:
+            return
+        size = sys.getsizeof(key) + sys.getsizeof(question) + sys.getsizeof(answer) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._namespaces.add(namespace)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(question, answer, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._evicted += 1
+
+    def purge(self, question=None):
+        # question을 주면 (모든 namespace의) 해당 항목만, 없으면 전체 삭제. 삭제한 항목 수를 돌려준다
+        with self._lock:
+            if question is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return count
+            count = 0
+            for namespace in self._namespaces:
+                key = cache_key(question, namespace)
+                if key in self._entries:
+                    self._drop(key)
+                    count += 1
+            return count
+
+    def entries(self, limit=100):
+        # 최근에 사용된 항목부터
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._entries.items())[::-1][:limit]
+            return [
+                {
+                    'key': key,
+                    'question': entry.question,
+                    'answer': entry.answer,
+                    'hits': entry.hits,
+                    'age': round(now - entry.created, 1),
+                    'bytes': entry.size,
+                }
+                for key, entry in items
+            ]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evicted': self._evicted,
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
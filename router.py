@@ -0,0 +1,189 @@
+import random
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+
+# 경로: template(모델을 부르지 않고 정해진 인사말로 답함), lite(가벼운 모델), full(기본 모델)
+TEMPLATE = 'template'
+LITE = 'lite'
+FULL = 'full'
+ROUTES = (TEMPLATE, LITE, FULL)
+
+# reason: 그 경로를 고른 이유 (평가와 지표에서 규칙별로 나눠 보기 위해 남긴다)
+# answer: template 경로일 때 보낼 답변
+Decision = namedtuple('Decision', ['route', 'reason', 'answer'])
+
+# 짧은 인사·감사·맞장구 어휘 (정규화한 뒤 메시지 전체가 이 낱말들로만 이루어져 있으면 잡담으로 본다)
+SMALL_TALK = {
+    'greeting': ('안녕하세요', '안녕하십니까', '안녕', '반갑습니다', '반가워요', '반가워', '처음뵙겠습니다',
+                 '좋은아침', '하이', 'hi', 'hello', '헬로'),
+    'thanks': ('정말감사합니다', '감사합니다', '감사해요', '감사드립니다', '감사', '고맙습니다', '고마워요',
+               '고마워', '덕분에', '땡큐', 'thanks', 'thankyou', '잘들었습니다', '잘알겠습니다'),
+    'farewell': ('안녕히계세요', '안녕히주무세요', '잘자요', '잘있어요', '다음에또올게요', '다음에봐요', '또올게요',
+                 '수고하세요', '바이', 'bye'),
+    'ack': ('알겠습니다', '알겠어요', '알겠어', '그렇군요', '그렇구나', '그렇네요', '네네', '넵', '네', '예', '응',
+            '좋아요', '좋네요', '오케이', 'ok', 'ㅇㅋ', '그럴게요', '해볼게요', '노력해볼게요'),
+}
+# 낱말 사이에 섞여도 잡담으로 보는 감탄·웃음·합장 표현
+FILLERS = ('ㅎ', 'ㅋ', 'ㅠ', 'ㅜ', '^', '~', '🙏', '😊', '🙂', '합장', '나무아미타불', '성불하세요', '정말', '너무', '많이',
+           '오늘도', '선다미님', '선다미')
+
+# 실제 질문으로 보는 표시 (하나라도 있으면 기본 모델로 보낸다)
+QUESTION_MARKERS = ('?', '뭐', '무엇', '무슨', '어떻게', '어떡', '왜', '언제', '어디', '누구', '어떤', '얼마',
+                    '까요', '나요', '인가', '습니까', '은요', '는요', '할지', '될지', '알려', '설명', '궁금')
+# 위기 표현 (다른 어떤 규칙보다 먼저 보고, 있으면 기본 모델로 보낸다)
+CRISIS_TERMS = ('자살', '자해', '죽고싶', '죽을래', '죽어버', '살기싫', '살고싶지', '사라지고싶', '끝내고싶',
+                '목숨', '유서', '뛰어내')
+# 교리·경전 주제어 (경전 구절은 이 말이 들어 있는 메시지에만 찾아 프롬프트에 넣는다)
+DOCTRINE_TERMS = ('부처', '불교', '불법', '경전', '경에', '수행', '명상', '참선', '기도', '염불', '절에', '스님',
+                  '사성제', '팔정도', '연기', '업보', '업장', '윤회', '열반', '해탈', '무상', '무아', '공사상', '자비',
+                  '보시', '번뇌', '집착', '깨달', '반야', '보살', '공덕', '계율', '오계', '삼보', '불성', '중도', '인연',
+                  '화두', '법문', '가르침')
+# 상담·교리 주제어 (짧은 메시지라도 이 말이 들어 있으면 기본 모델로 보낸다)
+TOPIC_TERMS = DOCTRINE_TERMS + ('괴로', '고통', '힘들', '힘드', '슬프', '슬퍼', '우울', '불안', '외로', '외롭',
+               '화가', '화나', '미워', '미운', '용서', '죽', '돌아가', '아프', '아파', '아픈', '병원', '수술', '걱정', '고민',
+               '스트레스', '상처', '후회', '두려', '무서', '헤어', '이별', '이혼', '떨어', '싸우', '싸웠', '잃', '지쳤',
+               '지치', '지쳐', '허무', '공허', '막막', '답답', '억울', '눈물', '울고', '울었', '싫어', '싫다', '미치겠',
+               '못살', '못하겠', '포기', '실패', '잠이안', '잠을못')
+# 가벼운 모델로 보내는 일상 잡담 어휘 (이 밖의 짧은 메시지는 뜻을 알 수 없으므로 기본 모델로 보낸다)
+CHITCHAT_TERMS = ('날씨', '좋은아침', '점심', '저녁', '아침먹', '밥먹', '먹었', '맛있', '기분이좋', '기분좋', '좋아요',
+                  '좋네요', '좋다', '주말', '퇴근', '출근', '잘잤', '잘지내', '재밌', '재미있', '웃기')
+# 부정 표현 ("기분이 안 좋아요"처럼 잡담 어휘가 들어 있어도 뜻이 뒤집히므로 잡담으로 보지 않는다)
+_NEGATION = re.compile(r'안(?!녕)|않|못|싫|별로')
+# 웃음·감탄·이모지만 있는 메시지
+_LAUGHTER = re.compile(r'^[ㅎㅋㅠㅜ^~🙏😊🙂]+$')
+
+TEMPLATES = {
+    'greeting': (
+        "안녕하세요, 선다미입니다. 마음에 담아 두신 이야기나 부처님 가르침에 대해 궁금한 점이 있으면 편하게 말씀해 주세요.",
+        "반갑습니다. 오늘 마음은 어떠신가요? 나누고 싶은 고민이나 궁금한 가르침이 있으면 언제든 이야기해 주세요.",
+    ),
+    'thanks': (
+        "도움이 되었다니 저도 기쁩니다. 또 마음이 복잡할 때면 언제든 찾아와 주세요.",
+        "고마운 마음 잘 받았습니다. 오늘 하루도 평안하시길 바랍니다.",
+    ),
+    'farewell': (
+        "함께 이야기 나눠 주셔서 고맙습니다. 평안한 시간 보내세요.",
+        "언제든 다시 찾아와 주세요. 늘 마음이 평화롭기를 바랍니다.",
+    ),
+    'ack': (
+        "네, 천천히 생각해 보시고 더 나누고 싶은 이야기가 있으면 언제든 말씀해 주세요.",
+    ),
+}
+
+_STRIP = re.compile(r'[\s.,!·…]+')
+
+
+def normalize(text):
+    # NFC로 통일하고 소문자로 바꾼 뒤 띄어쓰기와 마침표·느낌표를 지운다 (물음표는 질문 표시로 남긴다)
+    return _STRIP.sub('', unicodedata.normalize('NFC', text).lower())
+
+
+_WORDS = sorted(((word, kind) for kind, words in SMALL_TALK.items() for word in words),
+                key=lambda item: -len(item[0]))
+
+
+def _small_talk(text):
+    # 메시지 전체가 잡담 어휘와 감탄 표현으로만 이루어져 있으면 잡담 종류를, 아니면 None
+    # (앞에서부터 가장 긴 낱말을 맞춰 나가고, 맞장구와 다른 종류가 섞여 있으면 다른 종류를 고른다)
+    kinds = []
+    while text:
+        for filler in FILLERS:
+            if text.startswith(filler):
+                text = text[len(filler):]
+                break
+        else:
+            match = next(((word, kind) for word, kind in _WORDS if text.startswith(word)), None)
+            if match is None:
+                return None
+            kinds.append(match[1])
+            text = text[len(match[0]):]
+    return next((kind for kind in kinds if kind != 'ack'), kinds[0] if kinds else None)
+
+
+def about_doctrine(message):
+    # 교리·경전에 관한 메시지인지 (경전 구절을 찾아 프롬프트에 넣을지 고를 때 쓴다)
+    text = normalize(message)
+    return any(term in text for term in DOCTRINE_TERMS)
+
+
+class Router:
+    # 메시지마다 기본 모델을 부를지, 가벼운 모델이나 정해진 인사말로 답할지 고르는 규칙 기반 분류기.
+    # 위기 표현, 질문 표시, 상담·교리 주제어가 있으면 항상 기본 모델로 보내고(잘못 내려보내는 쪽이 더 비싸다),
+    # 인사·감사·작별만 있는 짧은 메시지는 인사말로, 알려진 일상 잡담(CHITCHAT_TERMS, 웃음·감탄만 있는 메시지)인
+    # 짧은 메시지만 가벼운 모델로 보낸다. 어느 규칙에도 맞지 않는 메시지는 짧아도 기본 모델로 보낸다.
+    # 대화 중의 맞장구("네", "해볼게요")는 앞 대화에 이어 답해야 하므로 인사말 대신 가벼운 모델로 보낸다.
+    #
+    # 기본 모델로 답한 시간의 이동 평균을 채널별로 기억해 두고, 다른 경로로 답할 때 줄인 시간을 추정한다.
+    # observe: (채널, Decision, 걸린 시간(초), 줄인 시간(초)) 을 받을 함수 (지표·로그 기록용)
+
+    def __init__(self, enabled=True, lite=True, template_max_chars=20, lite_max_chars=10, alpha=0.1, observe=None):
+        self.enabled = enabled
+        self.lite = lite
+        self.template_max_chars = template_max_chars
+        self.lite_max_chars = lite_max_chars
+        self.alpha = alpha
+        self.observe = observe or (lambda channel, decision, seconds, saved: None)
+        self._full_seconds = {}
+        self._lock = threading.Lock()
+        self.counts = {route: 0 for route in ROUTES}
+        self.saved_seconds = 0.0
+
+    def classify(self, message, has_context=False):
+        # 설정과 관계없는 순수 분류 결과 (오프라인 평가에서도 이 함수를 쓴다)
+        text = normalize(message)
+        if not text:
+            return Decision(FULL, 'empty', None)
+        if any(term in text for term in CRISIS_TERMS):
+            return Decision(FULL, 'crisis', None)
+        if any(marker in text for marker in QUESTION_MARKERS):
+            return Decision(FULL, 'question', None)
+        if any(term in text for term in TOPIC_TERMS):
+            return Decision(FULL, 'topic', None)
+        kind = _small_talk(text)
+        if kind and len(text) <= self.template_max_chars:
+            if kind == 'ack' and has_context:
+                return Decision(LITE, 'ack', None)
+            return Decision(TEMPLATE, kind, random.choice(TEMPLATES[kind]))
+        if len(text) > self.lite_max_chars:
+            return Decision(FULL, 'long', None)
+        if _NEGATION.search(text):
+            return Decision(FULL, 'negation', None)
+        if _LAUGHTER.match(text):
+            return Decision(LITE, 'filler', None)
+        if any(term in text for term in CHITCHAT_TERMS):
+            return Decision(LITE, 'chitchat', None)
+        return Decision(FULL, 'unknown', None)
+
+    def route(self, message, has_context=False):
+        if not self.enabled:
+            return Decision(FULL, 'disabled', None)
+        decision = self.classify(message, has_context)
+        if decision.route == LITE and not self.lite:
+            return Decision(FULL, decision.reason, None)
+        return decision
+
+    def record(self, channel, decision, seconds):
+        # 답변 하나를 끝낸 뒤 호출한다. 기본 모델 경로면 평균 시간을 갱신하고, 아니면 줄인 시간을 돌려준다.
+        saved = None
+        with self._lock:
+            self.counts[decision.route] += 1
+            average = self._full_seconds.get(channel)
+            if decision.route == FULL:
+                self._full_seconds[channel] = seconds if average is None else average + self.alpha * (seconds - average)
+            elif average is not None:
+                saved = max(0.0, average - seconds)
+                self.saved_seconds += saved
+        self.observe(channel, decision, seconds, saved)
+        return saved
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'lite': self.lite,
+                'routes': dict(self.counts),
+                'full_seconds_avg': {channel: round(seconds, 3) for channel, seconds in self._full_seconds.items()},
+                'saved_seconds': round(self.saved_seconds, 1),
+            }
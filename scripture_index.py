@@ -0,0 +1,307 @@
+import bisect
+import hashlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from collections import Counter, deque
+
+# 경전 구절 BM25 검색 색인
+#
+# tools/build_scripture_index.py가 텍스트 폴더로 색인 파일 하나를 만들고,
+# 앱은 그 파일을 mmap으로 열어 읽기 전용으로 검색한다.
+# 여러 gunicorn 워커가 같은 파일을 열면 운영체제 페이지 캐시를 함께 쓰므로 메모리를 거의 더 쓰지 않는다.
+#
+# 파일 구조 (리틀 엔디언, 각 구역은 8바이트 정렬)
+#   'SDIX' | 버전 u32 | 메타 JSON 길이 u32 | 메타 JSON
+#   term_hashes   u64 x T   (정렬된 용어 해시)
+#   term_starts   u32 x T+1 (용어별 postings 시작 위치)
+#   post_docs     u32 x P
+#   post_tfs      u16 x P
+#   doc_lengths   u32 x N
+#   doc_starts    u64 x N+1 (texts 안의 구절 위치)
+#   doc_sources   u16 x N
+#   texts         UTF-8
+
+log = logging.getLogger('seondami.scripture_index')
+
+MAGIC = b'SDIX'
+VERSION = 1
+_HEADER = struct.Struct('<4sII')
+
+_HANGUL_RUN = re.compile(r'[가-힣]+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text, ngram=2):
+    # 한글은 글자 n-gram(어절 안에서만), 영문·숫자는 단어 단위
+    # 한 글자짜리 어절은 그 글자 자체를 용어로 쓴다
+    text = text.lower()
+    tokens = []
+    for run in _HANGUL_RUN.findall(text):
+        if len(run) < ngram:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + ngram] for i in range(len(run) - ngram + 1))
+    tokens.extend(_WORD.findall(text))
+    return tokens
+
+
+def term_hash(term):
+    return struct.unpack('<Q', hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest())[0]
+
+
+def split_passages(text, min_chars=200, max_chars=600):
+    # 빈 줄로 나눈 문단을 min_chars 이상이 되도록 이어 붙이고, max_chars를 넘는 문단은 문장 단위로 자른다
+    passages = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = ' '.join(paragraph.split())
+        if not paragraph:
+            continue
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces = _split_long(paragraph, max_chars)
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                passages.append(current)
+                current = ''
+            current = f'{current} {piece}' if current else piece
+            if len(current) >= min_chars:
+                passages.append(current)
+                current = ''
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _split_long(paragraph, max_chars):
+    pieces = []
+    current = ''
+    for sentence in re.split(r'(?<=[.!?。])\s+', paragraph):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ''
+        current = f'{current} {sentence}' if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _pad(buf):
+    buf.extend(b'\0' * (-len(buf) % 8))
+
+
+def build_index(documents, path, ngram=2, k1=1.2, b=0.75):
+    # documents: (출처, 본문) 목록. 출처별로 구절을 나눠 색인 파일 하나로 저장한다.
+    sources = []
+    passages = []
+    for source, text in documents:
+        source_id = len(sources)
+        sources.append(source)
+        passages.extend((source_id, passage) for passage in split_passages(text))
+    if len(sources) > 0xFFFF:
+        raise ValueError('too many source documents')
+
+    postings = {}
+    lengths = array('I')
+    for doc_id, (_, passage) in enumerate(passages):
+        counts = Counter(tokenize(passage, ngram))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term_hash(term), []).append((doc_id, min(tf, 0xFFFF)))
+
+    hashes = array('Q', sorted(postings))
+    starts = array('I', [0])
+    post_docs = array('I')
+    post_tfs = array('H')
+    for h in hashes:
+        for doc_id, tf in postings[h]:
+            post_docs.append(doc_id)
+            post_tfs.append(tf)
+        starts.append(len(post_docs))
+
+    texts = bytearray()
+    doc_starts = array('Q', [0])
+    doc_sources = array('H')
+    for source_id, passage in passages:
+        texts.extend(passage.encode('utf-8'))
+        doc_starts.append(len(texts))
+        doc_sources.append(source_id)
+
+    sections = [
+        ('term_hashes', hashes), ('term_starts', starts), ('post_docs', post_docs),
+        ('post_tfs', post_tfs), ('doc_lengths', lengths), ('doc_starts', doc_starts),
+        ('doc_sources', doc_sources), ('texts', texts),
+    ]
+    meta = {
+        'ngram': ngram, 'k1': k1, 'b': b,
+        'documents': len(passages), 'terms': len(hashes),
+        'avg_length': (sum(lengths) / len(lengths)) if lengths else 0.0,
+        'sources': sources,
+    }
+    # 메타 JSON에 각 구역의 위치가 들어가므로 위치가 더 바뀌지 않을 때까지 다시 계산한다
+    offsets = {}
+    for _ in range(5):
+        meta['sections'] = offsets
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        position = _HEADER.size + len(meta_bytes)
+        position += -position % 8
+        new_offsets = {}
+        for name, data in sections:
+            size = len(data) * data.itemsize if isinstance(data, array) else len(data)
+            new_offsets[name] = [position, size]
+            position += size + (-size % 8)
+        if new_offsets == offsets:
+            break
+        offsets = new_offsets
+    meta['sections'] = offsets
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, len(meta_bytes)))
+    out.extend(meta_bytes)
+    _pad(out)
+    for name, data in sections:
+        assert len(out) == offsets[name][0]
+        out.extend(data.tobytes() if isinstance(data, array) else data)
+        _pad(out)
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(out)
+    os.replace(tmp_path, path)
+    return meta
+
+
+class ScriptureIndex:
+    # 색인 파일을 처음 검색할 때 mmap으로 연다 (워커 시작 비용 없음)
+
+    def __init__(self, path, max_terms=48, max_df_ratio=0.5, budget_ms=5.0):
+        self.path = path
+        self.max_terms = max_terms
+        self.budget_ms = budget_ms
+        self.max_df_ratio = max_df_ratio
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1024)
+        self.searches = 0
+        self.over_budget = 0
+        self.load_error = None
+
+    def load(self):
+        # 색인을 미리 연다 (워커 준비 단계). 열 수 있으면 True
+        return self._ensure_loaded()
+
+    def search(self, query, k=3):
+        # (점수, 출처, 구절) 목록을 점수 높은 순으로 돌려준다
+        if not self._ensure_loaded():
+            return []
+        started = time.perf_counter()
+        terms = set(tokenize(query, self.meta['ngram']))
+        n = self.meta['documents']
+        k1, b, avg_length = self.meta['k1'], self.meta['b'], self.meta['avg_length'] or 1.0
+
+        # 희귀한 용어부터 max_terms개만 쓰고, 절반 넘는 구절에 나오는 흔한 용어는 건너뛴다
+        # 시간 예산(budget_ms)을 넘기면 남은 (더 흔한) 용어는 점수에 넣지 않는다
+        budget_end = started + self.budget_ms / 1000
+        ranges = []
+        for term in terms:
+            span = self._postings(term_hash(term))
+            if span and span[1] - span[0] <= n * self.max_df_ratio:
+                ranges.append(span)
+        ranges.sort(key=lambda span: span[1] - span[0])
+
+        scores = {}
+        for start, end in ranges[:self.max_terms]:
+            if time.perf_counter() > budget_end:
+                self.over_budget += 1
+                break
+            df = end - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            docs = self._post_docs[start:end]
+            tfs = self._post_tfs[start:end]
+            for doc_id, tf in zip(docs, tfs):
+                norm = k1 * (1 - b + b * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        results = [(round(score, 3), self.meta['sources'][self._doc_sources[doc_id]], self._text(doc_id))
+                   for doc_id, score in top]
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.searches += 1
+            self._latencies.append(elapsed)
+        return results
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        stats = {
+            'path': self.path,
+            'loaded': self._loaded and self.load_error is None,
+            'load_error': self.load_error,
+            'searches': self.searches,
+            'over_budget': self.over_budget,
+            'latency_ms_p50': round(latencies[len(latencies) // 2] * 1000, 3) if latencies else 0.0,
+            'latency_ms_p99': round(latencies[int(len(latencies) * 0.99)] * 1000, 3) if latencies else 0.0,
+        }
+        if self._loaded and self.load_error is None:
+            stats['documents'] = self.meta['documents']
+            stats['sources'] = len(self.meta['sources'])
+        return stats
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return self.load_error is None
+        with self._lock:
+            if not self._loaded:
+                try:
+                    self._load()
+                except (OSError, ValueError) as e:
+                    log.warning("Scripture index unavailable", exc_info=e, extra={'path': self.path})
+                    self.load_error = str(e)
+                self._loaded = True
+        return self.load_error is None
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'not a scripture index (version {VERSION}): {self.path}')
+        self.meta = json.loads(self._mmap[_HEADER.size:_HEADER.size + meta_length].decode('utf-8'))
+        view = memoryview(self._mmap)
+
+        def section(name, fmt):
+            offset, size = self.meta['sections'][name]
+            part = view[offset:offset + size]
+            return part.cast(fmt) if fmt else part
+
+        self._term_hashes = section('term_hashes', 'Q')
+        self._term_starts = section('term_starts', 'I')
+        self._post_docs = section('post_docs', 'I')
+        self._post_tfs = section('post_tfs', 'H')
+        self._doc_lengths = section('doc_lengths', 'I')
+        self._doc_starts = section('doc_starts', 'Q')
+        self._doc_sources = section('doc_sources', 'H')
+        self._texts = section('texts', None)
+
+    def _postings(self, h):
+        i = bisect.bisect_left(self._term_hashes, h)
+        if i == len(self._term_hashes) or self._term_hashes[i] != h:
+            return None
+        return self._term_starts[i], self._term_starts[i + 1]
+
+    def _text(self, doc_id):
+        start, end = self._doc_starts[doc_id], self._doc_starts[doc_id + 1]
+        return bytes(self._texts[start:end]).decode('utf-8')
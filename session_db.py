@@ -0,0 +1,315 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from session_store import EMPTY_CONTEXT, SessionContext
+
+log = logging.getLogger('seondami.session_db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    summary_upto INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id);
+"""
+
+
+class _Hot:
+    # updated: 마지막으로 기록한 시각 (DB에서 읽은 값이거나 이 프로세스에서 append한 시각)
+    __slots__ = ('turns', 'total', 'summary', 'summary_upto', 'updated')
+
+    def __init__(self, max_turns, turns=(), total=0, summary=None, summary_upto=0, updated=None):
+        self.turns = deque(turns, maxlen=max_turns)
+        self.total = total
+        self.summary = summary
+        self.summary_upto = summary_upto
+        self.updated = time.time() if updated is None else updated
+
+
+class SqliteSessionStore:
+    # SessionStore와 같은 인터페이스의 SQLite(WAL) 저장소.
+    # 여러 gunicorn 워커가 같은 파일을 함께 쓰므로 어느 워커로 요청이 가도 대화가 이어지고, 재시작해도 남는다.
+    # - 쓰기는 큐에 넣고 백그라운드 스레드가 flush_interval마다 한 트랜잭션으로 모아서 기록한다 (write-behind)
+    # - 최근 세션은 프로세스 안의 핫 캐시에 두고, 읽을 때마다 sessions 행 하나만 확인해서
+    #   다른 워커가 그 사이에 기록했으면 그때만 턴을 다시 읽는다
+    # - TTL이 지난 세션은 vacuum_interval마다 지운다
+
+    def __init__(self, path, max_turns=20, ttl=1800, hot_sessions=2048,
+                 flush_interval=0.05, vacuum_interval=60):
+        self.path = path
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.hot_sessions = hot_sessions
+        self.flush_interval = flush_interval
+        self.vacuum_interval = vacuum_interval
+        self._hot = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer_pid = None
+        self.hot_hits = 0
+        self.reloads = 0
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.flush_errors = 0
+        self.vacuumed = 0
+        self._last_flush_ms = 0.0
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+        atexit.register(self.flush)
+
+    def history(self, session_id):
+        return self.context(session_id).turns
+
+    def context(self, session_id):
+        row = self._conn().execute(
+            'SELECT total, summary, summary_upto, updated FROM sessions WHERE id = ?',
+            (session_id,)).fetchone()
+        now = time.time()
+        with self._lock:
+            hot = self._hot.get(session_id)
+            if hot is not None and (session_id in self._pending or
+                                    (row is not None and row[0] == hot.total and row[2] == hot.summary_upto)):
+                # 핫 캐시가 DB와 같거나, 아직 기록하지 않은 쓰기가 있어 캐시가 더 최신인 경우
+                # 핫 캐시로 답할 때도 마지막 기록에서 TTL이 지났으면 만료로 본다
+                updated = hot.updated if row is None else max(hot.updated, row[3])
+                if now - updated <= self.ttl:
+                    self._hot.move_to_end(session_id)
+                    self.hot_hits += 1
+                    return self._snapshot(hot)
+        if row is None or now - row[3] > self.ttl:
+            with self._lock:
+                self._hot.pop(session_id, None)
+                if row is not None:
+                    # vacuum 전에 다음 append가 만료된 행에 이어 붙어 옛 대화가 되살아나지 않도록 지운다
+                    self._enqueue(session_id, ('expire', session_id))
+            return EMPTY_CONTEXT
+
+        total, summary, summary_upto, updated = row
+        turns = self._conn().execute(
+            'SELECT role, text FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?',
+            (session_id, self.max_turns)).fetchall()
+        turns.reverse()
+        hot = _Hot(self.max_turns, [tuple(turn) for turn in turns], total, summary, summary_upto, updated)
+        with self._lock:
+            self.reloads += 1
+            self._remember(session_id, hot)
+            return self._snapshot(hot)
+
+    def set_summary(self, session_id, summary, upto):
+        with self._lock:
+            hot = self._hot.get(session_id)
+            if hot is not None:
+                if upto <= hot.summary_upto:
+                    return False
+                hot.summary = summary
+                hot.summary_upto = upto
+            self._enqueue(session_id, ('summary', session_id, summary, upto))
+        return True
+
+    def append(self, session_id, role, text):
+        with self._lock:
+            hot = self._hot.get(session_id)
+            if hot is None:
+                # 캐시에 없으면 새 세션으로 보고, DB에 이전 기록이 있으면 다음 읽기에서 다시 맞춘다
+                hot = _Hot(self.max_turns)
+                self._remember(session_id, hot)
+            hot.turns.append((role, text))
+            hot.total += 1
+            hot.updated = time.time()
+            self._enqueue(session_id, ('append', session_id, role, text))
+
+    def clear(self, session_id):
+        with self._lock:
+            self._hot.pop(session_id, None)
+            self._enqueue(session_id, ('clear', session_id))
+
+    def flush(self, timeout=5):
+        # 큐에 남은 쓰기가 모두 기록될 때까지 기다린다 (종료 시, 벤치마크용)
+        # 순서가 바뀌지 않도록 직접 쓰지 않고 기록 스레드가 끝내기를 기다린다
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def stats(self):
+        row = self._conn().execute(
+            'SELECT COUNT(*), COALESCE(SUM(total), 0) FROM sessions WHERE updated >= ?',
+            (time.time() - self.ttl,)).fetchone()
+        with self._lock:
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'sessions': row[0],
+                'turns_total': row[1],
+                'max_turns': self.max_turns,
+                'ttl': self.ttl,
+                'hot_sessions': len(self._hot),
+                'hot_hits': self.hot_hits,
+                'reloads': self.reloads,
+                'pending_writes': self._queue.qsize(),
+                'flushes': self.flushes,
+                'flushed_ops': self.flushed_ops,
+                'flush_errors': self.flush_errors,
+                'last_flush_ms': self._last_flush_ms,
+                'vacuumed': self.vacuumed,
+            }
+
+    def __len__(self):
+        return self.stats()['sessions']
+
+    def _snapshot(self, hot):
+        turns = list(hot.turns)
+        return SessionContext(turns, hot.total - len(turns), hot.summary, hot.summary_upto)
+
+    def _remember(self, session_id, hot):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        self._hot[session_id] = hot
+        self._hot.move_to_end(session_id)
+        while len(self._hot) > self.hot_sessions:
+            oldest = next(iter(self._hot))
+            if oldest in self._pending:
+                break
+            del self._hot[oldest]
+
+    def _enqueue(self, session_id, op):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        self._ensure_writer()
+        self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._queue.put(op)
+
+    def _ensure_writer(self):
+        # gunicorn이 fork한 뒤에는 부모의 스레드가 없으므로 프로세스마다 새로 띄운다
+        if self._writer_pid == os.getpid():
+            return
+        self._writer_pid = os.getpid()
+        self._queue = queue.Queue()
+        self._pending = {}
+        threading.Thread(target=self._writer, name='session-writer', daemon=True).start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL에서는 NORMAL이어도 손상되지 않는다 (전원이 꺼지면 마지막 몇 건만 잃을 수 있음)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _conn(self):
+        # 스레드마다 연결 하나 (fork 이후에는 새로 연결)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _drain(self):
+        ops = []
+        while True:
+            try:
+                ops.append(self._queue.get_nowait())
+            except queue.Empty:
+                return ops
+
+    def _writer(self):
+        conn = self._connect()
+        next_vacuum = time.monotonic() + self.vacuum_interval
+        while True:
+            ops = [self._queue.get()]
+            # 잠깐 기다렸다가 그동안 쌓인 쓰기를 함께 기록한다
+            time.sleep(self.flush_interval)
+            ops.extend(self._drain())
+            self._write(conn, ops)
+            for _ in ops:
+                self._queue.task_done()
+            if time.monotonic() >= next_vacuum:
+                self._vacuum(conn)
+                next_vacuum = time.monotonic() + self.vacuum_interval
+
+    def _write(self, conn, ops):
+        started = time.perf_counter()
+        now = time.time()
+        touched = set()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for op in ops:
+                kind, session_id = op[0], op[1]
+                if kind == 'append':
+                    conn.execute(
+                        'INSERT INTO sessions (id, total, updated) VALUES (?, 1, ?) '
+                        'ON CONFLICT(id) DO UPDATE SET total = total + 1, updated = excluded.updated',
+                        (session_id, now))
+                    conn.execute('INSERT INTO turns (session_id, role, text) VALUES (?, ?, ?)',
+                                 (session_id, op[2], op[3]))
+                    touched.add(session_id)
+                elif kind == 'summary':
+                    conn.execute(
+                        'UPDATE sessions SET summary = ?, summary_upto = ? WHERE id = ? AND summary_upto < ?',
+                        (op[2], op[3], session_id, op[3]))
+                elif kind == 'clear':
+                    conn.execute('DELETE FROM turns WHERE session_id = ?', (session_id,))
+                    conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+                    touched.discard(session_id)
+                elif kind == 'expire':
+                    # 그 사이에 다른 워커가 기록했으면 만료되지 않았으므로 남긴다
+                    if conn.execute('DELETE FROM sessions WHERE id = ? AND updated < ?',
+                                    (session_id, now - self.ttl)).rowcount:
+                        conn.execute('DELETE FROM turns WHERE session_id = ?', (session_id,))
+            # 세션마다 최근 max_turns개만 남긴다
+            for session_id in touched:
+                conn.execute(
+                    'DELETE FROM turns WHERE session_id = ? AND id NOT IN '
+                    '(SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?)',
+                    (session_id, session_id, self.max_turns))
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            log.error("Error writing sessions", exc_info=e)
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            with self._lock:
+                self.flush_errors += 1
+        finally:
+            with self._lock:
+                for op in ops:
+                    count = self._pending.get(op[1], 0) - 1
+                    if count > 0:
+                        self._pending[op[1]] = count
+                    else:
+                        self._pending.pop(op[1], None)
+                self.flushes += 1
+                self.flushed_ops += len(ops)
+                self._last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def _vacuum(self, conn):
+        # TTL이 지난 세션과 그 턴을 지운다
+        expired_before = time.time() - self.ttl
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM turns WHERE session_id IN '
+                         '(SELECT id FROM sessions WHERE updated < ?)', (expired_before,))
+            removed = conn.execute('DELETE FROM sessions WHERE updated < ?', (expired_before,)).rowcount
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            log.error("Error vacuuming sessions", exc_info=e)
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            return
+        with self._lock:
+            self.vacuumed += removed
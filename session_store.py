@@ -0,0 +1,158 @@
+import sys
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+# 대화 한 턴의 역할 표기 (turn 레코드는 (role, text) 튜플로 보관)
+USER = 'user'
+MODEL = 'model'
+
+# 세션/턴 하나당 대략적인 컨테이너 오버헤드 (바이트)
+_SESSION_OVERHEAD = sys.getsizeof(deque(maxlen=1)) + 200
+_TURN_OVERHEAD = sys.getsizeof((USER, ''))
+
+
+# 세션의 대화 상태 스냅샷
+# first_seq: turns[0]의 일련번호 (세션에서 지금까지 추가된 턴을 0부터 센 번호)
+# summary_upto: summary가 요약하고 있는 턴의 다음 일련번호
+SessionContext = namedtuple('SessionContext', 'turns first_seq summary summary_upto')
+
+EMPTY_CONTEXT = SessionContext([], 0, None, 0)
+
+
+def _turn_size(text):
+    return sys.getsizeof(text) + _TURN_OVERHEAD
+
+
+class _Session:
+    __slots__ = ('turns', 'last_access', 'size', 'total', 'summary', 'summary_upto')
+
+    def __init__(self, max_turns, size):
+        self.turns = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+        self.size = size
+        self.total = 0
+        self.summary = None
+        self.summary_upto = 0
+
+
+class SessionStore:
+    # 세션별 고정 크기 링 버퍼로 대화 기록을 보관하는 메모리 저장소.
+    # 오래 쓰이지 않은 세션은 TTL로, 전체 메모리가 상한을 넘으면 LRU 순서로 정리한다.
+
+    def __init__(self, max_turns=5, ttl=1800, max_bytes=32 * 1024 * 1024):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._evicted = 0
+        self._expired = 0
+
+    def history(self, session_id):
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return []
+            return list(session.turns)
+
+    def context(self, session_id):
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return EMPTY_CONTEXT
+            return SessionContext(list(session.turns), session.total - len(session.turns),
+                                  session.summary, session.summary_upto)
+
+    def set_summary(self, session_id, summary, upto):
+        # 더 최근까지 요약한 결과가 이미 있으면 무시 (요약은 백그라운드에서 늦게 도착할 수 있다)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or upto <= session.summary_upto:
+                return False
+            delta = sys.getsizeof(summary) - (sys.getsizeof(session.summary) if session.summary else 0)
+            session.summary = summary
+            session.summary_upto = upto
+            session.size += delta
+            self._bytes += delta
+            return True
+
+    def append(self, session_id, role, text):
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                session = _Session(self.max_turns, _SESSION_OVERHEAD + sys.getsizeof(session_id))
+                self._sessions[session_id] = session
+                self._bytes += session.size
+
+            # 링 버퍼가 가득 차 있으면 가장 오래된 턴이 밀려나므로 크기에서 빼준다
+            if len(session.turns) == session.turns.maxlen:
+                dropped = _turn_size(session.turns[0][1])
+                session.size -= dropped
+                self._bytes -= dropped
+
+            session.turns.append((role, text))
+            session.total += 1
+            added = _turn_size(text)
+            session.size += added
+            self._bytes += added
+            self._evict(keep=session_id)
+
+    def clear(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._bytes -= session.size
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'sessions': len(self._sessions),
+                'turns': sum(len(s.turns) for s in self._sessions.values()),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'max_turns': self.max_turns,
+                'ttl': self.ttl,
+                'evicted': self._evicted,
+                'expired': self._expired,
+            }
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _touch(self, session_id):
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if now - session.last_access > self.ttl:
+                self._drop(session_id)
+                self._expired += 1
+                return None
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _expire(self, now):
+        # OrderedDict는 마지막 접근 순서이므로 앞쪽부터 만료된 세션만 확인하면 된다
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl:
+                break
+            self._drop(session_id)
+            self._expired += 1
+
+    def _evict(self, keep):
+        self._expire(time.monotonic())
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._drop(session_id)
+            self._evicted += 1
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
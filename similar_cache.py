@@ -0,0 +1,310 @@
+import heapq
+import random
+import re
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict, deque
+
+from response_cache import QUESTION_MARK, REQUEST_MARK, STATEMENT_MARK, normalize_question
+
+# 질문 끝의 "~이란 무엇", "~가 뭐" 같은 질문 틀 (정규화된 질문 기준, 길이가 긴 것부터 확인)
+# "업보가 뭐예요"와 "업보란 무엇인가요"가 모두 "업보"만 남도록 잘라낸다
+QUESTION_FRAMES = sorted([
+    '이란무엇', '란무엇', '이무엇', '가무엇', '은무엇', '는무엇', '무엇',
+    '이란뭐', '란뭐', '이뭐', '가뭐', '은뭐', '는뭐', '뭐', '뭔가', '뭔',
+    '무슨뜻', '무슨의미', '의의미', '의뜻', '뜻', '의미',
+    '에대해서', '에대해', '에관해서', '에관해', '이란', '란',
+], key=len, reverse=True)
+
+# 질문 틀을 잘라낸 뒤 끝에 남는 조사 ("무상이 무슨 뜻" -> "무상이" -> "무상")
+TRAILING_PARTICLES = ('이', '가', '은', '는', '을', '를', '의')
+
+# 부정·거절 표현 ("이혼하고 싶어요"와 "이혼하고 싶지 않아요"는 글자가 거의 같아도 뜻이 반대다)
+# 두 질문에 들어 있는 표현이 다르면 유사도와 관계없이 적중시키지 않는다. "안녕", "불안", "말씀"의 글자는 빼고 본다.
+NEGATION = re.compile(r'않|못|싫|말(?!씀)|(?<![불편평])안(?!녕)')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_ENTRY_OVERHEAD = 400
+
+
+def similarity_text(question):
+    # 의문·요청 표시는 떼어 같은 질문의 여러 표현을 모으고, 서술 표시는 끝에 남겨 둔다
+    # ("윤회를 믿어요"와 "윤회를 믿나요"는 서로 적중시키지 않는다, is_statement 참고)
+    text = normalize_question(question)
+    statement = text.endswith(STATEMENT_MARK)
+    text = text.rstrip(QUESTION_MARK + REQUEST_MARK + STATEMENT_MARK)
+    changed = True
+    while changed:
+        changed = False
+        for frame in QUESTION_FRAMES:
+            if text.endswith(frame) and len(text) > len(frame):
+                text = text[:-len(frame)]
+                changed = True
+                break
+    # 두 글자 이상 남는 경우에만 조사를 떼어 "불이" 같은 짧은 단어가 잘리지 않도록 한다
+    if len(text) > 2 and text.endswith(TRAILING_PARTICLES):
+        text = text[:-1]
+    return text + STATEMENT_MARK if statement else text
+
+
+def is_statement(text):
+    # similarity_text의 결과가 서술문인지
+    return text.endswith(STATEMENT_MARK)
+
+
+def negations(question):
+    return frozenset(NEGATION.findall(unicodedata.normalize('NFC', question)))
+
+
+def shingles(text, n):
+    # 한글 문자 n-gram. 글자 수가 n보다 짧으면 전체를 하나의 shingle로 사용
+    if len(text) <= n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    def __init__(self, num_perm, seed=1):
+        # 프로세스와 무관하게 같은 서명이 나오도록 고정된 시드의 (a*x + b) mod p 순열 사용
+        rng = random.Random(seed)
+        self.perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingle_set):
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in shingle_set]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+            for a, b in self.perms
+        )
+
+
+class _Entry:
+    __slots__ = ('question', 'text', 'answer', 'shingles', 'negations', 'band_keys', 'created', 'hits', 'size')
+
+    def __init__(self, question, text, answer, shingle_set, band_keys, size):
+        self.question = question
+        self.text = text
+        self.negations = negations(question)
+        self.answer = answer
+        self.shingles = shingle_set
+        self.band_keys = band_keys
+        self.created = time.monotonic()
+        self.hits = 0
+        self.size = size
+
+
+class SimilarCache:
+    # 비슷한 질문(표현만 다른 질문)에 같은 답변을 돌려주는 캐시
+    # MinHash 서명을 band로 나눈 LSH 버킷에서 후보를 찾고, 후보는 shingle 집합의 Jaccard 유사도로 확인한다
+    # namespace(생성 프로필)가 다른 항목은 버킷이 달라 서로 적중하지 않는다
+
+    def __init__(self, threshold=0.7, ngram=2, num_perm=32, bands=16, ttl=86400,
+                 max_entries=5000, compact_every=1000, max_candidates=32):
+        if num_perm % bands:
+            raise ValueError('num_perm must be divisible by bands')
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.compact_every = compact_every
+        self.max_candidates = max_candidates
+        self._hasher = MinHasher(num_perm)
+        self._entries = OrderedDict()
+        self._by_text = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._puts_since_compact = 0
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._evicted = 0
+        self._compactions = 0
+        self._namespaces = {''}
+        self._lookup_times = deque(maxlen=1024)
+
+    def lookup(self, question, namespace=''):
+        # (답변, 유사도, 캐시된 질문) 또는 None
+        started = time.perf_counter()
+        text = similarity_text(question)
+        shingle_set = shingles(text, self.ngram)
+        band_keys = self._band_keys(shingle_set, namespace) if shingle_set else ()
+        negation_set = negations(question)
+        now = time.monotonic()
+
+        with self._lock:
+            best = None
+            best_score = 0.0
+            # 같은 버킷에 많이 겹친 후보일수록 유사도가 높으므로, 상위 후보만 정확히 비교해 조회 시간을 묶어둔다
+            collisions = {}
+            for key in band_keys:
+                for entry_id in self._buckets.get(key, ()):
+                    collisions[entry_id] = collisions.get(entry_id, 0) + 1
+            if len(collisions) > self.max_candidates:
+                candidates = heapq.nlargest(self.max_candidates, collisions, key=collisions.get)
+            else:
+                candidates = collisions
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if (now - entry.created > self.ttl or entry.negations != negation_set
+                        or is_statement(entry.text) != is_statement(text)):
+                    continue
+                score = jaccard(shingle_set, entry.shingles)
+                if score > best_score:
+                    best, best_score = entry_id, score
+
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                result = None
+            else:
+                entry = self._entries[best]
+                entry.hits += 1
+                self.hits += 1
+                self._entries.move_to_end(best)
+                result = (entry.answer, best_score, entry.question)
+            self._lookup_times.append(time.perf_counter() - started)
+        return result
+
+    def get(self, question, namespace=''):
+        result = self.lookup(question, namespace)
+        return result[0] if result else None
+
+    def put(self, question, answer, namespace=''):
+        text = similarity_text(question)
+        shingle_set = shingles(text, self.ngram)
+        if not shingle_set:
+            return
+        band_keys = self._band_keys(shingle_set, namespace)
+        if namespace:
+            text = f"{namespace}|{text}"
+        size = (sys.getsizeof(question) + sys.getsizeof(text) + sys.getsizeof(answer)
+                + sum(sys.getsizeof(s) for s in shingle_set) + _ENTRY_OVERHEAD)
+
+        with self._lock:
+            self._namespaces.add(namespace)
+            old_id = self._by_text.get(text)
+            if old_id is not None:
+                self._drop(old_id)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(question, text, answer, shingle_set, band_keys, size)
+            self._by_text[text] = entry_id
+            self._bytes += size
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._evicted += 1
+
+            self._puts_since_compact += 1
+            if self._puts_since_compact >= self.compact_every:
+                self._compact()
+
+    def purge(self, question=None):
+        # question을 주면 (모든 namespace에서) 그 질문으로 적중될 수 있는 항목만, 없으면 전체 삭제.
+        # 삭제한 항목 수를 돌려준다
+        with self._lock:
+            if question is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._by_text.clear()
+                self._buckets = {}
+                self._bytes = 0
+                return count
+            text = similarity_text(question)
+            shingle_set = shingles(text, self.ngram)
+            if not shingle_set:
+                return 0
+            negation_set = negations(question)
+            matched = {
+                entry_id
+                for namespace in self._namespaces
+                for key in self._band_keys(shingle_set, namespace)
+                for entry_id in self._buckets.get(key, ())
+                if self._entries[entry_id].negations == negation_set
+                and is_statement(self._entries[entry_id].text) == is_statement(text)
+                and jaccard(shingle_set, self._entries[entry_id].shingles) >= self.threshold
+            }
+            for entry_id in matched:
+                self._drop(entry_id)
+            return len(matched)
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def stats(self):
+        with self._lock:
+            times = sorted(self._lookup_times)
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'buckets': len(self._buckets),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evicted': self._evicted,
+                'compactions': self._compactions,
+                'lookup_ms_p50': round(times[len(times) // 2] * 1000, 3) if times else 0.0,
+                'lookup_ms_p99': round(times[int(len(times) * 0.99)] * 1000, 3) if times else 0.0,
+                'lookup_ms_max': round(times[-1] * 1000, 3) if times else 0.0,
+            }
+
+    def _band_keys(self, shingle_set, namespace=''):
+        signature = self._hasher.signature(shingle_set)
+        rows = self.rows
+        if namespace:
+            return tuple(
+                (namespace, band, signature[band * rows:(band + 1) * rows])
+                for band in range(self.bands)
+            )
+        return tuple(
+            (band, signature[band * rows:(band + 1) * rows])
+            for band in range(self.bands)
+        )
+
+    def _compact(self):
+        # 만료된 항목을 지우고 버킷 dict를 새로 만들어 삭제로 생긴 빈 공간을 돌려받는다
+        # 호출 전에 self._lock을 잡고 있어야 한다
+        now = time.monotonic()
+        for entry_id in [i for i, e in self._entries.items() if now - e.created > self.ttl]:
+            self._drop(entry_id)
+        buckets = {}
+        for entry_id, entry in self._entries.items():
+            for key in entry.band_keys:
+                buckets.setdefault(key, set()).add(entry_id)
+        self._buckets = buckets
+        self._by_text = dict(self._by_text)
+        self._puts_since_compact = 0
+        self._compactions += 1
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry.size
+        if self._by_text.get(entry.text) == entry_id:
+            del self._by_text[entry.text]
+        for key in entry.band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
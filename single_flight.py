@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from model_pool import QueueTimeout
+
+_POLL_INTERVAL = 0.05
+
+
+class Flight:
+    # 진행 중인 답변 생성 하나 (같은 질문을 기다리는 요청들이 결과를 함께 받는다)
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.answer = None
+        self.error = None
+
+    def wait(self, deadline=None):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not self._done.wait(timeout):
+            raise QueueTimeout('coalesced answer did not finish before the deadline')
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+    def _set(self):
+        self._done.set()
+
+
+class AsyncFlight(Flight):
+    # 이벤트 루프 안에서 기다리는 Flight (ASGI 서버용, 같은 루프의 요청끼리만 묶는다)
+
+    def __init__(self):
+        self._done = asyncio.Event()
+        self.answer = None
+        self.error = None
+
+    async def wait(self, deadline=None):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise QueueTimeout('coalesced answer did not finish before the deadline') from None
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+
+class _Slot:
+    # hold()가 돌려주는 값: answer는 다른 워커가 방금 만든 답변(없으면 None)
+
+    def __init__(self, owner, fd):
+        self._owner = owner
+        self._fd = fd
+        self.answer = owner._read(fd) if fd is not None else None
+
+    def publish(self, answer):
+        # 잠근 파일에 답변을 써서 잠금을 기다리는 다른 워커가 읽게 한다
+        if self._fd is None or not answer:
+            return
+        data = answer.encode('utf-8')
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, data, 0)
+        self._owner._published()
+
+
+class SingleFlight:
+    # 맥락 없는 같은 질문(정규화한 키)이 이미 생성 중이면 새로 모델을 부르지 않고 그 결과를 기다린다.
+    # lock_dir를 지정하면 같은 서버의 다른 워커 프로세스와도 파일 잠금(flock)으로 조율한다.
+    # 키마다 파일 하나를 잠그고, 생성을 마친 워커가 답변을 그 파일에 써 두면
+    # 잠금을 기다리던 다른 워커는 result_ttl초 안에 쓰인 답변을 그대로 가져간다.
+
+    # observe: 'leader'/'follower'/'shared' 이벤트를 받을 함수 (지표 기록용)
+
+    def __init__(self, lock_dir=None, result_ttl=10, cleanup_every=200, observe=None):
+        if lock_dir and fcntl is None:
+            raise RuntimeError('cross-process single flight requires fcntl (Unix)')
+        self.lock_dir = lock_dir
+        self.result_ttl = result_ttl
+        self.cleanup_every = cleanup_every
+        self.observe = observe or (lambda role: None)
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+        self._flights = {}
+        self._async_flights = {}
+        self._lock = threading.Lock()
+        self._publish_count = 0
+        self.leaders = 0
+        self.followers = 0
+        self.shared = 0
+
+    def join(self, key):
+        # (Flight, 생성을 맡았는지 여부)를 돌려준다. 생성을 맡은 쪽은 반드시 finish()를 호출해야 한다.
+        return self._join(self._flights, key, Flight)
+
+    def join_async(self, key):
+        # join()의 asyncio 버전: 돌려주는 AsyncFlight의 wait()는 코루틴이다
+        return self._join(self._async_flights, key, AsyncFlight)
+
+    def _join(self, flights, key, flight_class):
+        with self._lock:
+            flight = flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = flight_class()
+                flights[key] = flight
+                self.leaders += 1
+            else:
+                self.followers += 1
+        self.observe('leader' if leader else 'follower')
+        return flight, leader
+
+    def finish(self, key, flight, answer=None, error=None):
+        flight.answer = answer
+        flight.error = error
+        flights = self._async_flights if isinstance(flight, AsyncFlight) else self._flights
+        with self._lock:
+            if flights.get(key) is flight:
+                del flights[key]
+        flight._set()
+
+    def do(self, key, fn, deadline=None):
+        flight, leader = self.join(key)
+        if not leader:
+            return flight.wait(deadline)
+        try:
+            with self.hold(key, deadline) as slot:
+                answer = slot.answer
+                if answer is None:
+                    answer = fn()
+                    slot.publish(answer)
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, answer)
+        return answer
+
+    async def do_async(self, key, fn, deadline=None):
+        # do()의 asyncio 버전: fn은 코루틴 함수
+        flight, leader = self.join_async(key)
+        if not leader:
+            return await flight.wait(deadline)
+        try:
+            async with self.hold_async(key, deadline) as slot:
+                answer = slot.answer
+                if answer is None:
+                    answer = await fn()
+                    slot.publish(answer)
+        except asyncio.CancelledError:
+            self.finish(key, flight, error=QueueTimeout('leading request was cancelled'))
+            raise
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, answer)
+        return answer
+
+    @contextmanager
+    def hold(self, key, deadline=None):
+        # 다른 워커와 조율: 키의 파일 잠금을 잡고, 다른 워커가 방금 만든 답변이 있으면 돌려준다
+        if not self.lock_dir:
+            yield _Slot(self, None)
+            return
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._acquire(fd, deadline)
+            try:
+                yield _Slot(self, fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    @asynccontextmanager
+    async def hold_async(self, key, deadline=None):
+        # hold()의 asyncio 버전: 다른 워커가 잠금을 잡고 있으면 이벤트 루프를 막지 않고 기다린다
+        if not self.lock_dir:
+            yield _Slot(self, None)
+            return
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            while not self._try_lock(fd, deadline):
+                await asyncio.sleep(_POLL_INTERVAL)
+            try:
+                yield _Slot(self, fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def stats(self):
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                'cross_process': bool(self.lock_dir),
+                'in_flight': len(self._flights) + len(self._async_flights),
+                'leaders': self.leaders,
+                'followers': self.followers,
+                'shared': self.shared,
+                'coalesced_ratio': round((self.followers + self.shared) / total, 4) if total else 0.0,
+            }
+
+    def _path(self, key):
+        return os.path.join(self.lock_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _acquire(self, fd, deadline):
+        while not self._try_lock(fd, deadline):
+            time.sleep(_POLL_INTERVAL)
+
+    @staticmethod
+    def _try_lock(fd, deadline):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise QueueTimeout('coalesced answer from another worker did not finish before the deadline')
+            return False
+
+    def _read(self, fd):
+        stat = os.fstat(fd)
+        if not stat.st_size or time.time() - stat.st_mtime > self.result_ttl:
+            return None
+        with self._lock:
+            self.shared += 1
+        self.observe('shared')
+        return os.pread(fd, stat.st_size, 0).decode('utf-8')
+
+    def _published(self):
+        with self._lock:
+            self._publish_count += 1
+            cleanup = self._publish_count % self.cleanup_every == 0
+        if cleanup:
+            self._cleanup()
+
+    def _cleanup(self):
+        # 오래된 키 파일 정리 (다른 워커가 잠그고 있는 파일은 건너뛴다)
+        expired = time.time() - max(self.result_ttl * 6, 60)
+        for name in os.listdir(self.lock_dir):
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if os.stat(path).st_mtime > expired:
+                    continue
+                fd = os.open(path, os.O_RDWR)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.unlink(path)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
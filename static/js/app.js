@@ -0,0 +1,368 @@
+let recognition = null;
+let isRecording = false;
+let isPlaying = false; // 음성 재생 상태 추적
+
+// 음성 합성 설정
+const synth = window.speechSynthesis;
+let currentUtterance = null;
+
+// 모바일 확대/축소 기능
+let lastScale = 1;
+let currentScale = 1;
+const chatContainer = document.getElementById('chat-container');
+let initialDistance = 0;
+
+chatContainer.addEventListener('touchstart', function(e) {
+    if (e.touches.length === 2) {
+        e.preventDefault();
+        lastScale = currentScale;
+        const touch1 = e.touches[0];
+        const touch2 = e.touches[1];
+        initialDistance = Math.hypot(
+            touch2.clientX - touch1.clientX,
+            touch2.clientY - touch1.clientY
+        );
+    }
+});
+
+chatContainer.addEventListener('touchmove', function(e) {
+    if (e.touches.length === 2) {
+        e.preventDefault();
+        const touch1 = e.touches[0];
+        const touch2 = e.touches[1];
+        const currentDistance = Math.hypot(
+            touch2.clientX - touch1.clientX,
+            touch2.clientY - touch1.clientY
+        );
+
+        const scale = lastScale * (currentDistance / initialDistance);
+        currentScale = Math.min(Math.max(scale, 0.8), 2);
+
+        document.documentElement.style.setProperty('--zoom-level', currentScale);
+    }
+});
+
+// 페이지 로드 시 인사말 표시
+window.onload = function() {
+    // 세션 스토리지 초기화
+    sessionStorage.removeItem('conversation_history');
+    addMessage("안녕하세요. 당신의 불교 신행 · 교리 도우미 '선다미'입니다. 만나서 반가워요! 무엇을 도와드릴까요?", 'bot');
+
+    // 페이지 가시성 변경 이벤트 리스너 추가
+    document.addEventListener('visibilitychange', handleVisibilityChange);
+
+    // 페이지 언로드 이벤트 리스너 추가
+    window.addEventListener('beforeunload', handleBeforeUnload);
+};
+
+// 페이지 가시성 변경 처리
+function handleVisibilityChange() {
+    if (document.hidden) {
+        // 페이지가 숨겨질 때 음성 인식 중지
+        stopVoiceRecognition();
+        // 음성 재생 중지
+        stopVoicePlayback();
+    }
+}
+
+// 페이지 언로드 처리
+function handleBeforeUnload() {
+    stopVoiceRecognition();
+    stopVoicePlayback();
+}
+
+// 음성 인식 중지 함수
+function stopVoiceRecognition() {
+    if (recognition && isRecording) {
+        recognition.stop();
+        isRecording = false;
+        const voiceBtn = document.getElementById('voice-btn');
+        voiceBtn.classList.remove('recording');
+    }
+}
+
+// 음성 재생 중지 함수
+function stopVoicePlayback() {
+    if (synth && isPlaying) {
+        synth.cancel();
+        isPlaying = false;
+        // 재생 중인 메시지의 배경색 제거
+        const playingMessages = document.querySelectorAll('.message.playing');
+        playingMessages.forEach(msg => msg.classList.remove('playing'));
+    }
+}
+
+function toggleVoiceRecognition() {
+    const voiceBtn = document.getElementById('voice-btn');
+
+    if (!recognition) {
+        recognition = new (window.SpeechRecognition || window.webkitSpeechRecognition)();
+        recognition.lang = 'ko-KR';
+        recognition.continuous = false;
+        recognition.interimResults = false;
+
+        recognition.onresult = function(event) {
+            const transcript = event.results[0][0].transcript;
+            document.getElementById('user-input').value = transcript;
+            isRecording = false;
+            voiceBtn.classList.remove('recording');
+        };
+
+        recognition.onerror = function(event) {
+            console.error('Speech recognition error', event.error);
+            isRecording = false;
+            voiceBtn.classList.remove('recording');
+        };
+
+        recognition.onend = function() {
+            isRecording = false;
+            voiceBtn.classList.remove('recording');
+        };
+    }
+
+    if (!isRecording) {
+        recognition.start();
+        isRecording = true;
+        voiceBtn.classList.add('recording');
+    } else {
+        recognition.stop();
+        isRecording = false;
+        voiceBtn.classList.remove('recording');
+    }
+}
+
+function sendMessage() {
+    const userInput = document.getElementById('user-input');
+    const message = userInput.value.trim();
+    const loading = document.getElementById('loading');
+
+    if (message) {
+        addMessage(message, 'user');
+        userInput.value = '';
+
+        // 로딩 애니메이션을 마지막 메시지 다음에 표시
+        loading.style.display = 'flex';
+        const chatContainer = document.getElementById('chat-container');
+        chatContainer.appendChild(loading);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+
+        // 스트리밍을 지원하지 않는 브라우저는 기존 방식으로 한 번에 받기
+        const reply = window.ReadableStream && window.TextDecoder
+            ? streamReply(message)
+            : fetchReply(message);
+        reply.catch(error => {
+            console.error('Error:', error);
+            loading.style.display = 'none';
+            addMessage('죄송합니다. 오류가 발생했습니다.', 'bot');
+        });
+    }
+}
+
+function fetchReply(message) {
+    const loading = document.getElementById('loading');
+    return fetch('/chat', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({message: message})
+    })
+    .then(response => response.json().then(data => {
+        loading.style.display = 'none';
+        addMessage(withRetryAfter(data.response, response), 'bot');
+    }));
+}
+
+// 요청 한도를 넘은 경우(429) 다시 보낼 수 있을 때까지의 시간(Retry-After, 초)을 안내 문구 뒤에 붙인다
+function withRetryAfter(text, response) {
+    const seconds = parseInt(response.headers.get('Retry-After'), 10);
+    if (response.status !== 429 || !(seconds > 0)) {
+        return text;
+    }
+    return `${text} (${seconds}초 뒤에 다시 보낼 수 있어요)`;
+}
+
+// 답변을 Server-Sent Events로 받아 도착하는 대로 화면에 표시
+async function streamReply(message) {
+    const loading = document.getElementById('loading');
+    const chatContainer = document.getElementById('chat-container');
+    const response = await fetch('/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({message: message})
+    });
+    if (!response.ok) {
+        // 혼잡(503), 요청 한도 초과(429) 등으로 서버가 안내 문구를 JSON으로 돌려준 경우에는 그 문구를 보여준다
+        const data = await response.json().catch(() => null);
+        if (!data || !data.response) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        loading.style.display = 'none';
+        addMessage(withRetryAfter(data.response, response), 'bot');
+        return;
+    }
+    if (!response.body) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let messageDiv = null;
+
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, {stream: true});
+
+        // 이벤트는 빈 줄로 구분되며, 마지막 조각은 다음 청크와 이어질 수 있으므로 남겨둔다
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const event = parseEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+
+            if (event.type === 'done') {
+                if (!messageDiv) {
+                    loading.style.display = 'none';
+                    addMessage('', 'bot');
+                }
+                adjustScroll(chatContainer);
+                return;
+            }
+            if (event.type === 'error') {
+                loading.style.display = 'none';
+                if (messageDiv) {
+                    messageDiv.textContent = event.data.error;
+                } else {
+                    addMessage(event.data.error, 'bot');
+                }
+                return;
+            }
+            if (event.data.delta) {
+                if (!messageDiv) {
+                    // 첫 조각이 도착하면 로딩 애니메이션 대신 답변 말풍선 표시
+                    loading.style.display = 'none';
+                    messageDiv = addMessage('', 'bot');
+                }
+                messageDiv.textContent += event.data.delta;
+                chatContainer.scrollTop = chatContainer.scrollHeight;
+            }
+        }
+    }
+    // done 이벤트 없이 연결이 끊긴 경우
+    throw new Error('stream closed before completion');
+}
+
+function parseEvent(raw) {
+    let type = 'message';
+    let data = '';
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    });
+    return {type: type, data: data ? JSON.parse(data) : {}};
+}
+
+// 메시지 클릭 시 음성 재생
+function playMessage(message, messageElement) {
+    // 이미 재생 중인 메시지인 경우 중지
+    if (messageElement.classList.contains('playing')) {
+        stopVoicePlayback();
+        return;
+    }
+
+    // 다른 메시지가 재생 중이면 중지
+    if (isPlaying) {
+        stopVoicePlayback();
+    }
+
+    const utterance = new SpeechSynthesisUtterance(message);
+    utterance.lang = 'ko-KR';
+    utterance.rate = 1;
+    utterance.pitch = 1;
+
+    // 재생 시작 시 이벤트
+    utterance.onstart = function() {
+        isPlaying = true;
+        messageElement.classList.add('playing');
+    };
+
+    // 재생 종료 시 이벤트
+    utterance.onend = function() {
+        isPlaying = false;
+        messageElement.classList.remove('playing');
+    };
+
+    // 재생 오류 시 이벤트
+    utterance.onerror = function() {
+        isPlaying = false;
+        messageElement.classList.remove('playing');
+    };
+
+    currentUtterance = utterance;
+    synth.speak(utterance);
+}
+
+function addMessage(text, sender) {
+    const chatContainer = document.getElementById('chat-container');
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${sender}-message`;
+    messageDiv.textContent = text;
+
+    if (sender === 'bot') {
+        // 스트리밍 중에 내용이 계속 추가되므로 클릭 시점의 텍스트를 재생
+        messageDiv.addEventListener('click', () => playMessage(messageDiv.textContent, messageDiv));
+    }
+
+    chatContainer.appendChild(messageDiv);
+    adjustScroll(chatContainer);
+    return messageDiv;
+}
+
+// 메시지 추가 후 스크롤 위치 조정
+function adjustScroll(chatContainer) {
+    setTimeout(() => {
+        const scrollHeight = chatContainer.scrollHeight;
+        const clientHeight = chatContainer.clientHeight;
+        const maxScroll = scrollHeight - clientHeight;
+
+        if (maxScroll > 0) {
+            // 안드로이드 대응: 추가 여유 공간 확보
+            const extraSpace = 40; // 추가 여유 공간
+            chatContainer.scrollTop = maxScroll + extraSpace;
+
+            // 스크롤 후 위치 확인 및 추가 조정
+            requestAnimationFrame(() => {
+                const lastMessage = chatContainer.lastElementChild;
+                const lastMessageRect = lastMessage.getBoundingClientRect();
+                const inputContainer = document.querySelector('.input-container');
+                const inputRect = inputContainer.getBoundingClientRect();
+
+                if (lastMessageRect.bottom > inputRect.top) {
+                    const additionalSpace = lastMessageRect.bottom - inputRect.top + 20;
+                    chatContainer.scrollTop = maxScroll + additionalSpace;
+                }
+            });
+        }
+    }, 100);
+}
+
+document.getElementById('user-input').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        sendMessage();
+    }
+});
+
+// 안드로이드 네비게이션 바 대응
+function adjustForAndroidNav() {
+    const vh = window.innerHeight * 0.01;
+    document.documentElement.style.setProperty('--vh', `${vh}px`);
+}
+
+window.addEventListener('resize', adjustForAndroidNav);
+adjustForAndroidNav();
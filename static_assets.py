@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 이미 압축된 형식은 다시 압축하지 않는다
+PRECOMPRESSED_TYPES = ('font/woff2', 'image/png', 'image/jpeg', 'image/webp')
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+_CSS_URL = re.compile(r"""url\((['"]?)([^'")]+)\1\)""")
+
+mimetypes.add_type('font/woff2', '.woff2')
+
+
+class Asset:
+    # 시작할 때 한 번 읽고 압축해 둔 정적 응답 본문
+
+    def __init__(self, body, mimetype, cache_control):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants = {'identity': body}
+        if mimetype not in PRECOMPRESSED_TYPES:
+            self.variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding):
+        # 압축 방식마다 본문이 다르므로 ETag도 구분한다
+        if encoding == 'identity':
+            return self.digest[:32]
+        return f"{self.digest[:32]}-{encoding}"
+
+    def response(self, request):
+        encoding = self._negotiate(request)
+        etag = self.etag(encoding)
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            resp = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                resp.headers['Content-Encoding'] = encoding
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = self.cache_control
+        if len(self.variants) > 1:
+            resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+    def _negotiate(self, request):
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted[encoding]:
+                return encoding
+        return 'identity'
+
+
+class AssetBundle:
+    # static 폴더의 파일을 내용 해시가 들어간 이름(style.3f2a1b4c.css)으로 제공한다.
+    # 이름이 내용에 따라 바뀌므로 브라우저가 오래 캐시해도 새 배포가 바로 반영된다.
+
+    def __init__(self, root, url_prefix='/static/'):
+        self.root = root
+        self.url_prefix = url_prefix
+        self._urls = {}
+        self._assets = {}
+
+    def add(self, path):
+        # CSS 안의 url(...)이 이미 등록된 파일을 가리키면 해시된 주소로 바꿔 쓴다
+        with open(os.path.join(self.root, path), 'rb') as f:
+            body = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if mimetype == 'text/css':
+            body = self._rewrite_css(path, body.decode('utf-8')).encode('utf-8')
+
+        asset = Asset(body, mimetype, IMMUTABLE_CACHE)
+        stem, ext = posixpath.splitext(path)
+        hashed = f"{stem}.{asset.digest[:10]}{ext}"
+        self._assets[hashed] = asset
+        self._urls[path] = self.url_prefix + hashed
+        return self._urls[path]
+
+    def url(self, path):
+        return self._urls[path]
+
+    def get(self, hashed_path):
+        return self._assets.get(hashed_path)
+
+    def _rewrite_css(self, path, css):
+        base = posixpath.dirname(path)
+
+        def replace(match):
+            target = posixpath.normpath(posixpath.join(base, match.group(2)))
+            if target in self._urls:
+                return f"url('{self._urls[target]}')"
+            return match.group(0)
+
+        return _CSS_URL.sub(replace, css)
+
+
+def html_page(html):
+    # HTML은 주소가 고정이므로 매번 ETag로 재검증하게 한다
+    return Asset(html.encode('utf-8'), 'text/html', REVALIDATE_CACHE)
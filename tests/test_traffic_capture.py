@@ -0,0 +1,37 @@
+import pytest
+
+from traffic_capture import TrafficCapture, read_capture, redact
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('주민번호 900101-1234567', '주민번호 <rrn>'),
+    ('주민번호 9001011234567 입니다', '주민번호 <rrn> 입니다'),
+    ('010-1234-5678로 연락주세요', '<phone>로 연락주세요'),
+    ('01012345678', '<phone>'),
+    ('+82 10-1234-5678', '<phone>'),
+    ('02-123-4567', '<phone>'),
+    ('메일은 a.b@example.com 입니다', '메일은 <email> 입니다'),
+    ('https://example.com/x?id=1 참고', '<url> 참고'),
+    ('카드 1234567812345678', '카드 <num>'),
+    ('부처님 오신 날이 언제인가요', '부처님 오신 날이 언제인가요'),
+])
+def test_redact(text, expected):
+    assert redact(text) == expected
+
+
+def test_capture_requires_salt(tmp_path):
+    with pytest.raises(ValueError):
+        TrafficCapture(path=str(tmp_path / 'capture.jsonl.gz'))
+    with pytest.raises(ValueError):
+        TrafficCapture(path=str(tmp_path / 'capture.jsonl.gz'), salt='short')
+    assert not TrafficCapture().enabled
+
+
+def test_record_round_trip(tmp_path):
+    path = str(tmp_path / 'capture.jsonl.gz')
+    capture = TrafficCapture(path=path, salt='x' * 16)
+    capture.record('/chat', 1.0, 'session-1', '010-1234-5678 번호로 연락', 0.5, 0.6, 200)
+    capture._drain()
+    [entry] = read_capture(path)
+    assert entry['message'] == '<phone> 번호로 연락'
+    assert entry['session'] == capture.pseudonym('session-1') != 'session-1'
@@ -0,0 +1,222 @@
+# 질문 목록 일괄 처리 (답변 캐시 미리 채우기, 프롬프트 변경의 오프라인 평가)
+#
+# 질문 파일(JSONL, {"question": ..., "id": ..., "profile": "web"|"kakao"})의 질문을 서버와 같은 코드
+# (메시지 경로 고르기 → build_contents → 모델 호출 실행기 → Gemini 호출 보호·할당량)로 동시에 처리하고
+# 결과를 JSONL로 씁니다. 대화 기록 없이(EMPTY_WINDOW) 답하므로 세션의 대화 기록은 건드리지 않습니다.
+# "id"가 없으면 줄 번호를, "profile"이 없으면 --profiles의 프로필을 모두 씁니다.
+#
+# 결과 파일은 체크포인트를 겸합니다: 다시 실행하면 이미 성공한 (id, 프로필)은 건너뛰고 나머지만 처리합니다.
+# Gemini 할당량(QUOTA_RPM/TPM)은 서버와 같은 환경 변수를 따르고, QUOTA_FILE을 서버와 같게 주면 서버와 나눠 씁니다.
+# --rpm으로 이 도구의 분당 모델 호출 수를 더 낮출 수 있고, 혼잡·할당량 초과는 잠시 쉬었다가 다시 시도합니다.
+#
+#   python -m tools.batch questions.jsonl --out answers.jsonl --concurrency 4 --rpm 60
+#   # 만든 답변을 떠 있는 서버의 답변 캐시에 넣기 (ADMIN_TOKEN 필요)
+#   python -m tools.batch questions.jsonl --out answers.jsonl --warm-url http://localhost:5000
+#   # 프롬프트를 바꾼 뒤 같은 질문 세트로 다시 만들어 비교 (경로 고르기 없이 기본 모델로)
+#   python -m tools.batch eval.jsonl --out after.jsonl --no-router --profiles web
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import app
+from history_window import EMPTY_WINDOW
+from model_pool import PoolBusy
+from rate_limit import RateLimiter
+from resilience import CircuitOpen
+from router import FULL, TEMPLATE
+
+# /admin/cache/warm 요청 하나에 넣는 답변 수
+WARM_BATCH = 100
+
+
+def load_questions(path, profiles):
+    jobs = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            for profile in [item['profile']] if item.get('profile') else profiles:
+                if profile not in app.generation_profiles:
+                    raise SystemExit(f"line {number}: unknown profile {profile!r}")
+                jobs.append({'id': str(item.get('id', number)), 'question': item['question'], 'profile': profile})
+    return jobs
+
+
+def read_results(path):
+    # 결과 파일의 기록 ((id, 프로필)마다 마지막 기록)
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 중단되며 잘린 마지막 줄
+                continue
+            results[record['id'], record['profile']] = record
+    return results
+
+
+class Batch:
+
+    def __init__(self, out, total, rpm, retries, timeout, use_router):
+        self.total = total
+        self.retries = retries
+        self.timeout = timeout
+        self.use_router = use_router
+        # 분당 rpm개, 한꺼번에 보내지 않도록 버킷 크기는 1
+        self.limiter = RateLimiter(per_minute=rpm, burst=1, max_users=1)
+        self.file = open(out, 'a+', encoding='utf-8')
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell():
+            # 잘린 마지막 줄 뒤에 이어 쓰지 않도록 줄을 바꾼다
+            self.file.seek(self.file.tell() - 1)
+            if self.file.read(1) != '\n':
+                self.file.write('\n')
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.routes = Counter()
+        self.started = time.monotonic()
+
+    def throttle(self):
+        while True:
+            wait = self.limiter.acquire('batch')
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def answer(self, job):
+        # (경로, 답변 캐시 프로필, 답변). get_chat_response와 같이 경로를 고르고, 정해진 인사말은 모델을 부르지 않는다
+        profile = app.generation_profiles[job['profile']]
+        if not self.use_router:
+            route, route_profile = FULL, profile
+        else:
+            decision, route_profile = app.route_message(job['question'], EMPTY_WINDOW, profile)
+            if decision.route == TEMPLATE:
+                return decision.route, route_profile, decision.answer
+            route = decision.route
+        self.throttle()
+        # 사용자별 대기열 제한을 받지 않도록 user는 비워 둔다 (동시 호출 수는 --concurrency로 정한다)
+        deadline = time.monotonic() + self.timeout
+        return route, route_profile, app.generate_answer(job['question'], EMPTY_WINDOW, deadline, profile=route_profile)
+
+    def run_job(self, job):
+        started = time.monotonic()
+        record = dict(job)
+        error = None
+        for attempt in range(self.retries + 1):
+            try:
+                route, route_profile, answer = self.answer(job)
+            except (PoolBusy, CircuitOpen) as e:
+                # 혼잡, 할당량 초과, 회로 열림은 잠시 쉬었다가 다시 시도한다
+                error = e
+                if attempt < self.retries:
+                    time.sleep(min(30, 2 ** attempt) * random.uniform(0.5, 1.5))
+                continue
+            except Exception as e:
+                error = e
+                break
+            record.update(status='ok', route=route, cache_profile=route_profile.name, answer=answer)
+            break
+        if 'answer' not in record:
+            record.update(status='failed', error=f"{type(error).__name__}: {error}")
+        record['attempts'] = attempt + 1
+        record['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+        self.write(record)
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+            self.counts[record['status']] += 1
+            if record['status'] == 'ok':
+                self.routes[record['route']] += 1
+            done = sum(self.counts.values())
+            if done % 10 == 0 or done == self.total:
+                print(f"{done}/{self.total} ok={self.counts['ok']} failed={self.counts['failed']} "
+                      f"{self.questions_per_minute():.1f} q/min", flush=True)
+
+    def questions_per_minute(self):
+        elapsed = time.monotonic() - self.started
+        return sum(self.counts.values()) / elapsed * 60 if elapsed > 0 else 0.0
+
+    def run(self, jobs, concurrency):
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch')
+        try:
+            for future in [executor.submit(self.run_job, job) for job in jobs]:
+                future.result()
+        except KeyboardInterrupt:
+            print("interrupted: finished answers are saved, run again to resume", flush=True)
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        self.file.close()
+        return time.monotonic() - self.started
+
+
+def warm_cache(url, token, results):
+    # 성공한 답변을 서버의 답변 캐시에 넣는다 (정해진 인사말은 캐시를 거치지 않으므로 뺀다)
+    entries = [{'question': r['question'], 'answer': r['answer'], 'profile': r['cache_profile']}
+               for r in results.values() if r['status'] == 'ok' and r['route'] != TEMPLATE and r['answer']]
+    stored = 0
+    for i in range(0, len(entries), WARM_BATCH):
+        resp = requests.post(f"{url.rstrip('/')}/admin/cache/warm", json={'entries': entries[i:i + WARM_BATCH]},
+                             headers={'X-Admin-Token': token}, timeout=30)
+        resp.raise_for_status()
+        stored += resp.json()['stored']
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description='질문 목록 일괄 처리 (답변 캐시 미리 채우기, 오프라인 평가)')
+    parser.add_argument('questions', help='질문 파일 (JSONL)')
+    parser.add_argument('--out', required=True, help='결과 파일 (JSONL, 다시 실행하면 이어서 처리)')
+    parser.add_argument('--profiles', nargs='+', default=list(app.generation_profiles),
+                        help='"profile"이 없는 질문에 쓸 생성 프로필 (기본: 모두)')
+    parser.add_argument('--concurrency', type=int, default=4, help='동시에 처리할 질문 수')
+    parser.add_argument('--rpm', type=float, default=0, help='분당 모델 호출 수 상한 (0이면 할당량 설정만 따름)')
+    parser.add_argument('--retries', type=int, default=3, help='혼잡·할당량 초과 시 다시 시도할 횟수')
+    parser.add_argument('--timeout', type=float, default=app.CHAT_DEADLINE, help='질문 하나의 마감 시간(초)')
+    parser.add_argument('--no-router', action='store_true', help='경로 고르기 없이 모두 기본 모델로 답한다')
+    parser.add_argument('--warm-url', help='끝나면 성공한 답변을 이 서버의 답변 캐시에 넣는다')
+    parser.add_argument('--admin-token', default=app.ADMIN_TOKEN, help='--warm-url 서버의 ADMIN_TOKEN')
+    args = parser.parse_args()
+    for profile in args.profiles:
+        if profile not in app.generation_profiles:
+            parser.error(f"unknown profile {profile!r}")
+    if args.warm_url and not args.admin_token:
+        parser.error('--warm-url needs --admin-token (or ADMIN_TOKEN)')
+
+    jobs = load_questions(args.questions, args.profiles)
+    done = {key for key, record in read_results(args.out).items() if record['status'] == 'ok'}
+    pending = [job for job in jobs if (job['id'], job['profile']) not in done]
+    print(f"{len(jobs)} questions, {len(jobs) - len(pending)} already answered, {len(pending)} to go", flush=True)
+
+    batch = Batch(args.out, len(pending), args.rpm, args.retries, args.timeout, not args.no_router)
+    elapsed = batch.run(pending, args.concurrency)
+    report = {
+        'questions': len(jobs),
+        'skipped': len(jobs) - len(pending),
+        'ok': batch.counts['ok'],
+        'failed': batch.counts['failed'],
+        'routes': dict(batch.routes),
+        'elapsed_s': round(elapsed, 2),
+        'questions_per_minute': round(len(pending) / elapsed * 60, 1) if elapsed > 0 else 0.0,
+    }
+    if args.warm_url:
+        report['warmed'] = warm_cache(args.warm_url, args.admin_token, read_results(args.out))
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
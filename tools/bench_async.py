@@ -0,0 +1,170 @@
+# 동기(gunicorn gthread, app:app)와 비동기(gunicorn + uvicorn 워커, asgi:app) 배포의 동시 접속 처리량 비교
+#
+# 가짜 모델(MODEL_BACKEND=fake)로 서버를 띄우고, 동시 요청 수(--concurrency)마다 /chat 요청을 한꺼번에 보내
+# 성공 수, 혼잡 응답 수, 지연 시간(p50/p95), 서버 RSS와 스레드 수의 최댓값을 기록합니다.
+# 처리 중인 요청 하나당 메모리는 (최대 RSS - 요청 전 RSS) / 동시 요청 수로 계산합니다.
+#
+#   python -m tools.bench_async --concurrency 50 100 200 400
+#   python -m tools.bench_async --modes sync --threads 64 --fake-latency 2 --json sync.json
+#
+# 동기 배포는 워커당 스레드 수(--threads)만큼만 동시에 처리하고, 모델 호출 스레드(MODEL_WORKERS)도 같은 수로 둡니다.
+# 비동기 배포는 워커당 동시에 --async-concurrency개까지 모델을 부릅니다.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from tools.loadtest import QUESTIONS, percentile, process_rss_kb
+
+
+def process_threads(pid):
+    # pid와 그 자식 프로세스의 스레드 수 합계 (리눅스 /proc 기준)
+    total = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        if int(entry) == pid or int(status.get('PPid', '0')) == pid:
+            total += int(status.get('Threads', '0'))
+    return total
+
+
+def start_server(mode, args):
+    env = dict(os.environ)
+    env.update({
+        'MODEL_BACKEND': 'fake',
+        'FAKE_MODEL_LATENCY': str(args.fake_latency),
+        'FAKE_MODEL_JITTER': '0.1',
+        # 모델 호출 수 자체를 비교하므로 사용자별 요청 한도와 답변 캐시는 끈다
+        'RATE_LIMIT_CHAT_PER_MINUTE': '0',
+        'RESPONSE_CACHE_ENABLED': '0',
+        'SIMILAR_CACHE_ENABLED': '0',
+        'MODEL_WORKERS': str(args.threads),
+        'MODEL_QUEUE_SIZE': str(args.threads),
+        'MODEL_ASYNC_CONCURRENCY': str(args.async_concurrency),
+        'MODEL_ASYNC_QUEUE_SIZE': str(args.async_concurrency),
+        'GEMINI_KEEPALIVE_INTERVAL': '0',
+    })
+    env.setdefault('GOOGLE_API_KEY', 'bench')
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{args.port}',
+               '--workers', str(args.workers), '--timeout', '120']
+    if mode == 'sync':
+        command += ['--threads', str(args.threads), 'app:app']
+    else:
+        command += ['--worker-class', 'uvicorn.workers.UvicornWorker', 'asgi:app']
+    proc = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{args.port}'
+    for _ in range(150):
+        if proc.poll() is not None:
+            raise SystemExit(f'{mode} server exited with {proc.returncode}')
+        try:
+            if requests.get(url + '/ready', timeout=1).status_code == 200:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f'{mode} server did not start')
+
+
+def send(url, timeout):
+    started = time.monotonic()
+    question = f"{QUESTIONS[hash(started) % len(QUESTIONS)]} {uuid.uuid4().hex}"
+    try:
+        resp = requests.post(f'{url}/chat', json={'message': question},
+                             headers={'X-Session-Id': f'bench-{uuid.uuid4().hex[:12]}'}, timeout=timeout)
+        outcome = 'ok' if resp.status_code == 200 else 'busy' if resp.status_code == 503 else str(resp.status_code)
+    except requests.Timeout:
+        outcome = 'timeout'
+    except requests.RequestException:
+        outcome = 'conn_error'
+    return time.monotonic() - started, outcome
+
+
+def burst(url, pid, concurrency, timeout):
+    # concurrency개의 요청을 한꺼번에 보내고, 응답을 모두 받을 때까지 RSS와 스레드 수를 잰다
+    idle_rss = process_rss_kb(pid)
+    peak = {'rss': idle_rss, 'threads': process_threads(pid)}
+    stopped = threading.Event()
+
+    def sample():
+        while not stopped.is_set():
+            peak['rss'] = max(peak['rss'], process_rss_kb(pid))
+            peak['threads'] = max(peak['threads'], process_threads(pid))
+            stopped.wait(0.1)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: send(url, timeout), range(concurrency)))
+    elapsed = time.monotonic() - started
+    stopped.set()
+    sampler.join()
+
+    latencies = [latency for latency, outcome in results if outcome == 'ok']
+    outcomes = {}
+    for _, outcome in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    return {
+        'concurrency': concurrency,
+        'ok': outcomes.get('ok', 0),
+        'outcomes': outcomes,
+        'elapsed_s': round(elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'idle_rss_mb': round(idle_rss / 1024, 1),
+        'peak_rss_mb': round(peak['rss'] / 1024, 1),
+        'rss_kb_per_request': round((peak['rss'] - idle_rss) / concurrency, 1),
+        'peak_threads': peak['threads'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='동기/비동기 배포의 동시 접속 처리량과 요청당 메모리 비교')
+    parser.add_argument('--modes', nargs='+', choices=('sync', 'async'), default=['sync', 'async'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn 워커 수')
+    parser.add_argument('--threads', type=int, default=32, help='동기 배포의 워커당 스레드 수')
+    parser.add_argument('--async-concurrency', type=int, default=1000, help='비동기 배포의 워커당 동시 모델 호출 수')
+    parser.add_argument('--fake-latency', type=float, default=3.0, help='가짜 모델 응답 지연(초)')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--json', help='결과를 JSON 파일로 저장')
+    args = parser.parse_args()
+
+    timeout = args.fake_latency * 4 + 60
+    report = {}
+    for mode in args.modes:
+        proc, url = start_server(mode, args)
+        try:
+            report[mode] = []
+            for concurrency in args.concurrency:
+                result = burst(url, proc.pid, concurrency, timeout)
+                report[mode].append(result)
+                print(f"{mode:5} c={concurrency:<5} ok={result['ok']:<5} p50={result['p50_ms']:>8.0f}ms "
+                      f"p95={result['p95_ms']:>8.0f}ms rss={result['peak_rss_mb']:>6.1f}MB "
+                      f"({result['rss_kb_per_request']:.0f}KB/req) threads={result['peak_threads']} "
+                      f"{result['outcomes']}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# 세션 저장소의 요청당 오버헤드 측정
+#
+# 요청 하나를 "대화 기록 읽기(context) + 사용자/선다미 턴 추가(append 2회)"로 보고
+# 메모리 저장소(SessionStore)와 SQLite 저장소(SqliteSessionStore)의 요청당 시간을 비교합니다.
+# --processes를 주면 여러 프로세스가 같은 세션에 번갈아 쓰면서 대화가 이어지는지도 확인합니다.
+#
+#   python -m tools.bench_session_store --requests 20000 --sessions 2000
+#   python -m tools.bench_session_store --db /tmp/bench.db --processes 4
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from session_db import SqliteSessionStore
+from session_store import MODEL, USER, SessionStore
+
+QUESTION = '요즘 마음이 불안한데 어떻게 수행하면 좋을까요?' * 2
+ANSWER = '불안한 마음이 올라올 때는 호흡을 따라가며 그 마음을 가만히 바라보세요. ' * 8
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_requests(store, requests, sessions):
+    timings = []
+    session_ids = [f'bench-{i}' for i in range(sessions)]
+    for _ in range(requests):
+        session_id = random.choice(session_ids)
+        started = time.perf_counter()
+        store.context(session_id)
+        store.append(session_id, USER, QUESTION)
+        store.append(session_id, MODEL, ANSWER)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name, timings):
+    total = sum(timings)
+    print(f"{name:8} {len(timings) / total:10.0f} req/s  "
+          f"p50={percentile(timings, 50) * 1e6:7.1f}us  p99={percentile(timings, 99) * 1e6:7.1f}us  "
+          f"max={max(timings) * 1e6:8.1f}us")
+
+
+def coherence_worker(path, index, processes, rounds, session_id, flush_interval, errors):
+    # 프로세스 index는 차례(턴 번호 % processes)가 왔을 때만 한 턴씩 쓴다.
+    # 다른 프로세스의 쓰기가 보이지 않으면 차례가 오지 않으므로, 마감 시간 안에 끝나면 일관성이 유지된 것이다.
+    store = SqliteSessionStore(path, max_turns=processes * rounds + 1, flush_interval=flush_interval)
+    deadline = time.monotonic() + 30
+    written = 0
+    while written < rounds:
+        if time.monotonic() > deadline:
+            errors.put(f'worker {index}: timed out after {written} turns')
+            return
+        context = store.context(session_id)
+        seen = context.first_seq + len(context.turns)
+        if seen % processes == index:
+            store.append(session_id, USER, f'{index}:{seen}')
+            store.flush()
+            written += 1
+        else:
+            time.sleep(flush_interval / 2)
+
+
+def check_coherence(path, processes, rounds, flush_interval):
+    session_id = f'coherence-{os.getpid()}'
+    errors = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=coherence_worker,
+                                args=(path, i, processes, rounds, session_id, flush_interval, errors))
+        for i in range(processes)
+    ]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    store = SqliteSessionStore(path, max_turns=processes * rounds + 1)
+    turns = store.context(session_id).turns
+    expected = [f'{seq % processes}:{seq}' for seq in range(processes * rounds)]
+    problems = []
+    while not errors.empty():
+        problems.append(errors.get())
+    if [text for _, text in turns] != expected:
+        problems.append(f'expected {len(expected)} ordered turns, found {len(turns)}')
+    status = 'ok' if not problems else 'FAILED ' + '; '.join(problems)
+    print(f"coherence {processes} processes x {rounds} turns: {status} ({elapsed:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='세션 저장소 요청당 오버헤드 측정')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--max-turns', type=int, default=20)
+    parser.add_argument('--db', help='SQLite 파일 (기본: 임시 파일)')
+    parser.add_argument('--processes', type=int, default=0, help='여러 프로세스 일관성 확인에 쓸 프로세스 수')
+    parser.add_argument('--rounds', type=int, default=20, help='일관성 확인에서 프로세스마다 쓸 턴 수')
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, 'sessions.db')
+
+        memory = SessionStore(max_turns=args.max_turns)
+        report('memory', run_requests(memory, args.requests, args.sessions))
+
+        sqlite = SqliteSessionStore(path, max_turns=args.max_turns, flush_interval=args.flush_interval)
+        report('sqlite', run_requests(sqlite, args.requests, args.sessions))
+        # 백그라운드 기록이 모두 끝날 때까지 기다린 뒤 통계를 본다
+        started = time.perf_counter()
+        sqlite.flush(timeout=60)
+        stats = sqlite.stats()
+        print(f"sqlite   drained in {(time.perf_counter() - started) * 1000:.0f}ms, "
+              f"{stats['flushes']} flushes, {stats['flushed_ops'] / max(stats['flushes'], 1):.0f} writes/flush, "
+              f"hot hits {stats['hot_hits']}, reloads {stats['reloads']}")
+
+        if args.processes:
+            check_coherence(path, args.processes, args.rounds, args.flush_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# 경전 텍스트 폴더로 BM25 검색 색인 만들기
+#
+# 폴더 안의 .txt 파일(UTF-8)을 모두 읽어 구절 단위로 나누고, 앱이 mmap으로 여는 색인 파일 하나를 만듭니다.
+# 파일 이름(확장자 제외, 하위 폴더는 '/'로 연결)이 답변에 밝힐 출처가 됩니다. 예: 금강경.txt -> 금강경
+#
+#   python -m tools.build_scripture_index sutras/ data/scripture.idx
+#   python -m tools.build_scripture_index sutras/ data/scripture.idx --query "집착을 내려놓는 법"
+#
+# 앱에서는 SCRIPTURE_INDEX=data/scripture.idx 로 지정합니다.
+
+import argparse
+import os
+import time
+
+from scripture_index import ScriptureIndex, build_index
+
+
+def read_documents(folder):
+    for root, _, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            if not name.endswith('.txt'):
+                continue
+            path = os.path.join(root, name)
+            source = os.path.splitext(os.path.relpath(path, folder))[0].replace(os.sep, '/')
+            with open(path, encoding='utf-8') as f:
+                yield source, f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='경전 BM25 색인 만들기')
+    parser.add_argument('folder', help='경전 텍스트(.txt) 폴더')
+    parser.add_argument('output', help='색인 파일 경로')
+    parser.add_argument('--ngram', type=int, default=2, help='한글 글자 n-gram 크기')
+    parser.add_argument('--query', action='append', default=[], help='색인을 만든 뒤 검색해 볼 질문')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    meta = build_index(read_documents(args.folder), args.output, ngram=args.ngram)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(args.output)
+    print(f"{len(meta['sources'])} sources, {meta['documents']} passages, {meta['terms']} terms, "
+          f"{size / 1024:.0f} KB in {elapsed:.1f}s -> {args.output}")
+
+    index = ScriptureIndex(args.output)
+    for query in args.query:
+        started = time.perf_counter()
+        results = index.search(query)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"\n{query}  ({elapsed:.2f}ms)")
+        for score, source, text in results:
+            print(f"  {score:6.2f}  [{source}] {text[:80]}")
+
+
+if __name__ == '__main__':
+    main()
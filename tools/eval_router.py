@@ -0,0 +1,74 @@
+# 메시지 경로 고르기(router.Router)의 오프라인 평가
+#
+# 라벨이 붙은 메시지 파일(JSONL, {"message": ..., "route": "template"|"lite"|"full", "context": true/false})을 읽어
+# 분류 결과와 비교합니다. "context"는 이전 대화가 있는 상태에서 받은 메시지인지 여부입니다(기본 false).
+# 기본 모델로 가야 할 메시지를 다른 경로로 보낸 경우(under-routed)는 답변 품질이 떨어지므로 따로 셉니다.
+#
+#   python -m tools.eval_router
+#   python -m tools.eval_router --lite-max-chars 10 15 20 -v
+
+import argparse
+import json
+import os
+from collections import Counter
+
+from router import FULL, ROUTES, Router
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(__file__), 'data', 'routes.jsonl')
+
+
+def load_samples(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(samples, template_max_chars, lite_max_chars, verbose=False):
+    router = Router(template_max_chars=template_max_chars, lite_max_chars=lite_max_chars)
+    confusion = Counter()
+    for sample in samples:
+        decision = router.classify(sample['message'], sample.get('context', False))
+        confusion[sample['route'], decision.route] += 1
+        if verbose and decision.route != sample['route']:
+            print(f"  {sample['route']:>8} -> {decision.route:<8} ({decision.reason}) {sample['message']!r}")
+
+    correct = sum(confusion[route, route] for route in ROUTES)
+    under = sum(count for (label, routed), count in confusion.items() if label == FULL and routed != FULL)
+    full_labels = sum(count for (label, _), count in confusion.items() if label == FULL)
+    off_full = sum(count for (_, routed), count in confusion.items() if routed != FULL)
+    result = {
+        'samples': len(samples),
+        'accuracy': round(correct / len(samples), 3) if samples else 0.0,
+        # 기본 모델이 필요한 메시지 중 다른 경로로 보낸 비율 (낮을수록 좋다)
+        'under_routed': round(under / full_labels, 3) if full_labels else 0.0,
+        # 기본 모델을 부르지 않은 메시지 비율 (지연을 줄인 메시지)
+        'off_full': round(off_full / len(samples), 3) if samples else 0.0,
+    }
+    for route in ROUTES:
+        labeled = sum(confusion[route, routed] for routed in ROUTES)
+        routed = sum(confusion[label, route] for label in ROUTES)
+        result[route] = {
+            'precision': round(confusion[route, route] / routed, 3) if routed else None,
+            'recall': round(confusion[route, route] / labeled, 3) if labeled else None,
+        }
+    result['confusion'] = {f"{label}->{routed}": confusion[label, routed]
+                           for label in ROUTES for routed in ROUTES if confusion[label, routed]}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='메시지 경로 고르기 평가')
+    parser.add_argument('samples', nargs='?', default=DEFAULT_SAMPLES, help='라벨된 메시지 JSONL 파일')
+    parser.add_argument('--template-max-chars', type=int, default=20)
+    parser.add_argument('--lite-max-chars', type=int, nargs='+', default=[10])
+    parser.add_argument('-v', '--verbose', action='store_true', help='라벨과 다르게 분류한 메시지를 출력')
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    for lite_max_chars in args.lite_max_chars:
+        print(f"lite_max_chars={lite_max_chars}")
+        result = evaluate(samples, args.template_max_chars, lite_max_chars, args.verbose)
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
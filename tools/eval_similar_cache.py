@@ -0,0 +1,81 @@
+# 유사 질문 캐시(similar_cache.SimilarCache)의 적중률·오적중률·조회 시간 측정
+#
+# 라벨이 붙은 질문 쌍 파일(JSONL, {"a": ..., "b": ..., "same": true/false})을 읽어
+# 모든 "a" 질문을 캐시에 넣은 뒤 "b" 질문으로 조회합니다.
+# 조회 결과가 "b"와 같은 뜻으로 라벨된 질문이 아니면 오적중(false hit)으로 셉니다.
+#
+#   python -m tools.eval_similar_cache
+#   python -m tools.eval_similar_cache --threshold 0.5 0.6 0.7 0.8 --ngram 2
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+from similar_cache import SimilarCache
+
+DEFAULT_PAIRS = os.path.join(os.path.dirname(__file__), 'data', 'paraphrases.jsonl')
+
+
+def load_pairs(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(pairs, threshold, ngram, num_perm, bands, verbose=False):
+    cache = SimilarCache(threshold=threshold, ngram=ngram, num_perm=num_perm, bands=bands)
+    paraphrases = defaultdict(set)
+    for pair in pairs:
+        cache.put(pair['a'], pair['a'])
+        if pair['same']:
+            paraphrases[pair['b']].add(pair['a'])
+
+    result = {'pairs': len(pairs), 'hits': 0, 'true_hits': 0, 'false_hits': 0, 'misses': 0}
+    expected_hits = sum(1 for pair in pairs if pair['same'])
+    times = []
+    for pair in pairs:
+        started = time.perf_counter()
+        found = cache.lookup(pair['b'])
+        times.append(time.perf_counter() - started)
+        if found is None:
+            result['misses'] += 1
+            if verbose and pair['same']:
+                print(f"  miss       {pair['b']!r} (expected {pair['a']!r})")
+            continue
+        result['hits'] += 1
+        if found[2] in paraphrases[pair['b']]:
+            result['true_hits'] += 1
+        else:
+            result['false_hits'] += 1
+            if verbose:
+                print(f"  false hit  {pair['b']!r} -> {found[2]!r} ({found[1]:.2f})")
+
+    times.sort()
+    result['recall'] = round(result['true_hits'] / expected_hits, 3) if expected_hits else 0.0
+    result['false_hit_rate'] = round(result['false_hits'] / result['hits'], 3) if result['hits'] else 0.0
+    result['lookup_us_p50'] = round(times[len(times) // 2] * 1e6, 1)
+    result['lookup_us_p99'] = round(times[int(len(times) * 0.99)] * 1e6, 1)
+    result['lookup_us_max'] = round(times[-1] * 1e6, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='유사 질문 캐시 평가')
+    parser.add_argument('pairs', nargs='?', default=DEFAULT_PAIRS, help='라벨된 질문 쌍 JSONL 파일')
+    parser.add_argument('--threshold', type=float, nargs='+', default=[0.7])
+    parser.add_argument('--ngram', type=int, default=2)
+    parser.add_argument('--num-perm', type=int, default=32)
+    parser.add_argument('--bands', type=int, default=16)
+    parser.add_argument('-v', '--verbose', action='store_true', help='놓친 질문과 오적중을 출력')
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.pairs)
+    for threshold in args.threshold:
+        print(f"threshold={threshold}")
+        result = evaluate(pairs, threshold, args.ngram, args.num_perm, args.bands, args.verbose)
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
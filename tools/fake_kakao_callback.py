@@ -0,0 +1,135 @@
+# 카카오 i 오픈빌더 콜백을 흉내 내는 로컬 수신 서버
+#
+# 실제 카카오 채널 없이 /kakao 콜백 모드를 시험하기 위한 도구입니다.
+#
+#   # 수신 서버만 실행 (받은 콜백을 출력)
+#   python -m tools.fake_kakao_callback --port 8081
+#
+#   # 수신 서버를 띄우고 앱에 콜백 요청을 한 번 보낸 뒤 결과를 기다림
+#   python -m tools.fake_kakao_callback --app-url http://localhost:5000/kakao --utterance "사성제가 뭐예요?"
+#
+#   # 처음 2번은 500으로 응답해 재시도 동작 확인
+#   python -m tools.fake_kakao_callback --fail-first 2
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+
+        if server.delay:
+            time.sleep(server.delay)
+
+        if count <= server.fail_first:
+            print(f"[{count}] {self.path} -> 500 (실패 흉내)")
+            self._reply(500, {'status': 'FAIL', 'message': 'simulated failure'})
+            return
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            print(f"[{count}] {self.path} -> 400 (JSON 아님)")
+            self._reply(400, {'status': 'FAIL', 'message': 'invalid json'})
+            return
+
+        elapsed = time.monotonic() - server.started_at
+        print(f"[{count}] {self.path} +{elapsed:.2f}s")
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+        server.received.append(payload)
+        server.event.set()
+        self._reply(200, {
+            'taskId': uuid.uuid4().hex,
+            'status': 'SUCCESS',
+            'message': 'OK',
+            'timestamp': int(time.time() * 1000),
+        })
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host, port, fail_first=0, delay=0):
+    server = ThreadingHTTPServer((host, port), CallbackHandler)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.fail_first = fail_first
+    server.delay = delay
+    server.received = []
+    server.event = threading.Event()
+    server.started_at = time.monotonic()
+    return server
+
+
+def kakao_request(utterance, callback_url, user_id):
+    # 오픈빌더가 스킬 서버로 보내는 요청 중 앱이 사용하는 부분만 채운 형태
+    return {
+        'userRequest': {
+            'utterance': utterance,
+            'callbackUrl': callback_url,
+            'user': {'id': user_id, 'type': 'botUserKey'},
+        },
+        'bot': {'id': 'fake-bot'},
+        'action': {'name': 'fake-skill', 'params': {}},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='카카오 콜백 로컬 수신 서버')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fail-first', type=int, default=0, help='처음 N번의 콜백에 500으로 응답')
+    parser.add_argument('--delay', type=float, default=0, help='콜백 응답 지연(초)')
+    parser.add_argument('--app-url', help='콜백 요청을 보낼 앱의 /kakao URL')
+    parser.add_argument('--utterance', default='안녕하세요')
+    parser.add_argument('--user-id', default='fake-user')
+    parser.add_argument('--timeout', type=float, default=60, help='콜백을 기다릴 최대 시간(초)')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.fail_first, args.delay)
+    callback_url = f"http://{args.host}:{server.server_port}/callback/{uuid.uuid4().hex}"
+    print(f"콜백 수신 대기: http://{args.host}:{server.server_port}/callback/...")
+
+    if not args.app_url:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    started = time.monotonic()
+    resp = requests.post(args.app_url, json=kakao_request(args.utterance, callback_url, args.user_id))
+    print(f"스킬 응답 ({time.monotonic() - started:.2f}s): {resp.status_code}")
+    print(json.dumps(resp.json(), ensure_ascii=False, indent=2))
+
+    if not server.event.wait(args.timeout):
+        print(f"{args.timeout}초 안에 콜백을 받지 못했습니다.")
+    else:
+        print(f"콜백 수신까지 {time.monotonic() - started:.2f}s")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+# /chat, /kakao 부하 시험 도구
+#
+# 목표 RPS로 요청을 일정 간격으로 보내고(open loop), 처리량과 지연 시간(p50/p95/p99),
+# 서버 프로세스의 RSS 변화를 보고합니다. 워커 수를 정하거나 성능 회귀를 확인할 때 씁니다.
+#
+#   # 가짜 모델(MODEL_BACKEND=fake)로 gunicorn을 띄워서 시험 (Gemini 할당량을 쓰지 않음)
+#   python -m tools.loadtest --start --workers 4 --threads 8 --rps 20 --duration 60
+#
+#   # 모델 지연 2초, 오류 5%로 흉내
+#   python -m tools.loadtest --start --fake-latency 2 --fake-error-rate 0.05
+#
+#   # 이미 떠 있는 서버를 시험 (--pid에 gunicorn 마스터 PID를 주면 RSS도 기록)
+#   python -m tools.loadtest --url http://localhost:8000 --pid 12345
+#
+# 지연 시간은 실제 전송 시각이 아니라 예정된 전송 시각부터 잽니다.
+# 클라이언트가 밀려 늦게 보낸 시간도 포함되므로 서버가 느려질 때 지연이 과소평가되지 않습니다.
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+QUESTIONS = [
+    "사성제가 뭐예요?",
+    "마음이 너무 불안할 때는 어떻게 해야 하나요?",
+    "팔정도에 대해 알려주세요",
+    "윤회는 정말 있는 건가요?",
+    "명상을 처음 시작하려면 어떻게 해야 할까요?",
+    "화가 날 때 부처님은 어떻게 하라고 하셨나요?",
+    "반야심경의 핵심은 무엇인가요?",
+    "가족과 다툰 뒤 마음이 무거워요",
+]
+
+# 카카오 스킬의 혼잡 응답, 요청 한도 초과 응답과 모델 오류 응답은 200이므로 안내 문구로 구분한다
+# (app.py의 BUSY_MESSAGE, RATE_LIMIT_MESSAGE, ERROR_MESSAGE)
+BUSY_TEXT = "문의가 많아"
+RATE_LIMIT_TEXT = "너무 빠르게"
+ERROR_TEXT = "오류가 발생했습니다"
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def answer_text(kind, data):
+    if kind == 'chat':
+        return data.get('response', '')
+    outputs = data.get('template', {}).get('outputs', [])
+    return outputs[0].get('simpleText', {}).get('text', '') if outputs else ''
+
+
+def process_rss_kb(pid):
+    # pid와 그 자식 프로세스(gunicorn 워커)의 VmRSS 합계 (리눅스 /proc 기준)
+    pids = {pid}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # 두 번째 필드(comm)에 공백이 있을 수 있으므로 마지막 ')' 뒤에서 나눈다
+                fields = f.read().rsplit(')', 1)[1].split()
+            if int(fields[1]) == pid:
+                pids.add(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    total = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+def start_app(args):
+    env = dict(os.environ)
+    env.update({
+        'MODEL_BACKEND': 'fake',
+        'FAKE_MODEL_LATENCY': str(args.fake_latency),
+        'FAKE_MODEL_CHUNK_INTERVAL': str(args.fake_chunk_interval),
+        'FAKE_MODEL_ERROR_RATE': str(args.fake_error_rate),
+    })
+    env.setdefault('GOOGLE_API_KEY', 'loadtest')
+    command = [
+        sys.executable, '-m', 'gunicorn', 'app:app',
+        '--bind', f'127.0.0.1:{args.port}',
+        '--workers', str(args.workers),
+        '--threads', str(args.threads),
+        '--timeout', '120',
+    ]
+    proc = subprocess.Popen(command, env=env)
+    url = f'http://127.0.0.1:{args.port}'
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise SystemExit(f'gunicorn exited with {proc.returncode}')
+        try:
+            requests.get(url + '/', timeout=1)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit('gunicorn did not start')
+
+
+class LoadTest:
+
+    def __init__(self, url, rps, duration, mix, users, cache_ratio, timeout, concurrency):
+        self.url = url.rstrip('/')
+        self.rps = rps
+        self.duration = duration
+        self.mix = mix
+        self.users = [uuid.uuid4().hex[:12] for _ in range(users)]
+        self.cache_ratio = cache_ratio
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.http = requests.Session()
+        self.http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+        self.results = {kind: [] for kind in mix}
+        self.lock = threading.Lock()
+
+    def question(self):
+        question = random.choice(QUESTIONS)
+        if random.random() < self.cache_ratio:
+            return question
+        # 정확 일치 캐시와 유사 질문 캐시 모두에 걸리지 않도록 긴 임의 문자열을 붙인다
+        return f"{question} {uuid.uuid4().hex}"
+
+    def send(self, kind, scheduled):
+        user = random.choice(self.users)
+        question = self.question()
+        try:
+            if kind == 'chat':
+                resp = self.http.post(f'{self.url}/chat', json={'message': question},
+                                      headers={'X-Session-Id': f'load-{user}'}, timeout=self.timeout)
+            else:
+                resp = self.http.post(f'{self.url}/kakao', json={
+                    'userRequest': {'utterance': question, 'user': {'id': f'load-{user}'}},
+                }, timeout=self.timeout)
+            outcome = str(resp.status_code)
+            if resp.status_code == 200:
+                text = answer_text(kind, resp.json())
+                if BUSY_TEXT in text:
+                    outcome = 'busy'
+                elif RATE_LIMIT_TEXT in text:
+                    outcome = 'rate_limited'
+                elif ERROR_TEXT in text:
+                    outcome = 'error'
+        except requests.Timeout:
+            outcome = 'timeout'
+        except ValueError:
+            outcome = 'bad_response'
+        except requests.RequestException:
+            outcome = 'conn_error'
+        latency = time.monotonic() - scheduled
+        with self.lock:
+            self.results[kind].append((latency, outcome))
+
+    def run(self):
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        total = int(self.rps * self.duration)
+        started = time.monotonic()
+        futures = []
+        for i in range(total):
+            scheduled = started + i / self.rps
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            kind = random.choices(kinds, weights)[0]
+            futures.append(self.executor.submit(self.send, kind, scheduled))
+        for future in futures:
+            future.result()
+        return time.monotonic() - started
+
+
+class RssSampler(threading.Thread):
+
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.started = time.monotonic()
+        self.stopped = threading.Event()
+
+    def sample(self):
+        self.samples.append((round(time.monotonic() - self.started, 1), process_rss_kb(self.pid) // 1024))
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.sample()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+
+
+def summarize(results, elapsed):
+    report = {}
+    for kind, rows in results.items():
+        latencies = [latency for latency, _ in rows]
+        outcomes = {}
+        for _, outcome in rows:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        ok = outcomes.get('200', 0)
+        report[kind] = {
+            'sent': len(rows),
+            'ok': ok,
+            'throughput_rps': round(ok / elapsed, 2) if elapsed else 0.0,
+            'outcomes': outcomes,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'max_ms': round(max(latencies) * 1000, 1) if latencies else 0.0,
+        }
+    return report
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in ('chat', 'kakao'):
+            raise argparse.ArgumentTypeError(f'unknown endpoint: {kind}')
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/chat, /kakao 부하 시험')
+    parser.add_argument('--url', help='시험할 서버 주소 (--start를 쓰지 않을 때)')
+    parser.add_argument('--pid', type=int, help='RSS를 기록할 gunicorn 마스터 PID (--url과 함께)')
+    parser.add_argument('--start', action='store_true', help='가짜 모델로 gunicorn을 직접 띄워서 시험')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn 워커 수 (--start)')
+    parser.add_argument('--threads', type=int, default=8, help='워커당 스레드 수 (--start)')
+    parser.add_argument('--fake-latency', type=float, default=0.8, help='가짜 모델 응답 지연(초)')
+    parser.add_argument('--fake-chunk-interval', type=float, default=0.05, help='가짜 모델 스트리밍 조각 간격(초)')
+    parser.add_argument('--fake-error-rate', type=float, default=0.0, help='가짜 모델 오류 비율 (0~1)')
+    parser.add_argument('--rps', type=float, default=10, help='목표 초당 요청 수')
+    parser.add_argument('--duration', type=float, default=30, help='시험 시간(초)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('chat=0.5,kakao=0.5'),
+                        help='엔드포인트 비율 (예: chat=0.7,kakao=0.3)')
+    parser.add_argument('--users', type=int, default=100, help='서로 다른 사용자(세션) 수')
+    parser.add_argument('--cache-ratio', type=float, default=0.0,
+                        help='캐시될 수 있는 고정 질문의 비율 (나머지는 매번 다른 질문)')
+    parser.add_argument('--timeout', type=float, default=70)
+    parser.add_argument('--concurrency', type=int, default=256, help='클라이언트 동시 연결 수')
+    parser.add_argument('--rss-interval', type=float, default=5)
+    parser.add_argument('--json', help='결과를 JSON 파일로 저장')
+    args = parser.parse_args()
+
+    proc = None
+    pid = args.pid
+    if args.start:
+        proc, url = start_app(args)
+        pid = proc.pid
+    elif args.url:
+        url = args.url
+    else:
+        parser.error('--url 또는 --start가 필요합니다')
+
+    sampler = None
+    if pid:
+        sampler = RssSampler(pid, args.rss_interval)
+        sampler.start()
+
+    try:
+        test = LoadTest(url, args.rps, args.duration, args.mix, args.users, args.cache_ratio,
+                        args.timeout, args.concurrency)
+        elapsed = test.run()
+    finally:
+        if sampler:
+            sampler.stop()
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    report = {
+        'target_rps': args.rps,
+        'elapsed_s': round(elapsed, 1),
+        'endpoints': summarize(test.results, elapsed),
+    }
+    if sampler and sampler.samples:
+        report['rss_mb'] = sampler.samples
+        report['rss_growth_mb'] = sampler.samples[-1][1] - sampler.samples[0][1]
+
+    for kind, row in report['endpoints'].items():
+        print(f"{kind:6} sent={row['sent']} ok={row['ok']} {row['throughput_rps']} rps "
+              f"p50={row['p50_ms']}ms p95={row['p95_ms']}ms p99={row['p99_ms']}ms max={row['max_ms']}ms "
+              f"{row['outcomes']}")
+    if 'rss_mb' in report:
+        timeline = ' '.join(f"{t}s:{mb}MB" for t, mb in report['rss_mb'])
+        print(f"rss    growth={report['rss_growth_mb']}MB  {timeline}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# 요청 한 번에 보내는 프롬프트 토큰 수 비교 (Gemini count_tokens API 사용, GOOGLE_API_KEY 필요)
+#
+#   이전 방식: 시스템 프롬프트와 대화 기록을 하나의 문자열로 이어 붙여 매번 전송
+#   현재 방식: 시스템 프롬프트는 system_instruction(캐시 가능), 대화 기록은 contents로 전송
+#
+#   python -m tools.prompt_tokens
+
+import json
+
+import app
+from history_window import Window
+
+SAMPLE_CONVERSATIONS = [
+    [],
+    [
+        ('user', '요즘 회사 일 때문에 마음이 너무 힘들어요.'),
+        ('model', '많이 지치셨겠어요. 어떤 일이 가장 마음을 무겁게 하나요?'),
+    ],
+    [
+        ('user', '사성제가 뭐예요?'),
+        ('model', '사성제는 고성제, 집성제, 멸성제, 도성제의 네 가지 진리입니다.'),
+        ('user', '그럼 팔정도는요?'),
+        ('model', '팔정도는 도성제에 해당하는 여덟 가지 바른 길입니다.'),
+    ],
+]
+
+QUESTION = '이 가르침을 일상에서 어떻게 실천할 수 있을까요?'
+
+
+def legacy_prompt(user_message, history):
+    # 이전 get_chat_response가 만들던 형태의 단일 문자열 프롬프트
+    turns = history + [('user', user_message)]
+    conversation = "\n".join(f"{app.ROLE_LABELS[role]}: {text}" for role, text in turns)
+    return f"{app.SYSTEM_PROMPT}\n\n{conversation}\n선다미:"
+
+
+def main():
+    model = app.context_cache.base_model
+    plain_model = app.gemini.sdk().GenerativeModel(app.MODEL_NAME)
+    system_tokens = plain_model.count_tokens(app.SYSTEM_PROMPT).total_tokens
+
+    for history in SAMPLE_CONVERSATIONS:
+        legacy = plain_model.count_tokens(legacy_prompt(QUESTION, history)).total_tokens
+        structured = model.count_tokens(app.build_contents(QUESTION, Window(history, None, 0))).total_tokens
+        print(json.dumps({
+            'history_turns': len(history),
+            'legacy_prompt_tokens': legacy,
+            'prompt_tokens': structured,
+            'system_instruction_tokens': system_tokens,
+            # 캐시 콘텐츠가 활성화되면 system_instruction 부분은 캐시 토큰으로 청구된다
+            'uncached_prompt_tokens': structured - system_tokens,
+        }, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+# 트래픽 기록 재생 도구
+#
+# 트래픽 기록(CAPTURE_FILE)의 요청을 기록된 도착 간격대로(--speed배 빠르게) 다시 보내고, 라우트별 지연 분포를
+# 기준(--baseline으로 준 이전 재생 결과, 없으면 기록된 운영 처리 시간)과 비교합니다.
+# 기본으로 가짜 모델(MODEL_BACKEND=fake)로 gunicorn을 직접 띄우고, 가짜 모델은 요청마다 기록된 업스트림(Gemini)
+# 시간만큼 기다립니다(FAKE_MODEL_LATENCY_FILE). 지터와 오류 없이 같은 일정으로 보내므로 같은 코드는 거의 같은
+# 결과를 내고, 두 버전의 결과 차이는 앱 쪽 변화에서 온 것으로 볼 수 있습니다.
+#
+#   # 지금 코드로 재생해 결과 저장
+#   python -m tools.replay capture.jsonl.gz --json before.json
+#   # 다른 버전(체크아웃한 폴더)을 2배 빠르게 재생하고 이전 결과와 비교
+#   python -m tools.replay capture.jsonl.gz --app-dir ../seondami-new --speed 2 --baseline before.json
+#   # 이미 떠 있는 서버로 재생: 먼저 가짜 모델 지연 파일을 만들어 그 서버의 FAKE_MODEL_LATENCY_FILE로 지정한다
+#   python -m tools.replay capture.jsonl.gz --write-latency-file latencies.json
+#   python -m tools.replay capture.jsonl.gz --url http://localhost:8000
+#
+# 세션은 기록된 가명 그대로 보내므로 같은 사용자의 대화 기록이 운영에서처럼 쌓입니다.
+# 카카오 콜백 모드로 받은 요청도 콜백 없이 바로 답하는 요청으로 보냅니다.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from tools.loadtest import BUSY_TEXT, ERROR_TEXT, RATE_LIMIT_TEXT, answer_text, percentile
+from traffic_capture import read_capture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_records(paths, routes=None, limit=None):
+    records = [record for path in paths for record in read_capture(path)
+               if routes is None or record['route'] in routes]
+    records.sort(key=lambda record: record['t'])
+    return records[:limit] if limit else records
+
+
+def message_of(record):
+    # CAPTURE_MESSAGES=shape로 기록한 요청은 같은 메시지끼리 같고 길이가 같은 대체 문장을 만든다
+    if 'message' in record:
+        return record['message']
+    filler = f"재생 메시지 {record['hash']} "
+    return (filler * (record['length'] // len(filler) + 1))[:record['length']]
+
+
+def latency_map(records):
+    latencies = {}
+    for record in records:
+        if record.get('upstream') is not None:
+            latencies.setdefault(message_of(record), []).append(record['upstream'])
+    return latencies
+
+
+def start_server(args, latency_file):
+    env = dict(os.environ)
+    env.update({
+        'MODEL_BACKEND': 'fake',
+        'FAKE_MODEL_LATENCY_FILE': latency_file,
+        'FAKE_MODEL_JITTER': '0',
+        'FAKE_MODEL_ERROR_RATE': '0',
+        # 스트리밍 응답도 기록된 시간 안에 끝나도록 조각 사이에 쉬지 않는다
+        'FAKE_MODEL_CHUNK_INTERVAL': '0',
+        'GEMINI_KEEPALIVE_INTERVAL': '0',
+    })
+    if not args.keep_rate_limits:
+        # 여러 배 빠르게 재생하면 운영에서 걸리지 않던 사용자별 요청 한도에 걸리므로 끈다
+        env.update({'RATE_LIMIT_CHAT_PER_MINUTE': '0', 'RATE_LIMIT_KAKAO_PER_MINUTE': '0'})
+    env.setdefault('GOOGLE_API_KEY', 'replay')
+    env.pop('CAPTURE_FILE', None)
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{args.port}',
+               '--workers', str(args.workers), '--timeout', '120']
+    if args.asgi:
+        command += ['--worker-class', 'uvicorn.workers.UvicornWorker', 'asgi:app']
+    else:
+        command += ['--threads', str(args.threads), 'app:app']
+    proc = subprocess.Popen(command, cwd=args.app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{args.port}'
+    for _ in range(150):
+        if proc.poll() is not None:
+            raise SystemExit(f'gunicorn exited with {proc.returncode}')
+        try:
+            if requests.get(url + '/ready', timeout=1).status_code == 200:
+                return proc, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit('gunicorn did not start')
+
+
+class Replay:
+
+    def __init__(self, url, records, speed, timeout, concurrency):
+        self.url = url.rstrip('/')
+        self.records = records
+        self.speed = speed
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.http = requests.Session()
+        self.http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def send(self, record, scheduled):
+        route = record['route']
+        message = message_of(record)
+        session = f"replay-{record['session']}"
+        try:
+            if route == '/kakao':
+                resp = self.http.post(f'{self.url}/kakao', json={
+                    'userRequest': {'utterance': message, 'user': {'id': session}},
+                }, timeout=self.timeout)
+            else:
+                resp = self.http.post(f'{self.url}{route}', json={'message': message},
+                                      headers={'X-Session-Id': session}, timeout=self.timeout,
+                                      stream=route == '/chat/stream')
+            outcome = 'ok' if resp.status_code == 200 else str(resp.status_code)
+            if resp.status_code == 200 and route == '/chat/stream':
+                # 스트림 끝까지 읽은 시간을 잰다
+                body = resp.content.decode('utf-8')
+                if 'event: error' in body:
+                    outcome = 'error'
+            elif resp.status_code == 200:
+                text = answer_text('kakao' if route == '/kakao' else 'chat', resp.json())
+                if BUSY_TEXT in text:
+                    outcome = 'busy'
+                elif RATE_LIMIT_TEXT in text:
+                    outcome = 'rate_limited'
+                elif ERROR_TEXT in text:
+                    outcome = 'error'
+        except requests.Timeout:
+            outcome = 'timeout'
+        except ValueError:
+            outcome = 'bad_response'
+        except requests.RequestException:
+            outcome = 'conn_error'
+        latency = time.monotonic() - scheduled
+        with self.lock:
+            self.results.setdefault(route, []).append((latency, outcome))
+
+    def run(self):
+        # 지연은 예정된 전송 시각부터 잰다 (tools/loadtest.py와 같은 방식)
+        first = self.records[0]['t']
+        started = time.monotonic()
+        futures = []
+        for record in self.records:
+            scheduled = started + (record['t'] - first) / self.speed
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(self.executor.submit(self.send, record, scheduled))
+        for future in futures:
+            future.result()
+        return time.monotonic() - started
+
+
+def summarize(results):
+    summary = {}
+    for route, samples in sorted(results.items()):
+        latencies = [latency for latency, outcome in samples if outcome == 'ok']
+        outcomes = {}
+        for _, outcome in samples:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        summary[route] = {
+            'count': len(samples),
+            'ok': outcomes.get('ok', 0),
+            'outcomes': outcomes,
+            **{f'p{p}_ms': round(percentile(latencies, p) * 1000, 1) for p in PERCENTILES},
+            'max_ms': round(max(latencies) * 1000, 1) if latencies else 0.0,
+        }
+    return summary
+
+
+def recorded_summary(records):
+    # 운영에서 기록된 처리 시간 (모두 정상 응답으로 본다)
+    results = {}
+    for record in records:
+        outcome = 'ok' if record['status'] == 200 else str(record['status'])
+        results.setdefault(record['route'], []).append((record['duration'], outcome))
+    return summarize(results)
+
+
+def print_diff(summary, baseline, baseline_name):
+    print(f"\n{'route':<14} {'metric':<7} {baseline_name:>10} {'replay':>10} {'diff':>10} {'diff%':>8}")
+    for route, stats in summary.items():
+        base = baseline.get(route)
+        for metric in [f'p{p}_ms' for p in PERCENTILES] + ['max_ms']:
+            value = stats[metric]
+            if base is None:
+                print(f"{route:<14} {metric[:-3]:<7} {'-':>10} {value:>10.1f}")
+                continue
+            diff = value - base[metric]
+            ratio = f"{diff / base[metric] * 100:+.1f}%" if base[metric] else '-'
+            print(f"{route:<14} {metric[:-3]:<7} {base[metric]:>10.1f} {value:>10.1f} {diff:>+10.1f} {ratio:>8}")
+        print(f"{route:<14} {'count':<7} {base['count'] if base else '-':>10} {stats['count']:>10} "
+              f"{'':>10} {'':>8} {stats['outcomes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='트래픽 기록 재생과 지연 분포 비교')
+    parser.add_argument('captures', nargs='+', help='트래픽 기록 파일 (CAPTURE_FILE)')
+    parser.add_argument('--url', help='이미 떠 있는 서버 주소 (없으면 가짜 모델로 gunicorn을 띄움)')
+    parser.add_argument('--app-dir', default=ROOT, help='띄울 앱의 폴더 (다른 버전을 체크아웃한 폴더)')
+    parser.add_argument('--asgi', action='store_true', help='asgi:app을 uvicorn 워커로 띄운다')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--speed', type=float, default=1.0, help='재생 속도 배수 (2면 도착 간격을 절반으로)')
+    parser.add_argument('--routes', nargs='+', choices=('/chat', '/chat/stream', '/kakao'))
+    parser.add_argument('--limit', type=int, help='앞에서부터 이만큼만 재생')
+    parser.add_argument('--keep-rate-limits', action='store_true', help='사용자별 요청 한도를 끄지 않는다')
+    parser.add_argument('--timeout', type=float, default=70)
+    parser.add_argument('--concurrency', type=int, default=256, help='동시에 보낼 수 있는 최대 요청 수')
+    parser.add_argument('--baseline', help='비교할 이전 재생 결과 (--json으로 저장한 파일)')
+    parser.add_argument('--json', help='재생 결과를 JSON 파일로 저장')
+    parser.add_argument('--write-latency-file', help='가짜 모델 지연 파일만 만들고 끝낸다')
+    args = parser.parse_args()
+
+    records = load_records(args.captures, set(args.routes) if args.routes else None, args.limit)
+    if not records:
+        raise SystemExit('no records to replay')
+    latencies = latency_map(records)
+    if args.write_latency_file:
+        with open(args.write_latency_file, 'w', encoding='utf-8') as f:
+            json.dump(latencies, f, ensure_ascii=False)
+        print(f"{len(latencies)} messages, {sum(map(len, latencies.values()))} upstream latencies")
+        return
+
+    span = records[-1]['t'] - records[0]['t']
+    print(f"replaying {len(records)} requests over {span / args.speed:.1f}s (x{args.speed:g})")
+    proc = None
+    latency_file = None
+    try:
+        url = args.url
+        if url is None:
+            with tempfile.NamedTemporaryFile('w', suffix='.json', encoding='utf-8', delete=False) as f:
+                json.dump(latencies, f, ensure_ascii=False)
+                latency_file = f.name
+            proc, url = start_server(args, latency_file)
+        replay = Replay(url, records, args.speed, args.timeout, args.concurrency)
+        elapsed = replay.run()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if latency_file:
+            os.remove(latency_file)
+
+    summary = summarize(replay.results)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline, baseline_name = json.load(f)['routes'], 'baseline'
+    else:
+        baseline, baseline_name = recorded_summary(records), 'recorded'
+    print(f"finished in {elapsed:.1f}s")
+    print_diff(summary, baseline, baseline_name)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'captures': args.captures, 'speed': args.speed, 'requests': len(records),
+                       'elapsed_s': round(elapsed, 2), 'routes': summary}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
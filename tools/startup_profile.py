@@ -0,0 +1,117 @@
+# 앱 시작 시간 측정: 모듈별 import 시간(python -X importtime)과 워커 준비(warm-up) 단계별 시간,
+# 준비 후 첫 요청 지연을 새 프로세스에서 측정해 보고합니다.
+#
+#   python -m tools.startup_profile                      # 실제 Gemini 백엔드 (GOOGLE_API_KEY 필요)
+#   python -m tools.startup_profile --fake --top 15      # 가짜 모델, 상위 15개 모듈
+#   python -m tools.startup_profile --no-warm-up         # 준비 없이 첫 요청 지연 비교
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 측정 대상 프로세스에서 실행할 코드: 앱 import → (준비) → 첫 요청 두 번
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - started) * 1000
+warm_up = None
+if sys.argv[1] == '1':
+    started = time.perf_counter()
+    state = app.warm_up()
+    warm_up = {'total_ms': (time.perf_counter() - started) * 1000, 'phases_ms': state['phases_ms'],
+               'errors': state['errors']}
+client = app.app.test_client()
+requests_ms = []
+for i in range(2):
+    started = time.perf_counter()
+    client.post('/chat', json={'message': f'시작 시간 측정 {time.time()} {i}'})
+    requests_ms.append((time.perf_counter() - started) * 1000)
+print(json.dumps({'import_ms': import_ms, 'sdk_loaded': app.gemini.loaded(),
+                  'warm_up': warm_up, 'requests_ms': requests_ms}))
+"""
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package" 줄을 (이름, 깊이, self, cumulative)로
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        head, cumulative_us, name = line.split('|')
+        self_us = head.split(':', 1)[1]
+        # 이름 앞의 공백 두 칸이 import 깊이 한 단계 (앱이 직접 import한 모듈은 공백 하나)
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def report(modules, top):
+    total = sum(self_us for _, _, self_us, _ in modules)
+    print(f"import 합계 {total / 1000:.0f}ms ({len(modules)}개 모듈)")
+
+    print(f"\n누적 시간 상위 {top}개 (앱이 직접 import한 모듈과 그 아래 한 단계)")
+    direct = [m for m in modules if m[1] <= 2]
+    for name, depth, _, cumulative_us in sorted(direct, key=lambda m: -m[3])[:top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {'  ' * max(depth - 1, 0)}{name}")
+
+    print(f"\n최상위 패키지별 합계 상위 {top}개")
+    packages = defaultdict(int)
+    for name, _, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {self_us / 1000:8.1f}ms  {package}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='앱 시작 시간(import, 워커 준비, 첫 요청) 측정')
+    parser.add_argument('--fake', action='store_true', help='가짜 모델 백엔드로 측정 (MODEL_BACKEND=fake)')
+    parser.add_argument('--no-warm-up', action='store_true', help='워커 준비 없이 바로 첫 요청을 보낸다')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--json', help='결과를 JSON 파일로 저장')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.fake:
+        env['MODEL_BACKEND'] = 'fake'
+        env.setdefault('GOOGLE_API_KEY', 'startup-profile')
+        # 첫 요청 지연에서 가짜 모델의 응답 지연이 아닌 앱 쪽 비용이 보이도록 짧게 둔다
+        env.setdefault('FAKE_MODEL_LATENCY', '0.05')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, '0' if args.no_warm_up else '1'],
+        cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+        sys.exit(result.returncode)
+
+    modules = parse_importtime(result.stderr)
+    # 앱 로그(JSON 한 줄)는 백그라운드 스레드가 쓰므로 측정 결과 줄 앞뒤에 섞일 수 있다
+    probe = next(json.loads(line) for line in reversed(result.stdout.strip().splitlines())
+                 if line.startswith('{"import_ms"'))
+    report(modules, args.top)
+
+    print(f"\nimport app {probe['import_ms']:.0f}ms (Gemini SDK {'불러옴' if probe['sdk_loaded'] else '아직 안 불러옴'})")
+    if probe['warm_up']:
+        phases = ', '.join(f"{name} {ms:.0f}ms" for name, ms in probe['warm_up']['phases_ms'].items())
+        print(f"워커 준비 {probe['warm_up']['total_ms']:.0f}ms ({phases})")
+        for name, error in probe['warm_up']['errors'].items():
+            print(f"  준비 실패 {name}: {error}")
+    first, second = probe['requests_ms']
+    print(f"첫 요청 {first:.0f}ms, 두 번째 요청 {second:.0f}ms")
+
+    if args.json:
+        probe['modules'] = [
+            {'name': name, 'depth': depth, 'self_us': self_us, 'cumulative_us': cumulative_us}
+            for name, depth, self_us, cumulative_us in modules
+        ]
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(probe, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
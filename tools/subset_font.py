@@ -0,0 +1,51 @@
+# 웹 UI용 Noto Sans KR 서브셋(woff2) 만들기
+#
+# KS X 1001 한글 2,350자, 한글 호환 자모, ASCII와 자주 쓰는 문장부호만 남겨 글꼴 크기를 줄입니다.
+# 서브셋에 없는 글자는 브라우저가 CSS의 다음 글꼴로 그립니다.
+# fonttools와 brotli가 필요합니다 (pip install fonttools brotli).
+#
+#   python -m tools.subset_font NotoSansKR-Regular.otf static/fonts/noto-sans-kr-400.woff2
+#
+# Noto Sans CJK의 한글·라틴 글리프는 지역판(KR/SC/JP 등)에 관계없이 같으므로
+# Noto Sans CJK SC/KR Regular 어느 쪽을 원본으로 써도 됩니다.
+
+import argparse
+
+from fontTools import subset
+
+PUNCTUATION = '·…‘’“”「」『』〈〉《》【】〔〕→←↑↓※○●◎△▲□■☆★♡♥~–—'
+
+
+def subset_text():
+    # EUC-KR에서 2바이트로 인코딩되는 완성형 한글이 곧 KS X 1001 한글 2,350자
+    # (나머지 음절은 파이썬 euc-kr 코덱이 8바이트 조합 시퀀스로 인코딩한다)
+    hangul = [
+        chr(code) for code in range(0xAC00, 0xD7A4)
+        if len(chr(code).encode('euc-kr')) == 2
+    ]
+    jamo = ''.join(chr(code) for code in range(0x3131, 0x318F))
+    ascii_text = ''.join(chr(code) for code in range(0x20, 0x7F))
+    return ascii_text + PUNCTUATION + jamo + ''.join(hangul)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Noto Sans KR 서브셋 글꼴 만들기')
+    parser.add_argument('source', help='원본 글꼴 (OTF/TTF)')
+    parser.add_argument('output', help='결과 woff2 경로')
+    args = parser.parse_args()
+
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['kern']
+    options.name_IDs = ['*']
+    options.hinting = False
+
+    font = subset.load_font(args.source, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=subset_text())
+    subsetter.subset(font)
+    subset.save_font(font, args.output, options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, request
+
+# 클라이언트가 보낸 X-Request-Id는 이 형식일 때만 그대로 쓰고, 아니면 새로 만든다
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,128}$')
+
+# 지금 처리 중인 요청의 Trace (스레드와 asyncio 태스크마다 따로 보인다)
+_current = contextvars.ContextVar('seondami_trace', default=None)
+
+log = logging.getLogger('seondami.tracing')
+
+
+class Trace:
+    # 요청 하나의 단계별 처리 시간. spans에는 (단계 이름, 시작, 끝) perf_counter 값을 쌓는다.
+    # 같은 이름의 단계가 여러 번 나오면(재시도한 Gemini 호출 등) Server-Timing에는 합계를 쓴다.
+
+    __slots__ = ('request_id', 'trace_id', 'method', 'route', 'started', 'started_ns', 'spans', 'status',
+                 'attributes')
+
+    def __init__(self, method, route, request_id=None):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id or self.trace_id
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.started_ns = time.time_ns()
+        self.spans = []
+        self.status = None
+        # 라우트가 annotate()로 남긴 값 (트래픽 기록용, 로그와 OTLP 내보내기에는 넣지 않는다)
+        self.attributes = {}
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def stages(self):
+        # {단계 이름: 걸린 시간 합계(초)}, 처음 나온 순서대로
+        totals = {}
+        for name, start, end in self.spans:
+            totals[name] = totals.get(name, 0.0) + (end - start)
+        return totals
+
+    def server_timing(self):
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages().items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(entries)
+
+    def record(self, seconds):
+        # 느린 요청 로그 한 줄
+        return {
+            'event': 'slow_request',
+            'request_id': self.request_id,
+            'trace_id': self.trace_id,
+            'method': self.method,
+            'route': self.route,
+            'status': self.status,
+            'duration_ms': round(seconds * 1000, 1),
+            'stages_ms': {name: round(value * 1000, 1) for name, value in self.stages().items()},
+        }
+
+    def otlp(self, seconds, service):
+        # OTLP/JSON ExportTraceServiceRequest 하나 (요청 전체가 루트 span, 단계는 그 아래 span)
+        def unix_nano(moment):
+            return str(self.started_ns + int((moment - self.started) * 1e9))
+
+        root_id = os.urandom(8).hex()
+        spans = [{
+            'traceId': self.trace_id,
+            'spanId': root_id,
+            'name': f"{self.method} {self.route}",
+            'kind': 2,  # SPAN_KIND_SERVER
+            'startTimeUnixNano': str(self.started_ns),
+            'endTimeUnixNano': unix_nano(self.started + seconds),
+            'attributes': [
+                {'key': 'http.request.method', 'value': {'stringValue': self.method}},
+                {'key': 'http.route', 'value': {'stringValue': self.route}},
+                {'key': 'http.response.status_code', 'value': {'intValue': str(self.status)}},
+                {'key': 'seondami.request_id', 'value': {'stringValue': self.request_id}},
+            ],
+            'status': {'code': 2 if self.status is None or self.status >= 500 else 0},
+        }]
+        for name, start, end in self.spans:
+            spans.append({
+                'traceId': self.trace_id,
+                'spanId': os.urandom(8).hex(),
+                'parentSpanId': root_id,
+                'name': name,
+                'kind': 1,  # SPAN_KIND_INTERNAL
+                'startTimeUnixNano': unix_nano(start),
+                'endTimeUnixNano': unix_nano(end),
+            })
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+            'scopeSpans': [{'scope': {'name': 'seondami.tracing'}, 'spans': spans}],
+        }]}
+
+
+def annotate(**attributes):
+    trace = _current.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def current_request_id():
+    trace = _current.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def span(name):
+    # 추적 중인 요청이 없으면(추적을 껐거나 요청 밖에서 부르면) 아무것도 기록하지 않는다
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((name, start, time.perf_counter()))
+
+
+def bind(fn):
+    # 다른 스레드(모델 호출 실행기 등)에서 실행할 함수가 지금 요청의 Trace에 단계를 기록하도록 감싼다
+    trace = _current.get()
+    if trace is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _current.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+class Tracer:
+    # 요청마다 Trace를 만들고, 끝난 요청이 slow_seconds보다 오래 걸렸으면 sample_rate 비율로 골라
+    # observe(기록, 표본 여부)에 넘기고 export_path 파일에 OTLP JSON 한 줄로 덧붙인다.
+    # on_finish를 주면 끝난 요청마다 (Trace, 걸린 시간(초))로 부른다 (트래픽 기록용).
+    # 추적을 끄면(enabled=False) 요청마다 Trace를 만들지 않으므로 span()은 컨텍스트 변수 하나만 읽고 끝난다.
+
+    def __init__(self, enabled=True, slow_seconds=3.0, sample_rate=1.0, export_path=None, service='seondami',
+                 observe=None, on_finish=None):
+        self.enabled = enabled
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.export_path = export_path
+        self.service = service
+        self.observe = observe or (lambda record, sampled: None)
+        self.on_finish = on_finish
+        self._lock = threading.Lock()
+        self.traced = 0
+        self.slow = 0
+        self.logged = 0
+        self.export_errors = 0
+
+    def start(self, method, route, request_id=None):
+        if not self.enabled:
+            return None
+        if request_id and not REQUEST_ID_PATTERN.match(request_id):
+            request_id = None
+        trace = Trace(method, route, request_id)
+        _current.set(trace)
+        return trace
+
+    def finish(self, trace, status):
+        _current.set(None)
+        trace.status = status
+        seconds = trace.elapsed()
+        slow = bool(self.slow_seconds) and seconds >= self.slow_seconds
+        sampled = slow and random.random() < self.sample_rate
+        with self._lock:
+            self.traced += 1
+            self.slow += slow
+            self.logged += sampled
+        if self.on_finish is not None:
+            self.on_finish(trace, seconds)
+        if not slow:
+            return
+        self.observe(trace.record(seconds), sampled)
+        if sampled and self.export_path:
+            self._export(trace.otlp(seconds, self.service))
+
+    def _export(self, payload):
+        # 여러 워커가 같은 파일에 덧붙여도 줄이 섞이지 않도록 한 줄을 한 번에 쓴다
+        line = json.dumps(payload, ensure_ascii=False, separators=(',', ':')) + '\n'
+        try:
+            with self._lock, open(self.export_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError as e:
+            with self._lock:
+                self.export_errors += 1
+            log.warning("Trace export failed", extra={'path': self.export_path, 'error': str(e)})
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'slow_ms': round(self.slow_seconds * 1000) if self.slow_seconds else 0,
+                'sample_rate': self.sample_rate,
+                'export_path': self.export_path,
+                'traced': self.traced,
+                'slow': self.slow,
+                'logged': self.logged,
+                'export_errors': self.export_errors,
+            }
+
+
+def instrument(app, tracer, routes):
+    # Flask 앱의 routes 경로 요청을 추적한다. 응답 헤더에는 헤더를 쓰는 시점까지의 단계만 들어가고
+    # (스트리밍 응답은 스트림을 시작하기 전까지), 느린 요청 판단은 스트림이 끝난 뒤(teardown)에 한다.
+    routes = set(routes)
+
+    @app.before_request
+    def _start_trace():
+        if request.url_rule is not None and request.url_rule.rule in routes:
+            g.trace = tracer.start(request.method, request.url_rule.rule, request.headers.get('X-Request-Id'))
+
+    @app.after_request
+    def _add_trace_headers(resp):
+        trace = g.get('trace')
+        if trace is not None:
+            trace.status = resp.status_code
+            resp.headers['X-Request-Id'] = trace.request_id
+            resp.headers['Server-Timing'] = trace.server_timing()
+        return resp
+
+    @app.teardown_request
+    def _finish_trace(exc):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            tracer.finish(trace, 500 if exc is not None else trace.status or 500)
+
+
+class AsgiTracing:
+    # instrument()의 ASGI 버전 (asgi.py)
+
+    def __init__(self, app, tracer, routes):
+        self.app = app
+        self.tracer = tracer
+        self.routes = set(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        request_id = dict(scope['headers']).get(b'x-request-id', b'').decode('latin-1')
+        trace = self.tracer.start(scope['method'], scope['path'], request_id)
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                trace.status = status
+                message['headers'] = list(message.get('headers', [])) + [
+                    (b'x-request-id', trace.request_id.encode('latin-1')),
+                    (b'server-timing', trace.server_timing().encode('latin-1')),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            self.tracer.finish(trace, status)
@@ -0,0 +1,185 @@
+import atexit
+import fcntl
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+log = logging.getLogger('seondami.traffic_capture')
+
+# 기록하기 전에 메시지에서 지우는 개인 정보 (순서대로 적용)
+# 주민등록번호는 전화번호 규칙이 그 안의 숫자 일부와 맞아 떨어지므로 전화번호보다 먼저 지운다
+_REDACT = (
+    (re.compile(r'https?://\S+'), '<url>'),
+    (re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+'), '<email>'),
+    (re.compile(r'(?<!\d)\d{6}[-\s]?[1-4]\d{6}(?!\d)'), '<rrn>'),
+    (re.compile(r'(?<!\d)(?:\+?82[-\s]?0?|0)\d{1,2}[-\s.]?\d{3,4}[-\s.]?\d{4}(?!\d)'), '<phone>'),
+    (re.compile(r'\d{4,}'), '<num>'),
+)
+
+# 세션 가명과 메시지 해시의 HMAC 키 최소 길이 (짧거나 비어 있으면 흔한 ID·문장을 넣어 보며 되돌릴 수 있다)
+MIN_SALT_LENGTH = 16
+
+# messages 설정: redact는 개인 정보만 지운 메시지를, shape는 메시지 대신 길이와 해시만 남긴다
+MESSAGE_MODES = ('redact', 'shape')
+
+
+def redact(text):
+    for pattern, token in _REDACT:
+        text = pattern.sub(token, text)
+    return text
+
+
+def read_capture(path):
+    # 기록 파일(gzip 멤버를 이어 붙인 JSON Lines)의 기록을 차례로 돌려준다
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TrafficCapture:
+    # 실제 요청의 모양을 재현 가능한 형태로 남긴다 (tools/replay.py로 재생).
+    # 요청마다 도착 시각, 라우트, 세션(가명), 메시지(익명화), 업스트림(Gemini) 시간, 처리 시간, 상태 코드를 기록한다.
+    #
+    # 요청 스레드는 기록을 큐에 넣기만 하고, 프로세스마다 하나인 기록 스레드가 flush_interval초마다 모아
+    # gzip 멤버 하나로 압축해 파일 끝에 덧붙인다. 여러 워커가 같은 파일에 쓰므로 쓰는 동안 파일을 잠근다.
+    # 세션 ID는 salt를 키로 한 HMAC으로 바꾸므로 같은 사용자의 요청끼리는 묶이지만 원래 ID는 알 수 없다.
+
+    def __init__(self, path=None, sample_rate=1.0, salt='', messages='redact', flush_interval=1.0,
+                 max_queue=10000):
+        if messages not in MESSAGE_MODES:
+            raise ValueError(f"messages must be one of {MESSAGE_MODES}")
+        if path and len(salt) < MIN_SALT_LENGTH:
+            raise ValueError(f"traffic capture needs a secret salt of at least {MIN_SALT_LENGTH} characters")
+        self.path = path
+        self.sample_rate = sample_rate
+        self.salt = salt.encode('utf-8')
+        self.messages = messages
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path) and self.sample_rate > 0
+
+    def pseudonym(self, value):
+        return hmac.new(self.salt, value.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+    def record(self, route, arrived, session_id, message, upstream, duration, status, callback=False):
+        if not self.enabled or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return
+        entry = {
+            't': round(arrived, 3),
+            'route': route,
+            'session': self.pseudonym(session_id),
+            'upstream': round(upstream, 3) if upstream is not None else None,
+            'duration': round(duration, 3),
+            'status': status,
+        }
+        if self.messages == 'redact':
+            entry['message'] = redact(message)
+        else:
+            entry['length'] = len(message)
+            entry['hash'] = self.pseudonym(message)
+        if callback:
+            entry['callback'] = True
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.recorded += 1
+
+    def _ensure_writer(self):
+        # gunicorn preload로 fork한 워커에서도 쓰도록 프로세스마다 기록 스레드를 만든다
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.max_queue)
+            threading.Thread(target=self._write_loop, args=(self._queue,), name='traffic-capture',
+                             daemon=True).start()
+            self._pid = os.getpid()
+            atexit.register(self._drain)
+
+    def _drain(self):
+        # 프로세스 종료 시 아직 쓰지 않은 기록을 쓴다
+        if self._pid != os.getpid():
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _write_loop(self, entries):
+        while True:
+            batch = [entries.get()]
+            flush_at = time.monotonic() + self.flush_interval
+            while True:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(entries.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        lines = ''.join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n' for entry in batch)
+        data = gzip.compress(lines.encode('utf-8'))
+        try:
+            with open(self.path, 'ab') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.write(data)
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        except OSError as e:
+            with self._lock:
+                self.errors += 1
+            log.warning("Traffic capture write failed", exc_info=e, extra={'path': self.path})
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.bytes_written += len(data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'path': self.path,
+                'sample_rate': self.sample_rate,
+                'messages': self.messages,
+                'recorded': self.recorded,
+                'dropped': self.dropped,
+                'written': self.written,
+                'bytes_written': self.bytes_written,
+                'queue_depth': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+                'errors': self.errors,
+            }